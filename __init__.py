@@ -6,11 +6,12 @@ from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 
 from .config import Config
+from .common.replica_utils import RoutingSession
 
 # Extensiones globales
 load_dotenv()
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 bcrypt = Bcrypt()
 
@@ -19,15 +20,51 @@ bcrypt = Bcrypt()
 def load_user(user_id):
     """Carga un usuario por ID para Flask-Login (usa tabla `users`)."""
     from .models import Base
+    from .common.user_utils import load_cached_user
     User = getattr(Base.classes, "users", None)
     if User:
-        return db.session.get(User, user_id)
+        return load_cached_user(User, user_id)
     return None
 
 
+_BLUEPRINTS = [
+    ("public", ".controllers.public_controller", "public_bp"),
+    ("auth", ".controllers.auth_controller", "auth_bp"),
+    ("prescriptors", ".controllers.prescriptor_controller", "prescriptors_bp"),
+    ("dashboard", ".controllers.dashboard_controller", "dashboard_bp"),
+    ("roles", ".controllers.roles_controller", "roles_bp"),
+    ("campus", ".controllers.campus_controller", "campus_bp"),
+    ("users", ".controllers.users_controller", "users_bp"),
+    ("permissions", ".controllers.permissions_controller", "perm_bp"),
+    ("programs", ".controllers.programs_controller", "programs_bp"),
+    ("state_lead", ".controllers.state_lead_controller", "state_lead_bp"),
+    ("state_ledger", ".controllers.state_ledger_controller", "state_ledger_bp"),
+    ("state_prescriptor", ".controllers.state_prescriptor_controller", "state_prescriptor_bp"),
+    ("state_user", ".controllers.state_user_controller", "state_user_bp"),
+    ("prescriptor_type", ".controllers.prescriptor_type_controller", "prescriptor_type_bp"),
+    ("confidence_level", ".controllers.confidence_level_controller", "confidence_level_bp"),
+    ("edition", ".controllers.edition_controller", "edition_bp"),
+    ("multimedia", ".controllers.multimedia_controller", "multimedia_bp"),
+    ("admin", ".controllers.admin_controller", "admin_bp"),
+    ("notifications", ".controllers.notifications_controller", "notifications_bp"),
+    ("leads", ".controllers.leads_controller", "leads_bp"),
+    ("landing", ".controllers.landing_controller", "landing_bp"),
+    ("settlements", ".controllers.settlements_controller", "settlements_bp"),
+    ("contracts", ".controllers.contracts_controller", "contracts_bp"),
+    ("adjustments", ".controllers.adjustments_controller", "adjustments_bp"),
+    ("dashboard_directive", ".controllers.dashboard_directive_controller", "bp"),
+    ("monitoring", ".controllers.monitoring_controller", "monitoring_bp"),
+]
+
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(Config)
+    if app.config.get("PROXY_FIX_X_FOR"):
+        # IP real del cliente tras N proxies (request.remote_addr, lista de IPs de /metrics)
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config["PROXY_FIX_X_FOR"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
     db.init_app(app)
     login_manager.init_app(app)
     # Config login redirect
@@ -43,9 +80,24 @@ def create_app(config_class=Config):
     app.config["CONTRACT_UPLOAD_FOLDER"] = upload_dir
 
     with app.app_context():
+        from .common.pool_utils import install_pool_metrics
+        for engine in db.engines.values():
+            install_pool_metrics(engine)
+        from .common.sql_utils import install_sql_instrumentation
+        install_sql_instrumentation(app, db.engines.values())
+        from .common.profiler_utils import install_profiler
+        install_profiler(app)
+        from .common.metrics_utils import install_metrics
+        install_metrics(app)
+        from .common import notification_utils  # noqa: F401 (contadores de no leídas en cada flush)
+        from .common import rollup_utils  # noqa: F401 (agregados mensuales de leads/ledger en cada flush)
+        from .common import search_utils  # noqa: F401 (leads.search_text en cada flush)
         from .models import reflect_db
         reflect_db(app)
 
+    from .cli import sigp_cli
+    app.cli.add_command(sigp_cli)
+
     # ---- permisos en plantillas ----
     from .security import has_perm, has_any_prefix
 
@@ -55,92 +107,50 @@ def create_app(config_class=Config):
         # from sigp.common.security import _perm_set # (comentado si no se usa)
         return dict(can=lambda p: has_perm(current_user, p), can_mod=lambda m: has_any_prefix(current_user, m))
 
-    # prescriptor del usuario conectado
+    # prescriptor del usuario conectado: se consulta (y cachea) sólo si la plantilla lo usa
     @app.context_processor
     def _inject_prescriptor():
+        from flask import g
         from flask_login import current_user
-        from .models import Base
-        Prescriptor = getattr(Base.classes, "prescriptor", None) or getattr(Base.classes, "prescriptors", None)
-        
-        if Prescriptor is None or not (current_user and current_user.is_authenticated):
-            return dict(current_prescriptor=None)
-        try:
-            if hasattr(Prescriptor, "user_id"):
-                presc = db.session.query(Prescriptor).filter_by(user_id=current_user.id).first()
-            else:
-                try:
-                    presc = db.session.get(Prescriptor, current_user.id)
-                except Exception:
-                    presc = None
-        except Exception:
-            presc = None
-        
-        photo_url=getattr(presc,'photo_url',None) if presc else None
-        contract_url=getattr(presc,'contract_url',None) if presc else None
-        return dict(current_prescriptor=presc, presc_photo_url=photo_url, presc_contract_url=contract_url)
-
-    # Import blueprints
-    from .controllers.auth_controller import auth_bp
-    from .controllers.prescriptor_controller import prescriptors_bp
-    from .controllers.dashboard_controller import dashboard_bp
-    from .controllers.roles_controller import roles_bp
-    from .controllers.campus_controller import campus_bp
-    from .controllers.users_controller import users_bp
-    from .controllers.permissions_controller import perm_bp
-    from .controllers.programs_controller import programs_bp
-    from .controllers.state_lead_controller import state_lead_bp
-    from .controllers.state_ledger_controller import state_ledger_bp
-    from .controllers.state_prescriptor_controller import state_prescriptor_bp
-    from .controllers.state_user_controller import state_user_bp
-    from .controllers.prescriptor_type_controller import prescriptor_type_bp
-    from .controllers.confidence_level_controller import confidence_level_bp
-    from .controllers.edition_controller import edition_bp
-    from sigp.controllers.multimedia_controller import multimedia_bp
-    from .controllers.admin_controller import admin_bp
-    from .controllers.notifications_controller import notifications_bp
-    from .controllers.leads_controller import leads_bp
-    from .controllers.landing_controller import landing_bp
-    from sigp.controllers.settlements_controller import settlements_bp
-    from sigp.controllers.contracts_controller import contracts_bp
-    from sigp.controllers.adjustments_controller import adjustments_bp
-    from sigp.controllers.dashboard_directive_controller import bp as dashboard_directive_bp
-    
-    # --- IMPORTANTE: Aquí importamos y registramos el público ---
-    from sigp.controllers.public_controller import public_bp
-    app.register_blueprint(public_bp)
-    # ------------------------------------------------------------
-
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(prescriptors_bp)
-    app.register_blueprint(dashboard_bp)
-    if 'roles' not in app.blueprints:
-        app.register_blueprint(roles_bp)
-    if 'campus' not in app.blueprints:
-        app.register_blueprint(campus_bp)
-    app.register_blueprint(users_bp)
-    app.register_blueprint(perm_bp)
-    app.register_blueprint(programs_bp)
-    app.register_blueprint(state_lead_bp)
-    app.register_blueprint(state_ledger_bp)
-    app.register_blueprint(state_prescriptor_bp)
-    app.register_blueprint(state_user_bp)
-    app.register_blueprint(prescriptor_type_bp)
-    app.register_blueprint(confidence_level_bp)
-    app.register_blueprint(edition_bp)
-    app.register_blueprint(multimedia_bp)
-    app.register_blueprint(admin_bp)
-    app.register_blueprint(notifications_bp)
-    app.register_blueprint(leads_bp)
-    app.register_blueprint(landing_bp)
-    app.register_blueprint(settlements_bp)
-    app.register_blueprint(contracts_bp)
-    app.register_blueprint(adjustments_bp)
-    app.register_blueprint(dashboard_directive_bp)
+        from werkzeug.local import LocalProxy
+
+        def _snapshot():
+            if "_sigp_prescriptor" not in g:
+                presc = None
+                if current_user and current_user.is_authenticated:
+                    from .common.prescriptor_utils import prescriptor_snapshot
+                    try:
+                        presc = prescriptor_snapshot(current_user.id)
+                    except Exception:
+                        presc = None
+                g._sigp_prescriptor = presc
+            return g._sigp_prescriptor
+
+        return dict(
+            current_prescriptor=LocalProxy(_snapshot),
+            presc_photo_url=LocalProxy(lambda: getattr(_snapshot(), "photo_url", None)),
+            presc_contract_url=LocalProxy(lambda: getattr(_snapshot(), "contract_url", None)),
+        )
+
+    # Blueprints (nombre, módulo, atributo). El público va primero.
+    # Los controladores mapean tablas al importarse: con ENABLED_BLUEPRINTS y
+    # SCHEMA_REFLECT_MODE=lazy un worker sólo refleja las tablas que usa.
+    import importlib
+    enabled = set(app.config.get("ENABLED_BLUEPRINTS") or [])
+    for name, module, attr in _BLUEPRINTS:
+        if enabled and name not in enabled:
+            continue
+        if name in app.blueprints:
+            continue
+        bp = getattr(importlib.import_module(module, __name__), attr)
+        app.register_blueprint(bp)
 
     # ---- error handlers (CORREGIDO PARA FAVICON PNG) ----
     
     @app.errorhandler(403)
     def _forbidden(_):
+        if "auth" not in app.blueprints:
+            return "Prohibido", 403
         flash("URL inexistente o sesión expirada", "warning")
         return redirect(url_for("auth.login_get", next=request.full_path))
 
@@ -150,6 +160,8 @@ def create_app(config_class=Config):
         path = request.path
         if path.startswith('/static/') or 'favicon' in path:
             return "No encontrado", 404
+        if "auth" not in app.blueprints:
+            return "No encontrado", 404
             
         flash("URL inexistente o sesión expirada", "warning")
         return redirect(url_for("auth.login_get"))
@@ -158,13 +170,12 @@ def create_app(config_class=Config):
     @app.context_processor
     def inject_unread_count():
         from flask_login import current_user
-        from .models import Base
-        Notification = getattr(Base.classes, "notifications", None)
+        from .common.notification_utils import unread_count
         def _unread_count():
-            if Notification is None or not (current_user and current_user.is_authenticated):
+            if not (current_user and current_user.is_authenticated):
                 return 0
             try:
-                return db.session.query(Notification).filter_by(user_id=current_user.id, is_read=0).count()
+                return unread_count(current_user.id)
             except Exception:
                 return 0
         return dict(unread_count=_unread_count)
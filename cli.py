@@ -0,0 +1,306 @@
+"""Comandos de mantenimiento: ``flask sigp <comando>``."""
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from sigp import db
+
+sigp_cli = AppGroup("sigp", help="Tareas de mantenimiento de SIGP.")
+
+
+@sigp_cli.command("schema-snapshot")
+def schema_snapshot():
+    """Regenera el snapshot del esquema y compara el tiempo de arranque en vivo vs snapshot."""
+    from sqlalchemy.ext.automap import automap_base
+    from sigp.models import schema_fingerprint, snapshot_path, save_snapshot, load_snapshot
+
+    engine = db.engine
+    fingerprint = schema_fingerprint(engine)
+    if not fingerprint:
+        raise click.ClickException("No se pudo calcular la huella del esquema (¿MySQL disponible?)")
+
+    t0 = time.perf_counter()
+    live = automap_base()
+    live.prepare(autoload_with=engine)
+    live_ms = (time.perf_counter() - t0) * 1000
+
+    path = snapshot_path()
+    save_snapshot(path, fingerprint, live.metadata)
+
+    t0 = time.perf_counter()
+    fingerprint = schema_fingerprint(engine)
+    cached = load_snapshot(path, fingerprint)
+    if cached is None:
+        raise click.ClickException(f"No se pudo releer el snapshot {path}")
+    warm = automap_base()
+    for table in cached.sorted_tables:
+        table.to_metadata(warm.metadata)
+    warm.prepare()
+    snap_ms = (time.perf_counter() - t0) * 1000
+
+    click.echo(f"Snapshot: {path} ({len(live.metadata.tables)} tablas, huella {fingerprint})")
+    click.echo(f"Reflexión en vivo:   {live_ms:8.0f} ms")
+    click.echo(f"Carga desde snapshot: {snap_ms:7.0f} ms")
+    boot = current_app.extensions.get("sigp_schema", {})
+    if boot:
+        click.echo(f"Este arranque usó: {boot.get('source')} ({boot.get('ms', 0):.0f} ms)")
+
+
+@sigp_cli.command("gen-models")
+@click.option("--output", "-o", type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help="Fichero de salida (por defecto sigp/models/generated.py).")
+@click.option("--check", is_flag=True, help="Sólo comprobar si los modelos generados siguen vigentes.")
+def gen_models(output, check):
+    """Refleja el esquema una vez y genera modelos declarativos estáticos."""
+    from sqlalchemy import MetaData
+    from sigp.models import schema_fingerprint
+    from sigp.models.codegen import render_models
+
+    engine = db.engine
+    if check:
+        try:
+            from sigp.models.generated import SCHEMA_FINGERPRINT
+        except ImportError:
+            raise click.ClickException("No hay modelos generados")
+        current = schema_fingerprint(engine)
+        if not current or current != SCHEMA_FINGERPRINT:
+            raise click.ClickException("El esquema cambió: ejecutar 'flask sigp gen-models'")
+        click.echo("Modelos generados al día")
+        return
+
+    metadata = MetaData()
+    t0 = time.perf_counter()
+    metadata.reflect(engine)
+    source = render_models(metadata, schema_fingerprint(engine))
+    compile(source, "generated.py", "exec")
+
+    output = output or Path(current_app.root_path) / "models" / "generated.py"
+    tmp = output.with_suffix(".py.tmp")
+    tmp.write_text(source, encoding="utf-8")
+    tmp.replace(output)
+    click.echo(
+        f"{len(metadata.tables)} tablas -> {output} ({(time.perf_counter() - t0) * 1000:.0f} ms). "
+        "Activar con MODELS_SOURCE=generated."
+    )
+
+
+# Paquetes pesados que create_app() no debe importar (sólo el subsistema de contratos)
+IMPORT_BUDGET_FORBIDDEN = ("reportlab", "pypdf", "pikepdf", "pyhanko")
+
+
+@sigp_cli.command("import-budget")
+@click.option("--top", default=15, show_default=True, help="Módulos más lentos a mostrar.")
+@click.option("--max-ms", type=float, default=None, help="Falla si el import acumulado supera este tiempo.")
+def import_budget(top, max_ms):
+    """Comprueba con ``python -X importtime`` qué importa create_app()."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from sigp import create_app; create_app()"],
+        env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise click.ClickException(f"create_app() falló:\n{proc.stderr[-2000:]}")
+
+    # Formato: "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in proc.stderr.splitlines():
+        fields = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        self_us, cumulative_us, name = fields
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    forbidden = sorted({name.split(".")[0] for name, _, _ in rows} & set(IMPORT_BUDGET_FORBIDDEN))
+    total_ms = sum(r[1] for r in rows) / 1000
+
+    click.echo(f"Tiempo total de imports en create_app(): {total_ms:.0f} ms")
+    for name, _, cumulative in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        click.echo(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if forbidden:
+        raise click.ClickException("create_app() importa módulos pesados: " + ", ".join(forbidden))
+    if max_ms is not None and total_ms > max_ms:
+        raise click.ClickException(f"Imports {total_ms:.0f} ms > presupuesto {max_ms:.0f} ms")
+    click.echo("OK: sin " + ", ".join(IMPORT_BUDGET_FORBIDDEN))
+
+
+@sigp_cli.command("warm-up")
+def warm_up_cmd():
+    """Ejecuta el calentamiento pre-fork y muestra el tiempo de cada paso."""
+    from sigp.warmup import warm_up
+
+    for step, ms in warm_up(current_app._get_current_object()).items():
+        click.echo(f"{step:15s} {ms:8.1f} ms")
+
+
+@sigp_cli.command("bench-base-template")
+@click.option("--iterations", "-n", default=200, show_default=True, help="Renderizados a medir.")
+def bench_base_template(iterations):
+    """Mide el render de layouts/base.html con todos los permisos (admin completo)."""
+    from flask import g, render_template_string
+    from sigp.common.security import Permission, PermissionIndex
+
+    if Permission is None:
+        raise click.ClickException("Tabla permissions no disponible")
+    names = [n.lower() for (n,) in db.session.query(Permission.name)]
+    index = PermissionIndex(names)
+
+    class _BenchUser:
+        is_authenticated = True
+        is_active = True
+        is_anonymous = False
+        id = "bench"
+        email = "bench@sigp.local"
+        name = "Benchmark"
+        cellular = role = created_at = None
+        _cached_perm_names = index
+
+        def get_id(self):
+            return self.id
+
+    # Recorrido lineal anterior a PermissionIndex, como referencia
+    def _linear(module):
+        mod = module.lower()
+        mod_sing = mod[:-1] if mod.endswith("s") else mod
+        return any(
+            p.startswith(f"{mod}_") or p.startswith(f"{mod_sing}_") or p.endswith(f"_{mod}") or p.endswith(f"_{mod_sing}")
+            for p in names
+        )
+
+    base_html = (Path(current_app.root_path) / "templates" / "layouts" / "base.html").read_text(encoding="utf-8")
+    modules = re.findall(r"can_mod\('(\w+)'\)", base_html)
+    template = "{% extends 'layouts/base.html' %}{% block content %}{% endblock %}"
+
+    with current_app.test_request_context("/dashboard/"):
+        g._login_user = _BenchUser()
+        render_template_string(template)  # compilar y calentar
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            render_template_string(template)
+        render_ms = (time.perf_counter() - t0) * 1000 / iterations
+
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        for m in modules:
+            _linear(m)
+    linear_us = (time.perf_counter() - t0) * 1e6 / iterations
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        for m in modules:
+            index.has_module(m)
+    index_us = (time.perf_counter() - t0) * 1e6 / iterations
+
+    click.echo(f"{len(names)} permisos, {len(modules)} llamadas a can_mod() por página")
+    click.echo(f"Render base.html:         {render_ms:8.2f} ms")
+    click.echo(f"can_mod() lineal:         {linear_us:8.1f} µs/página")
+    click.echo(f"can_mod() PermissionIndex: {index_us:7.1f} µs/página")
+
+
+@sigp_cli.command("reconcile-unread")
+def reconcile_unread_cmd():
+    """Recalcula los contadores de notificaciones no leídas (cron: corrige desviaciones)."""
+    from sigp.common.notification_utils import counters_enabled, reconcile_unread
+
+    if not counters_enabled():
+        raise click.ClickException("Falta la tabla notification_counters (migración 20261016_notification_counters.sql)")
+    t0 = time.perf_counter()
+    fixed = reconcile_unread()
+    click.echo(f"{fixed} contadores corregidos ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+@sigp_cli.command("rebuild-rollups")
+def rebuild_rollups_cmd():
+    """Recalcula leads_monthly / ledger_monthly desde leads y ledger (tras la migración o como cron)."""
+    from sigp.common.rollup_utils import rebuild_rollups, rollups_enabled
+
+    if not rollups_enabled():
+        raise click.ClickException("Faltan las tablas leads_monthly / ledger_monthly (migración 20261016_monthly_rollups.sql)")
+    t0 = time.perf_counter()
+    written = rebuild_rollups()
+    for table, rows in written.items():
+        click.echo(f"{table}: {rows} filas")
+    click.echo(f"Agregados recalculados en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+@sigp_cli.command("snapshot-dashboard")
+@click.option("--timeout", type=float, default=None,
+              help="Plazo máximo por sección (s; por defecto DASHBOARD_SNAPSHOT_TIMEOUT); "
+                   "las que no terminen conservan el valor del snapshot anterior.")
+def snapshot_dashboard_cmd(timeout):
+    """Precalcula el dashboard de dirección en dashboard_snapshot (cron cada N minutos)."""
+    from sigp.services.directive_service import compute_snapshot, snapshots_enabled
+
+    if not snapshots_enabled():
+        raise click.ClickException("Falta la tabla dashboard_snapshot (migración 20261016_dashboard_snapshot.sql)")
+    snapshot = compute_snapshot(timeout=timeout)
+    if snapshot is None:
+        raise click.ClickException("Otro proceso está calculando el snapshot")
+    payload = snapshot["payload"]
+    click.echo(f"Snapshot {snapshot['computed_at']:%Y-%m-%d %H:%M:%S} en {snapshot['duration_ms']} ms")
+    if payload.get("stale"):
+        click.echo("Secciones del snapshot anterior: " + ", ".join(payload["stale"]))
+    if payload["unavailable"]:
+        click.echo("Secciones no disponibles: " + ", ".join(payload["unavailable"]))
+
+
+@sigp_cli.command("reindex-leads")
+@click.option("--batch-size", default=1000, show_default=True, help="Leads por transacción.")
+def reindex_leads_cmd(batch_size):
+    """Recalcula leads.search_text (tras la migración o si se escribió en leads por fuera del ORM)."""
+    from sigp.models import Base
+    from sigp.common.search_utils import reindex_leads, search_enabled
+
+    if not search_enabled(getattr(Base.classes, "leads", None)):
+        raise click.ClickException("Falta la columna leads.search_text (migración 20261016_lead_search.sql)")
+    t0 = time.perf_counter()
+    changed = reindex_leads(batch_size=batch_size)
+    click.echo(f"{changed} leads actualizados ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+@sigp_cli.command("bench-lead-search")
+@click.option("--rows", default=1_000_000, show_default=True, help="Filas sintéticas en leads_search_bench.")
+@click.option("--term", "terms", multiple=True, help="Término a medir (repetible).")
+@click.option("--repeat", default=5, show_default=True, help="Repeticiones por consulta (se usa la mediana).")
+@click.option("--drop", is_flag=True, help="Borrar la tabla leads_search_bench al terminar.")
+def bench_lead_search_cmd(rows, terms, repeat, drop):
+    """Compara el filtro "Candidato" con ILIKE '%...%' y con search_text sobre una tabla sintética."""
+    from sigp.common.search_utils import BENCH_TABLE, bench_search, drop_bench, seed_bench
+
+    terms = terms or ("jose", "pérez", "maria nu", "lucia.garcia", "+34 612", "ibáñez")
+    t0 = time.perf_counter()
+    added = seed_bench(rows)
+    click.echo(f"{BENCH_TABLE}: {added} filas nuevas ({time.perf_counter() - t0:.1f} s)")
+    click.echo(f"{'término':<16} {'filas':>9} {'ILIKE ms':>10} {'search ms':>10}")
+    for term, found, old_ms, new_ms in bench_search(terms, repeat=repeat):
+        click.echo(f"{term:<16} {found:>9} {old_ms:>10.1f} {new_ms:>10.1f}")
+    if drop:
+        drop_bench()
+
+
+@sigp_cli.command("check-report-parity")
+@click.option("--seed", "rows", default=0, show_default=True,
+              help="Leads y movimientos sintéticos a añadir antes de comparar (se deshacen al terminar).")
+@click.option("--random-seed", default=42, show_default=True, help="Semilla de los datos sintéticos.")
+def check_report_parity_cmd(rows, random_seed):
+    """Compara el reporte de prescriptores con el cálculo original (con y sin agregados mensuales)."""
+    from sigp.services.report_parity import check_parity, seed
+
+    try:
+        if rows:
+            seed(db.session, rows, random_seed)
+            click.echo(f"{rows} leads y {rows} movimientos sintéticos añadidos")
+        checked, diffs = check_parity(db.session)
+    finally:
+        db.session.rollback()
+    for (prescriptor_id, date_from, date_to), mode, field, expected, actual in diffs[:20]:
+        click.echo(f"[{mode}] prescriptor={prescriptor_id or '*'} {date_from}..{date_to} {field}: {expected} != {actual}")
+    if diffs:
+        raise click.ClickException(f"{len(diffs)} diferencias en {checked} comparaciones")
+    click.echo(f"Sin diferencias en {checked} comparaciones")
@@ -0,0 +1,195 @@
+"""Cachés de proceso invalidadas por un contador de versión compartido en BD.
+
+Cada caché tiene un nombre en la tabla ``cache_versions``. Quien modifica los
+datos cacheados llama a ``bump_version(nombre)`` dentro de su transacción; cada
+worker relee la versión como mucho cada ``CACHE_VERSION_CHECK_SECONDS`` y, si
+cambió, vacía su copia. Así los demás procesos ven el cambio en segundos sin
+consultar los datos en cada petición.
+
+Si la tabla no existe todavía (migración sin aplicar) las cachés caducan cada
+``CACHE_VERSION_CHECK_SECONDS``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import scoped_session
+
+from sigp.common.metrics_utils import CACHE_REQUESTS
+
+_SELECT = text("SELECT version FROM cache_versions WHERE name = :name")
+_UPDATE = text("UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = :name")
+_INSERT = text("INSERT INTO cache_versions (name, version, updated_at) VALUES (:name, 1, CURRENT_TIMESTAMP)")
+_SUM_RANGE = text("SELECT COALESCE(SUM(version), 0) FROM cache_versions WHERE name >= :lo AND name < :hi")
+_SELECT_MANY = text("SELECT name, version FROM cache_versions WHERE name IN :names").bindparams(
+    bindparam("names", expanding=True)
+)
+# Incremento atómico aunque la fila no exista (varios workers a la vez)
+_UPSERT_MYSQL = text(
+    "INSERT INTO cache_versions (name, version, updated_at) VALUES (:name, 1, CURRENT_TIMESTAMP) "
+    "ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP"
+)
+_UPSERT_ON_CONFLICT = text(
+    "INSERT INTO cache_versions (name, version, updated_at) VALUES (:name, 1, CURRENT_TIMESTAMP) "
+    "ON CONFLICT (name) DO UPDATE SET version = cache_versions.version + 1, updated_at = CURRENT_TIMESTAMP"
+)
+
+_CACHES = {}  # nombre -> VersionedCache
+_state = {"table": None}
+
+
+def _check_interval():
+    return current_app.config.get("CACHE_VERSION_CHECK_SECONDS", 5)
+
+
+def read_version(name: str):
+    """Versión actual en BD (0 si no hay fila); sin tabla, un valor que cambia cada intervalo."""
+    from sigp import db
+
+    try:
+        with db.engine.connect() as conn:
+            value = conn.execute(_SELECT, {"name": name}).scalar()
+    except SQLAlchemyError:
+        return ("ttl", int(time.time() // max(_check_interval(), 1)))
+    return value or 0
+
+
+def bump_version(name: str, session=None) -> None:
+    """Incrementa la versión de ``name`` en la transacción de ``session`` (commit a cargo del llamador).
+
+    Los cambios pendientes del llamador se vuelcan antes, fuera del savepoint: sus
+    errores (p. ej. de integridad) le llegan a él. La copia de este worker se vacía
+    al hacer commit, no antes, para no recargarla con datos aún sin confirmar.
+    """
+    from sigp import db
+
+    session = session or db.session
+    session.flush()
+    try:
+        with session.begin_nested():
+            if session.execute(_UPDATE, {"name": name}).rowcount == 0:
+                session.execute(_INSERT, {"name": name})
+    except SQLAlchemyError as exc:
+        current_app.logger.warning("No se pudo incrementar cache_versions.%s: %s", name, exc)
+    cache = _CACHES.get(name)
+    if cache is not None:
+        target = session() if isinstance(session, scoped_session) else session
+        event.listen(target, "after_commit", lambda _session: cache.clear(), once=True)
+
+
+def read_versions(names, session=None) -> dict:
+    """{nombre: versión} de varios contadores en una consulta (0 si no hay fila).
+
+    Se lee con ``session`` (la de la petición: en réplica si la vista es de sólo
+    lectura), así la versión y los datos que protege salen de la misma copia.
+    """
+    from sigp import db
+
+    session = session or db.session
+    names = sorted(set(names))
+    try:
+        found = dict(session.execute(_SELECT_MANY, {"names": names}).all())
+    except SQLAlchemyError:
+        found = {}
+    return {name: found.get(name, 0) for name in names}
+
+
+def read_version_sum(prefix: str, session=None) -> int:
+    """Suma de las versiones cuyo nombre empieza por ``prefix`` (misma copia que ``session``).
+
+    Las versiones sólo crecen: la suma cambia en cuanto se incrementa cualquiera,
+    sin que los escritores tengan que tocar una fila común.
+    """
+    from sigp import db
+
+    session = session or db.session
+    # rango en lugar de LIKE: "_" es comodín y el rango usa la clave primaria
+    hi = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    try:
+        return int(session.execute(_SUM_RANGE, {"lo": prefix, "hi": hi}).scalar() or 0)
+    except SQLAlchemyError:
+        return 0
+
+
+def _versions_table(connection) -> bool:
+    if _state["table"] is None:
+        try:
+            _state["table"] = inspect(connection).has_table("cache_versions")
+        except SQLAlchemyError:
+            return False
+    return _state["table"]
+
+
+def bump_versions(names, connection) -> None:
+    """Incrementa varios contadores sobre ``connection`` (sirve dentro de un flush del ORM)."""
+    names = sorted(set(names))  # orden fijo: evita interbloqueos entre transacciones
+    if not names or not _versions_table(connection):
+        return
+    stmt = _UPSERT_MYSQL if connection.dialect.name == "mysql" else _UPSERT_ON_CONFLICT
+    connection.execute(stmt, [{"name": name} for name in names])
+
+
+class VersionedCache:
+    """Diccionario de proceso que se vacía cuando cambia la versión ``name`` en BD.
+
+    Con ``maxsize`` se comporta como LRU y descarta las entradas menos usadas.
+    """
+
+    def __init__(self, name: str, maxsize=None):
+        self.name = name
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = 0.0
+        self._generation = 0  # cambia en cada vaciado: evita guardar valores calculados antes
+        _CACHES[name] = self
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._version = None
+            self._checked = 0.0
+
+    def _validate(self) -> None:
+        now = time.monotonic()
+        if now - self._checked < _check_interval():
+            return
+        version = read_version(self.name)
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._generation += 1
+                self._version = version
+            self._checked = now
+
+    def get(self, key, loader, ttl=None):
+        """Valor cacheado para ``key``; si falta (o lleva más de ``ttl`` s) se calcula con ``loader()``."""
+        self._validate()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                if self.maxsize:
+                    self._data.move_to_end(key)
+                CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+                return entry[1]
+            generation = self._generation
+        CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (now + ttl if ttl else None, value)
+                if self.maxsize:
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+        return value
+
+    def discard(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
@@ -4,10 +4,13 @@ Moved from sigp.email_utils to sigp.common.email_utils.
 from __future__ import annotations
 
 import smtplib
+import time
 from email.message import EmailMessage
 from typing import Sequence, Optional
 from flask import current_app
 
+from sigp.common.metrics_utils import SMTP_FAILURES, SMTP_SECONDS
+
 
 def send_simple_mail(to: Sequence[str], subject: str, body: str, *, html: bool=False, text_body: Optional[str]=None) -> None:
     if not to:
@@ -35,6 +38,7 @@ def send_simple_mail(to: Sequence[str], subject: str, body: str, *, html: bool=F
     else:
         msg.set_content(body)
 
+    started = time.perf_counter()
     try:
         if use_ssl:
             smtp = smtplib.SMTP_SSL(server, port, timeout=10)
@@ -48,4 +52,7 @@ def send_simple_mail(to: Sequence[str], subject: str, body: str, *, html: bool=F
             s.send_message(msg)
         current_app.logger.info("Sent lead notification email to %s", to)
     except Exception as exc:  # pylint: disable=broad-except
+        SMTP_FAILURES.labels(sender="send_simple_mail").inc()
         current_app.logger.error("Failed to send email to %s: %s", to, exc)
+    finally:
+        SMTP_SECONDS.labels(sender="send_simple_mail").observe(time.perf_counter() - started)
@@ -7,6 +7,7 @@ from typing import Optional
 
 from sigp import db
 from sigp.models import Base
+from sigp.common.rollup_utils import add_objects
 
 Ledger = getattr(Base.classes, "ledger", None)
 PrescComm = getattr(Base.classes, "prescriptor_commission", None)
@@ -77,11 +78,12 @@ def create_commission_ledger(lead) -> int:  # noqa: C901
     # state pending id
     state_id = PENDING_ID
     if StateLedger is not None:
-        st = db.session.query(StateLedger).get(PENDING_ID)
-        if not st:
+        from sigp.services import catalogue_service
+
+        if catalogue_service.get("state_ledger", PENDING_ID) is None:
             # fallback to first state
-            first = db.session.query(StateLedger).first()
-            state_id = first.id if first else PENDING_ID
+            states = catalogue_service.rows("state_ledger")
+            state_id = states[0].id if states else PENDING_ID
 
     movements = []
 
@@ -124,5 +126,7 @@ def create_commission_ledger(lead) -> int:  # noqa: C901
 
     if movements:
         db.session.bulk_save_objects(movements)
+        # bulk_save_objects no pasa por el flush del ORM
+        add_objects(movements)
         db.session.commit()
     return len(movements)
@@ -0,0 +1,199 @@
+"""Métricas Prometheus del proceso: latencias por endpoint, BD, pool, SMTP y contratos.
+
+``/metrics`` expone el formato de texto de Prometheus sólo a las IPs de
+``METRICS_ALLOWED_IPS`` y, si se define ``METRICS_TOKEN``, sólo con la cabecera
+``Authorization: Bearer <token>``. Detrás de un proxy inverso hay que definir
+``PROXY_FIX_X_FOR`` para que la IP comprobada sea la del cliente y no la del proxy. Con varios workers de gunicorn hay que definir
+``PROMETHEUS_MULTIPROC_DIR`` (directorio vacío en cada arranque) para que la
+respuesta agregue todos los procesos; ver README.
+
+``prometheus_client`` es opcional: sin él las métricas son no-ops y
+``/metrics`` responde 503.
+"""
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # pragma: no cover - dependencia opcional
+    prometheus_client = None
+
+_G_START = "_sigp_metrics_start"
+_MULTIPROC = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Cubos en segundos: peticiones web típicas y tareas largas (PDF, firma, SMTP)
+_REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_TASK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+class _NoopMetric:
+    """Sustituto cuando prometheus_client no está instalado."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args, **kwargs):
+        pass
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+
+def _metric(cls_name, name, doc, labels=(), **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    cls = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[cls_name]
+    if cls_name == "gauge" and _MULTIPROC:
+        kwargs.setdefault("multiprocess_mode", "livesum")
+    return cls(name, doc, labels, **kwargs)
+
+
+REQUEST_SECONDS = _metric(
+    "histogram", "sigp_http_request_duration_seconds", "Latencia de las peticiones HTTP.",
+    ("blueprint", "endpoint", "method"), buckets=_REQUEST_BUCKETS,
+)
+REQUESTS_TOTAL = _metric(
+    "counter", "sigp_http_requests_total", "Peticiones HTTP por código de estado.",
+    ("blueprint", "endpoint", "status"),
+)
+REQUEST_DB_SECONDS = _metric(
+    "histogram", "sigp_http_request_db_seconds", "Tiempo en BD por petición.",
+    ("blueprint", "endpoint"), buckets=_REQUEST_BUCKETS,
+)
+REQUEST_DB_QUERIES = _metric(
+    "histogram", "sigp_http_request_db_queries", "Sentencias SQL por petición.",
+    ("blueprint", "endpoint"), buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+POOL_CHECKED_OUT = _metric(
+    "gauge", "sigp_db_pool_checked_out", "Conexiones del pool en uso.", ("bind",),
+)
+POOL_SIZE = _metric(
+    "gauge", "sigp_db_pool_size", "Tamaño configurado del pool.", ("bind",),
+)
+POOL_OVERFLOW = _metric(
+    "gauge", "sigp_db_pool_overflow", "Conexiones de overflow abiertas.", ("bind",),
+)
+SMTP_SECONDS = _metric(
+    "histogram", "sigp_smtp_send_seconds", "Duración de los envíos SMTP.",
+    ("sender",), buckets=_TASK_BUCKETS,
+)
+SMTP_FAILURES = _metric(
+    "counter", "sigp_smtp_failures_total", "Envíos SMTP fallidos.", ("sender",),
+)
+CONTRACT_SECONDS = _metric(
+    "histogram", "sigp_contract_operation_seconds",
+    "Duración de la generación, estampado y firma PAdES de contratos.",
+    ("operation",), buckets=_TASK_BUCKETS,
+)
+CONTRACT_FAILURES = _metric(
+    "counter", "sigp_contract_operation_failures_total", "Operaciones de contrato fallidas.",
+    ("operation",),
+)
+CACHE_REQUESTS = _metric(
+    "counter", "sigp_cache_requests_total", "Consultas a las cachés de proceso (hit/miss).",
+    ("cache", "result"),
+)
+
+
+@contextmanager
+def track(histogram, failures=None, **labels):
+    """Mide la duración del bloque; si lanza excepción incrementa ``failures``."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if failures is not None:
+            failures.labels(**labels).inc()
+        raise
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def timed(histogram, failures=None, **labels):
+    """Decorador equivalente a ``track``."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(histogram, failures, **labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _update_pool_gauges(engines):
+    from sigp.common.pool_utils import pool_stats
+
+    for bind, engine in engines.items():
+        stats = pool_stats(engine)
+        label = bind or "default"
+        for gauge, key in ((POOL_CHECKED_OUT, "checked_out"), (POOL_SIZE, "size"), (POOL_OVERFLOW, "overflow")):
+            if isinstance(stats.get(key), int):
+                gauge.labels(bind=label).set(stats[key])
+
+
+def _metrics_response():
+    if prometheus_client is None:
+        return Response("prometheus_client no instalado\n", 503, mimetype="text/plain")
+    if _MULTIPROC:
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def install_metrics(app):
+    """Registra ``/metrics`` y los hooks de petición (METRICS_ENABLED)."""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    from sigp import db
+    from sigp.common.sql_utils import request_sql_stats
+
+    allowed = set(app.config.get("METRICS_ALLOWED_IPS") or ())
+    token = app.config.get("METRICS_TOKEN") or ""
+
+    @app.before_request
+    def _metrics_start():
+        g.setdefault(_G_START, time.perf_counter())
+
+    @app.after_request
+    def _metrics_finish(response):
+        started = g.pop(_G_START, None)
+        if started is None or request.endpoint == "metrics":
+            return response
+        blueprint = request.blueprint or "app"
+        endpoint = request.endpoint or "none"
+        REQUEST_SECONDS.labels(blueprint, endpoint, request.method).observe(time.perf_counter() - started)
+        REQUESTS_TOTAL.labels(blueprint, endpoint, str(response.status_code)).inc()
+        stats = request_sql_stats()
+        if stats is not None:
+            REQUEST_DB_SECONDS.labels(blueprint, endpoint).observe(stats["ms"] / 1000)
+            REQUEST_DB_QUERIES.labels(blueprint, endpoint).observe(stats["count"])
+        _update_pool_gauges(db.engines)
+        return response
+
+    def metrics():
+        if allowed and request.remote_addr not in allowed:
+            return Response("Prohibido\n", 403, mimetype="text/plain")
+        if token and not hmac.compare_digest(
+            request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+        ):
+            return Response("No autorizado\n", 401, mimetype="text/plain", headers={"WWW-Authenticate": "Bearer"})
+        _update_pool_gauges(db.engines)
+        return _metrics_response()
+
+    app.add_url_rule("/metrics", "metrics", metrics)
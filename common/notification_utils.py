@@ -0,0 +1,166 @@
+"""Contador de notificaciones no leídas por usuario (tabla ``notification_counters``).
+
+``inject_unread_count`` lee el contador en lugar de hacer ``COUNT(*)`` sobre
+``notifications`` en cada página. El contador se mantiene así:
+
+* altas, bajas y cambios de ``is_read`` hechos con el ORM (``session.add``,
+  ``session.delete``, ``notif.is_read = ...``) se aplican solos en cada flush;
+* las operaciones masivas que no pasan por el ORM (``bulk_save_objects``,
+  ``query.update``) llaman a ``adjust_unread`` / ``reset_unread``.
+
+Un usuario sin fila se inicializa con un ``COUNT`` la primera vez que se lee, y
+``flask sigp reconcile-unread`` (cron) corrige cualquier desviación. Sin la
+migración aplicada todo sigue funcionando con ``COUNT``.
+"""
+from collections import Counter
+
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm.base import NO_VALUE
+
+from sigp.common.replica_utils import RoutingSession
+
+TABLE = "notification_counters"
+_state = {"enabled": None}
+
+_SELECT = sa.text("SELECT unread FROM notification_counters WHERE user_id = :user_id")
+_ADJUST = sa.text(
+    "UPDATE notification_counters "
+    "SET unread = CASE WHEN unread + :delta < 0 THEN 0 ELSE unread + :delta END, updated_at = CURRENT_TIMESTAMP "
+    "WHERE user_id = :user_id"
+)
+_SET = sa.text("UPDATE notification_counters SET unread = :unread, updated_at = CURRENT_TIMESTAMP WHERE user_id = :user_id")
+_INSERT = sa.text(
+    "INSERT INTO notification_counters (user_id, unread, updated_at) VALUES (:user_id, :unread, CURRENT_TIMESTAMP)"
+)
+
+
+def counters_enabled(bind=None) -> bool:
+    """True si existe la tabla de contadores (se comprueba una vez por proceso)."""
+    if _state["enabled"] is None:
+        from sigp import db
+
+        try:
+            _state["enabled"] = sa.inspect(bind if bind is not None else db.engine).has_table(TABLE)
+        except SQLAlchemyError:
+            return False
+    return _state["enabled"]
+
+
+def _notification_model():
+    from sigp.models import Base
+
+    return getattr(Base.classes, "notifications", None)
+
+
+def _count_unread(session, user_id) -> int:
+    Notification = _notification_model()
+    if Notification is None:
+        return 0
+    return session.query(Notification).filter_by(user_id=user_id, is_read=0).count()
+
+
+def unread_count(user_id) -> int:
+    """Notificaciones no leídas de ``user_id``."""
+    from sigp import db
+
+    if not counters_enabled():
+        return _count_unread(db.session, user_id)
+    value = db.session.execute(_SELECT, {"user_id": user_id}).scalar()
+    if value is not None:
+        return value
+    value = _count_unread(db.session, user_id)
+    # Inicialización en una transacción propia: la de la petición puede no confirmarse
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(_INSERT, {"user_id": user_id, "unread": value})
+    except IntegrityError:
+        pass  # otro worker la creó a la vez
+    return value
+
+
+def adjust_unread(user_id, delta: int, session=None) -> None:
+    """Suma ``delta`` al contador de ``user_id`` en la transacción de ``session``."""
+    from sigp import db
+
+    session = session or db.session
+    if user_id is None or not delta or not counters_enabled():
+        return
+    # Sin fila no hay nada que ajustar: el primer unread_count la crea con COUNT
+    session.execute(_ADJUST, {"user_id": user_id, "delta": delta})
+
+
+def reset_unread(user_id, session=None) -> None:
+    """Pone a cero el contador de ``user_id`` (p. ej. tras marcar todas como leídas)."""
+    from sigp import db
+
+    session = session or db.session
+    if user_id is not None and counters_enabled():
+        session.execute(_SET, {"user_id": user_id, "unread": 0})
+
+
+def reconcile_unread(session=None) -> int:
+    """Recalcula todos los contadores con ``COUNT``; devuelve cuántos se corrigieron."""
+    from sigp import db
+
+    session = session or db.session
+    Notification = _notification_model()
+    if Notification is None or not counters_enabled():
+        return 0
+    actual = dict(
+        session.query(Notification.user_id, sa.func.count())
+        .filter(Notification.is_read == 0)
+        .group_by(Notification.user_id)
+    )
+    stored = dict(session.execute(sa.text("SELECT user_id, unread FROM notification_counters")).all())
+    fixed = 0
+    for user_id in set(actual) | set(stored):
+        if user_id is None:
+            continue
+        value = actual.get(user_id, 0)
+        if stored.get(user_id) == value:
+            continue
+        if user_id in stored:
+            session.execute(_SET, {"user_id": user_id, "unread": value})
+        else:
+            session.execute(_INSERT, {"user_id": user_id, "unread": value})
+        fixed += 1
+    session.commit()
+    return fixed
+
+
+def _is_notification(obj) -> bool:
+    table = getattr(obj, "__table__", None)
+    return table is not None and table.name == "notifications"
+
+
+def _unread(value) -> bool:
+    # None => todavía sin valor: la columna tiene DEFAULT 0
+    return not value
+
+
+@sa.event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        if _is_notification(obj) and _unread(sa.inspect(obj).dict.get("is_read")):
+            deltas[obj.user_id] += 1
+    for obj in session.deleted:
+        if _is_notification(obj):
+            attr = sa.inspect(obj).attrs.is_read
+            if attr.loaded_value is not NO_VALUE and _unread(attr.loaded_value):
+                deltas[obj.user_id] -= 1
+    for obj in session.dirty:
+        if not _is_notification(obj):
+            continue
+        history = sa.inspect(obj).attrs.is_read.history
+        if not history.added or not history.deleted:
+            continue  # sin cambio o valor anterior desconocido (lo corrige reconcile-unread)
+        was, now = _unread(history.deleted[0]), _unread(history.added[0])
+        if was != now:
+            deltas[obj.user_id] += 1 if now else -1
+    deltas = {uid: d for uid, d in deltas.items() if uid is not None and d}
+    if not deltas or not counters_enabled(session.connection()):
+        return
+    for user_id, delta in deltas.items():
+        session.execute(_ADJUST, {"user_id": user_id, "delta": delta})
@@ -0,0 +1,177 @@
+"""Paginación por cursor (keyset) para los listados grandes.
+
+En lugar de ``OFFSET (page-1)*per_page`` cada página sigue desde la clave de
+orden de la fila frontera de la anterior (``created_at, id`` en leads,
+prescriptores y notificaciones; ``email, id`` en usuarios). Con el índice
+compuesto correspondiente (migración 20261016_keyset_indexes.sql) el coste de
+una página no depende de lo profunda que sea.
+
+Los enlaces "Anterior" / "Siguiente" llevan un token opaco firmado con la
+SECRET_KEY (dirección + clave de la fila frontera): no se puede manipular y un
+token inválido o caducado vuelve a la primera página.
+
+El total se obtiene con ``cached_count``: un ``COUNT(*)`` por filtro cada
+LIST_COUNT_TTL segundos como mucho (0 => exacto en cada petición).
+"""
+import datetime as _dt
+from decimal import Decimal
+
+import sqlalchemy as sa
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from sigp.common.cache_utils import VersionedCache
+
+LIST_COUNT_CACHE = "list_counts"
+_counts = VersionedCache(LIST_COUNT_CACHE, maxsize=1024)
+
+NEXT = "n"
+PREV = "p"
+
+
+class KeysetPage:
+    """Una página de resultados con los tokens para moverse desde ella."""
+
+    def __init__(self, items, per_page, next_token=None, prev_token=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_token = next_token
+        self.prev_token = prev_token
+        self.total = total
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_token is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_token is not None
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="sigp-keyset")
+
+
+def _encode_value(value):
+    if isinstance(value, _dt.datetime):
+        return ["dt", value.isoformat()]
+    if isinstance(value, _dt.date):
+        return ["d", value.isoformat()]
+    if isinstance(value, Decimal):
+        return ["dec", str(value)]
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, list):
+        kind, raw = value
+        if kind == "dt":
+            return _dt.datetime.fromisoformat(raw)
+        if kind == "d":
+            return _dt.date.fromisoformat(raw)
+        if kind == "dec":
+            return Decimal(raw)
+        raise ValueError(kind)
+    return value
+
+
+def encode_token(direction: str, key) -> str:
+    return _serializer().dumps({"d": direction, "k": [_encode_value(v) for v in key]})
+
+
+def decode_token(token):
+    """(dirección, clave) de un token; None si falta o no es válido."""
+    if not token:
+        return None
+    try:
+        data = _serializer().loads(token)
+        return data["d"], tuple(_decode_value(v) for v in data["k"])
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+def _nullable(column) -> bool:
+    return getattr(getattr(column, "expression", column), "nullable", True)
+
+
+def _eq(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _lt(column, value):
+    # Como en MySQL, NULL ordena antes que cualquier valor
+    if value is None:
+        return sa.false()
+    if _nullable(column):
+        return sa.or_(column < value, column.is_(None))
+    return column < value
+
+
+def _gt(column, value):
+    return column.is_not(None) if value is None else column > value
+
+
+def _beyond(order, key, forward: bool):
+    """Filas posteriores (o anteriores) a ``key`` en el orden ``order``.
+
+    Se expande como ``a < x OR (a = x AND b < y)`` en vez de comparar tuplas
+    para que MySQL use el índice compuesto como rango. Las columnas que admiten
+    NULL (``created_at``, ``email``) se tratan con el orden de MySQL.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        after = _lt(column, key[i]) if descending == forward else _gt(column, key[i])
+        clauses.append(sa.and_(*[_eq(order[j][0], key[j]) for j in range(i)], after))
+    return sa.or_(*clauses)
+
+
+def keyset_paginate(query, order, per_page: int, token=None, key=None, total=None) -> KeysetPage:
+    """Página de ``query`` ordenada por ``order`` (``[(columna, descendente)]``).
+
+    La última columna de ``order`` debe ser única (el id). ``key(item)``
+    devuelve la clave de orden de un resultado; por defecto se leen los
+    atributos con el nombre de cada columna.
+    """
+    if key is None:
+        names = [column.key for column, _ in order]
+
+        def key(item):
+            return tuple(getattr(item, name) for name in names)
+
+    cursor = decode_token(token)
+    if cursor is not None and len(cursor[1]) != len(order):
+        cursor = None
+    forward = cursor is None or cursor[0] != PREV
+
+    q = query
+    if cursor is not None:
+        q = q.filter(_beyond(order, cursor[1], forward))
+    q = q.order_by(*[
+        column.desc() if descending == forward else column.asc() for column, descending in order
+    ])
+    rows = q.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    next_token = prev_token = None
+    if rows:
+        if more or not forward:
+            next_token = encode_token(NEXT, key(rows[-1]))
+        if (more and not forward) or (forward and cursor is not None):
+            prev_token = encode_token(PREV, key(rows[0]))
+    return KeysetPage(rows, per_page, next_token=next_token, prev_token=prev_token, total=total)
+
+
+def cached_count(query, cache_key, ttl=None) -> int:
+    """``query.count()`` cacheado ``ttl`` segundos (LIST_COUNT_TTL) bajo ``cache_key``."""
+    if ttl is None:
+        ttl = current_app.config.get("LIST_COUNT_TTL", 60)
+
+    def _count():
+        return query.order_by(None).count()
+
+    if not ttl:
+        return _count()
+    return _counts.get(cache_key, _count, ttl=ttl)
@@ -0,0 +1,83 @@
+"""Contadores del pool de conexiones para monitorización."""
+import threading
+import time
+
+from sqlalchemy import event
+
+_lock = threading.Lock()
+# engine -> contadores (``engine.dispose()`` cambia el pool pero no el engine)
+_STATS = {}
+
+
+def install_pool_metrics(engine) -> None:
+    """Registra listeners de pool en ``engine`` (idempotente).
+
+    Se escuchan en el engine, no en el pool concreto: siguen activos en el pool
+    nuevo que crea ``engine.dispose()`` (p. ej. en ``warm_up``).
+    """
+    key = engine
+    with _lock:
+        if key in _STATS:
+            return
+        _STATS[key] = stats = {
+            "connects": 0,
+            "checkouts": 0,
+            "checkins": 0,
+            "invalidations": 0,
+            "max_checked_out": 0,
+            "max_overflow_seen": 0,
+            "since": time.time(),
+        }
+
+    def _bump(name, n=1):
+        with _lock:
+            stats[name] += n
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, conn_record):
+        _bump("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        pool = engine.pool
+        checked_out = _safe(pool, "checkedout")
+        overflow = _safe(pool, "overflow")
+        with _lock:
+            stats["checkouts"] += 1
+            if checked_out is not None:
+                stats["max_checked_out"] = max(stats["max_checked_out"], checked_out)
+            if overflow is not None:
+                stats["max_overflow_seen"] = max(stats["max_overflow_seen"], overflow)
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, conn_record):
+        _bump("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, conn_record, exception):
+        _bump("invalidations")
+
+
+def _safe(pool, method):
+    fn = getattr(pool, method, None)
+    try:
+        return fn() if fn else None
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def pool_stats(engine) -> dict:
+    """Estado actual del pool más los contadores acumulados desde el arranque."""
+    pool = engine.pool
+    with _lock:
+        counters = dict(_STATS.get(engine, {}))
+    return {
+        "pool_class": type(pool).__name__,
+        "size": _safe(pool, "size"),
+        "checked_in": _safe(pool, "checkedin"),
+        "checked_out": _safe(pool, "checkedout"),
+        "overflow": _safe(pool, "overflow"),
+        "timeout": _safe(pool, "timeout"),
+        "status": _safe(pool, "status"),
+        **counters,
+    }
@@ -1,12 +1,25 @@
 """Helpers relacionados con prescriptores."""
+from types import SimpleNamespace
+
+import sqlalchemy as sa
+from flask import current_app
 from sigp import db
 from sigp.models import Base
+from sigp.common.cache_utils import VersionedCache, bump_version
 import uuid
 
 Prescriptor = getattr(Base.classes, "prescriptors", None)
 Program = getattr(Base.classes, "programs", None)
 PrescComm = getattr(Base.classes, "prescriptor_commission", None)
 
+# user_id -> datos del prescriptor que muestran las plantillas (o None)
+PRESCRIPTOR_SNAPSHOT_CACHE = "prescriptor_snapshot"
+_SNAPSHOTS = VersionedCache(PRESCRIPTOR_SNAPSHOT_CACHE)
+SNAPSHOT_FIELDS = (
+    "id", "user_id", "state_id", "squeeze_page_name", "squeeze_page_status", "photo_url", "contract_url",
+    "face_url", "linkedin_url", "instagram_url", "x_url", "whatsapp_number", "whatsapp_namber", "payment_details",
+)
+
 def _ensure_models():
     if not (Prescriptor and Program and PrescComm):
         raise RuntimeError("Tablas necesarias no reflejadas")
@@ -68,3 +81,30 @@ def sync_commissions_for_program(program_id: str):
     if new_objs:
         db.session.bulk_save_objects(new_objs)
         db.session.commit()
+
+
+def _load_snapshot(user_id):
+    # Del primario, como la versión: desde la réplica (vistas ``@read_replica``)
+    # se podría cachear un prescriptor anterior con la versión nueva
+    table = Prescriptor.__table__
+    cols = [table.c[f] for f in SNAPSHOT_FIELDS if f in table.c]
+    with db.engine.connect() as conn:
+        row = conn.execute(sa.select(*cols).where(table.c.user_id == user_id).limit(1)).first()
+    return SimpleNamespace(**row._asdict()) if row else None
+
+
+def prescriptor_snapshot(user_id):
+    """Campos de visualización del prescriptor de ``user_id`` (None si no tiene).
+
+    Se cachea en el proceso durante PRESCRIPTOR_SNAPSHOT_TTL segundos; las
+    vistas que modifican el prescriptor llaman a ``invalidate_prescriptor_snapshot``.
+    """
+    if Prescriptor is None or not hasattr(Prescriptor, "user_id") or not user_id:
+        return None
+    ttl = current_app.config.get("PRESCRIPTOR_SNAPSHOT_TTL", 60)
+    return _SNAPSHOTS.get(str(user_id), lambda: _load_snapshot(user_id), ttl=ttl)
+
+
+def invalidate_prescriptor_snapshot(session=None) -> None:
+    """Descarta los snapshots en todos los workers (commit a cargo del llamador)."""
+    bump_version(PRESCRIPTOR_SNAPSHOT_CACHE, session)
@@ -0,0 +1,236 @@
+"""Profiler bajo demanda: envuelve una petición en cProfile y deja el perfil en disco.
+
+Se activa con un token firmado que genera un usuario con ``read_monitoring``
+desde ``/monitoring/profiles`` (cabecera ``X-SIGP-Profile`` o cookie
+``sigp_profile``, nunca en la URL para que no acabe en logs ni en el Referer),
+o para una fracción ``PROFILER_SAMPLE_RATE`` del tráfico. El token sólo vale
+para peticiones del mismo usuario que lo generó y caduca a los
+PROFILER_TOKEN_MAX_AGE segundos. Por cada petición perfilada se escriben en
+``PROFILER_SPOOL_DIR``:
+
+* ``<id>.prof``: volcado de ``pstats`` (``snakeviz``, ``python -m pstats``);
+* ``<id>.collapsed``: pilas plegadas (``flamegraph.pl``, speedscope);
+* ``<id>.json``: endpoint, ruta, duración y origen (token o muestreo).
+
+cProfile sólo registra aristas llamador->llamado, así que las pilas plegadas
+reparten el tiempo de cada función entre sus llamadores en proporción al tiempo
+de cada arista: es una aproximación suficiente para ver dónde se va el tiempo.
+"""
+import cProfile
+import datetime as _dt
+import json
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from flask import current_app, g, request
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+TOKEN_HEADER = "X-SIGP-Profile"
+TOKEN_COOKIE = "sigp_profile"
+_SALT = "sigp.profiler"
+_G_KEY = "_sigp_profiler"
+
+# Pilas más profundas o ramas con menos tiempo que esto no se expanden
+_MAX_DEPTH = 64
+_MIN_BRANCH_US = 50
+_SAFE_NAME = re.compile(r"[^0-9A-Za-z_-]+")
+
+
+def _serializer(app=None):
+    app = app or current_app
+    return URLSafeTimedSerializer(app.config["SECRET_KEY"], salt=_SALT)
+
+
+def make_profile_token(user_id) -> str:
+    """Token firmado que activa el profiler; caduca a los PROFILER_TOKEN_MAX_AGE segundos."""
+    return _serializer().dumps({"u": str(user_id)})
+
+
+def _token_valid(token: str) -> bool:
+    """Firma correcta, sin caducar y emitido para el usuario de la petición."""
+    try:
+        data = _serializer().loads(token, max_age=current_app.config.get("PROFILER_TOKEN_MAX_AGE", 600))
+    except BadSignature:  # incluye SignatureExpired
+        return False
+    if not isinstance(data, dict) or not current_user.is_authenticated:
+        return False
+    return data.get("u") == current_user.get_id()
+
+
+def spool_dir(app=None) -> Path:
+    app = app or current_app
+    path = app.config.get("PROFILER_SPOOL_DIR") or os.path.join(app.instance_path, "profiles")
+    return Path(path)
+
+
+def _trigger():
+    """'token', 'sample' o None según deba perfilarse la petición actual."""
+    token = request.headers.get(TOKEN_HEADER) or request.cookies.get(TOKEN_COOKIE)
+    if token and _token_valid(token):
+        return "token"
+    rate = current_app.config.get("PROFILER_SAMPLE_RATE", 0) or 0
+    if rate > 0 and random.random() < rate:
+        return "sample"
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Pilas plegadas
+# ---------------------------------------------------------------------------
+
+
+def _frame_label(func) -> str:
+    filename, lineno, name = func
+    if filename == "~":  # built-ins: ('~', 0, "<built-in method ...>")
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    return label.replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats) -> Counter:
+    """Convierte un ``pstats.Stats`` en ``{"a;b;c": microsegundos_propios}``."""
+    raw = stats.stats  # func -> (cc, nc, tt, ct, {caller: (cc, nc, tt, ct)})
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+    roots = [func for func, entry in raw.items() if not entry[4]]
+
+    out = Counter()
+
+    def walk(func, path, on_path, share):
+        total = raw[func][3]
+        if total <= 0 or total * share * 1e6 < _MIN_BRANCH_US:
+            return
+        path = path + [_frame_label(func)]
+        own_us = int(raw[func][2] * share * 1e6)
+        if own_us:
+            out[";".join(path)] += own_us
+        if len(path) >= _MAX_DEPTH:
+            return
+        on_path = on_path | {func}
+        for child, edge_time in children.get(func, ()):
+            child_total = raw[child][3]
+            if child in on_path or child_total <= 0:
+                continue
+            # Fracción del tiempo total del hijo que llega por esta rama
+            walk(child, path, on_path, share * min(1.0, edge_time / child_total))
+
+    for root in roots:
+        walk(root, [], frozenset(), 1.0)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Spool
+# ---------------------------------------------------------------------------
+
+
+def _write_profile(app, profiler, meta):
+    folder = spool_dir(app)
+    folder.mkdir(parents=True, exist_ok=True)
+    now = _dt.datetime.utcnow()
+    endpoint = _SAFE_NAME.sub("_", meta.get("endpoint") or "none")
+    profile_id = f"{now:%Y%m%dT%H%M%S}-{endpoint}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    profiler.dump_stats(str(folder / f"{profile_id}.prof"))
+    stacks = collapsed_stacks(pstats.Stats(profiler))
+    with open(folder / f"{profile_id}.collapsed", "w", encoding="utf-8") as fh:
+        for stack, us in sorted(stacks.items()):
+            fh.write(f"{stack} {us}\n")
+    meta.update(id=profile_id, ts=now.isoformat(timespec="seconds") + "Z", pid=os.getpid())
+    with open(folder / f"{profile_id}.json", "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False)
+    _prune(folder, app.config.get("PROFILER_MAX_PROFILES", 200))
+    return profile_id
+
+
+def _prune(folder: Path, keep: int):
+    metas = sorted(folder.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in metas[keep:]:
+        for suffix in (".prof", ".collapsed", ".json"):
+            try:
+                old.with_suffix(suffix).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(app=None, limit=100):
+    """Metadatos de los perfiles más recientes (más nuevo primero)."""
+    folder = spool_dir(app)
+    if not folder.is_dir():
+        return []
+    rows = []
+    metas = sorted(folder.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in metas[:limit]:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                rows.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Hooks de Flask
+# ---------------------------------------------------------------------------
+
+
+def _stop():
+    state = g.pop(_G_KEY, None)
+    if state is not None:
+        state["profiler"].disable()
+    return state
+
+
+def install_profiler(app):
+    """Registra los hooks de petición (PROFILER_ENABLED)."""
+    if not app.config.get("PROFILER_ENABLED", True):
+        return
+
+    @app.before_request
+    def _profiler_start():
+        if request.endpoint == "static":
+            return
+        trigger = _trigger()
+        if trigger is None:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # ya hay otro profiler activo en este hilo
+            return
+        g.setdefault(_G_KEY, {"profiler": profiler, "trigger": trigger, "started": time.perf_counter()})
+
+    @app.after_request
+    def _profiler_finish(response):
+        state = _stop()
+        if state is None:
+            return response
+        meta = {
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "ms": round((time.perf_counter() - state["started"]) * 1000, 1),
+            "trigger": state["trigger"],
+        }
+        try:
+            profile_id = _write_profile(app, state["profiler"], meta)
+        except OSError as exc:
+            app.logger.warning("No se pudo guardar el perfil de %s: %s", request.path, exc)
+        else:
+            response.headers["X-SIGP-Profile-Id"] = profile_id
+        return response
+
+    @app.teardown_request
+    def _profiler_teardown(_exc):
+        _stop()
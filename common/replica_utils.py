@@ -0,0 +1,173 @@
+"""Enrutado de lecturas a la réplica de MySQL (bind ``replica`` de SQLALCHEMY_BINDS).
+
+Las vistas de sólo lectura marcadas con ``@read_replica`` envían a la réplica
+las sentencias que se sabe que son lecturas (``SELECT`` sin ``FOR UPDATE``,
+también en ``text()``); todo lo demás (DML, ``text("UPDATE ...")``, flush y
+``session.connection()`` sin sentencia) va siempre al primario.
+Tras una escritura el usuario sigue leyendo del primario durante
+``REPLICA_LAG_TOLERANCE`` segundos (read-after-write), y si la réplica va más
+retrasada que esa tolerancia se vuelve al primario.
+
+Este módulo no importa ``sigp``: lo usa ``sigp/__init__`` para crear ``db``.
+"""
+import re
+import threading
+import time
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = "replica"
+_WRITE_KEY = "_sigp_last_write"
+_G_FLAG = "_sigp_use_replica"
+
+_READ_TEXT = re.compile(r"^\s*(SELECT|SHOW)\b", re.IGNORECASE)
+_LOCKING_TEXT = re.compile(r"\bFOR\s+(UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b", re.IGNORECASE)
+
+_lag_lock = threading.Lock()
+_lag_state = {"checked": 0.0, "lag": None}
+
+
+def _is_read(clause) -> bool:
+    """True si ``clause`` es con seguridad una lectura sin bloqueos."""
+    if clause is None:
+        return False
+    if isinstance(clause, sa.sql.elements.TextClause):
+        return bool(_READ_TEXT.match(clause.text)) and not _LOCKING_TEXT.search(clause.text)
+    return bool(getattr(clause, "is_select", False)) and getattr(clause, "_for_update_arg", None) is None
+
+
+class RoutingSession(Session):
+    """Sesión de Flask-SQLAlchemy que envía a la réplica las lecturas de vistas ``@read_replica``."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and _is_read(clause)
+            and has_app_context()
+            and g.get(_G_FLAG)
+        ):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_configured() -> bool:
+    return REPLICA_BIND in (current_app.config.get("SQLALCHEMY_BINDS") or {})
+
+
+def mark_write() -> None:
+    """Recuerda en la sesión del usuario el momento de su última escritura."""
+    if has_request_context() and _replica_configured():
+        flask_session[_WRITE_KEY] = time.time()
+
+
+@sa.event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    mark_write()
+
+
+@sa.event.listens_for(RoutingSession, "do_orm_execute")
+def _on_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_write()
+
+
+def _query_lag(engine):
+    """Segundos de retraso de la réplica; 0 si no es réplica, None si no está sana."""
+    if engine.dialect.name != "mysql":
+        return 0
+    try:
+        with engine.connect() as conn:
+            for stmt, column in (
+                ("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                ("SHOW SLAVE STATUS", "Seconds_Behind_Master"),
+            ):
+                try:
+                    row = conn.exec_driver_sql(stmt).mappings().first()
+                except sa.exc.ProgrammingError:
+                    continue  # sintaxis no soportada por esta versión
+                if row is None:
+                    return 0
+                lag = row.get(column)
+                return None if lag is None else float(lag)
+    except Exception as exc:  # pylint: disable=broad-except
+        current_app.logger.warning("No se pudo consultar el estado de la réplica: %s", exc)
+    return None
+
+
+def replica_lag(engine):
+    """``_query_lag`` cacheado durante REPLICA_LAG_CHECK_SECONDS en el proceso."""
+    interval = current_app.config.get("REPLICA_LAG_CHECK_SECONDS", 10)
+    now = time.monotonic()
+    if now - _lag_state["checked"] < interval:
+        return _lag_state["lag"]
+    with _lag_lock:
+        if now - _lag_state["checked"] >= interval:
+            _lag_state["lag"] = _query_lag(engine)
+            _lag_state["checked"] = time.monotonic()
+    return _lag_state["lag"]
+
+
+def replica_allowed() -> bool:
+    """True si la petición actual puede leer de la réplica."""
+    from sigp import db
+
+    if not _replica_configured() or request.method not in ("GET", "HEAD"):
+        return False
+    tolerance = current_app.config.get("REPLICA_LAG_TOLERANCE", 5)
+    last_write = flask_session.get(_WRITE_KEY)
+    if last_write and time.time() - last_write < tolerance:
+        return False
+    lag = replica_lag(db.engines[REPLICA_BIND])
+    return lag is not None and lag <= tolerance
+
+
+def read_engine():
+    """Engine del que lee la petición actual (réplica en vistas ``@read_replica``).
+
+    Para consultas lanzadas en otros hilos, que no ven el ``g`` de la petición.
+    """
+    from sigp import db
+
+    if has_app_context() and g.get(_G_FLAG):
+        engine = db.engines.get(REPLICA_BIND)
+        if engine is not None:
+            return engine
+    return db.engine
+
+
+def background_read_engine():
+    """Engine para lecturas fuera de una petición (hilos en segundo plano, CLI).
+
+    La réplica si está configurada y su retraso no supera REPLICA_LAG_TOLERANCE;
+    si no, el primario.
+    """
+    from sigp import db
+
+    if _replica_configured():
+        engine = db.engines[REPLICA_BIND]
+        lag = replica_lag(engine)
+        if lag is not None and lag <= current_app.config.get("REPLICA_LAG_TOLERANCE", 5):
+            return engine
+    return db.engine
+
+
+def read_replica(func):
+    """Marca una vista de sólo lectura para que sus consultas vayan a la réplica."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not replica_allowed():
+            return func(*args, **kwargs)
+        g.setdefault(_G_FLAG, True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.pop(_G_FLAG, None)
+
+    return wrapper
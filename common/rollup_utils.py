@@ -0,0 +1,428 @@
+"""Agregados mensuales de leads y ledger (tablas ``leads_monthly`` / ``ledger_monthly``).
+
+Una fila por prescriptor, mes (``YYYY-MM`` de ``created_at``) y estado con el
+nº de filas y, en ledger, la suma de importes (``amount``) y de importes con
+signo (``amount * COALESCE(sign, 1)``). El reporte de prescriptores y el
+dashboard de dirección leen estas tablas en lugar de recorrer todo el histórico.
+
+Se mantienen en la misma transacción que la escritura:
+
+* altas, bajas y cambios hechos con el ORM (``session.add``, ``session.delete``,
+  ``lead.state_id = ...``) se aplican solos en cada flush;
+* las operaciones masivas que no pasan por el ORM usan ``add_objects`` (tras
+  ``bulk_save_objects``), ``bulk_update`` y ``bulk_delete``.
+
+``flask sigp rebuild-rollups`` las recalcula desde cero (tras la migración y,
+como cron, para corregir cualquier desviación); mientras dura, las escrituras en
+leads y ledger esperan. Sin la migración aplicada los lectores vuelven a
+consultar ``leads`` / ``ledger`` directamente.
+
+Los mismos puntos incrementan en ``cache_versions`` la generación de cada
+prescriptor afectado (``generation_name(id)``): las cachés de resultados
+(reporte de prescriptores) la incluyen en su clave. No hay una fila global que
+todos los escritores bloqueen hasta el commit; la generación de "todos" es la
+suma de las de cada prescriptor (``read_generation()``).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.base import NO_VALUE
+
+from sigp.common.cache_utils import bump_versions, read_version_sum, read_versions
+from sigp.common.replica_utils import RoutingSession
+
+# Centinelas: las columnas de la clave primaria no admiten NULL
+NO_PRESCRIPTOR = ""
+NO_MONTH = ""
+NO_STATE = 0
+
+KEY_COLUMNS = ("prescriptor_id", "ym", "state_id")
+GENERATION_PREFIX = "prescriptor_data"
+
+_metadata = sa.MetaData()
+
+LEADS_MONTHLY = sa.Table(
+    "leads_monthly",
+    _metadata,
+    sa.Column("prescriptor_id", sa.String(36), primary_key=True),
+    sa.Column("ym", sa.String(7), primary_key=True),
+    sa.Column("state_id", sa.Integer, primary_key=True),
+    sa.Column("count", sa.Integer, nullable=False, default=0),
+)
+
+LEDGER_MONTHLY = sa.Table(
+    "ledger_monthly",
+    _metadata,
+    sa.Column("prescriptor_id", sa.String(36), primary_key=True),
+    sa.Column("ym", sa.String(7), primary_key=True),
+    sa.Column("state_id", sa.Integer, primary_key=True),
+    sa.Column("count", sa.Integer, nullable=False, default=0),
+    sa.Column("amount", sa.Numeric(14, 2), nullable=False, default=0),
+    sa.Column("amount_signed", sa.Numeric(14, 2), nullable=False, default=0),
+)
+
+_state = {"enabled": None}
+
+
+def _decimal(value):
+    if value is None:
+        return Decimal(0)
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _lead_measures(row):
+    return {"count": 1}
+
+
+def _ledger_measures(row):
+    amount = _decimal(row["amount"])
+    sign = row["sign"]
+    return {"count": 1, "amount": amount, "amount_signed": amount * (1 if sign is None else sign)}
+
+
+class _Rollup:
+    def __init__(self, source, table, fields, measures):
+        self.source = source  # tabla de origen
+        self.table = table
+        self.fields = fields  # columnas de origen que afectan al agregado
+        self.measures = measures
+
+    def measures_columns(self):
+        return [c.name for c in self.table.columns if c.name not in KEY_COLUMNS]
+
+    def model(self):
+        from sigp.models import Base
+
+        return getattr(Base.classes, self.source, None)
+
+
+_ROLLUPS = {
+    "leads": _Rollup("leads", LEADS_MONTHLY, ("prescriptor_id", "created_at", "state_id"), _lead_measures),
+    "ledger": _Rollup(
+        "ledger", LEDGER_MONTHLY, ("prescriptor_id", "created_at", "state_id", "amount", "sign"), _ledger_measures
+    ),
+}
+
+
+def rollups_enabled(bind=None) -> bool:
+    """True si existen las dos tablas de agregados (se comprueba una vez por proceso)."""
+    if _state["enabled"] is None:
+        from sigp import db
+
+        try:
+            inspector = sa.inspect(bind if bind is not None else db.engine)
+            _state["enabled"] = all(inspector.has_table(r.table.name) for r in _ROLLUPS.values())
+        except SQLAlchemyError:
+            return False
+    return _state["enabled"]
+
+
+def generation_name(prescriptor_id) -> str:
+    """Nombre en ``cache_versions`` de la generación de datos de un prescriptor ("-": sin prescriptor)."""
+    return f"{GENERATION_PREFIX}:{prescriptor_id or '-'}"
+
+
+def read_generation(session, prescriptor_id=None) -> int:
+    """Generación de datos de un prescriptor o, sin ``prescriptor_id``, de todos."""
+    if prescriptor_id:
+        name = generation_name(prescriptor_id)
+        return read_versions([name], session)[name]
+    return read_version_sum(f"{GENERATION_PREFIX}:", session)
+
+
+def month_key(value) -> str:
+    """``YYYY-MM`` de una fecha (``NO_MONTH`` si es NULL)."""
+    if value is None:
+        return NO_MONTH
+    if isinstance(value, str):
+        return value[:7]
+    return f"{value:%Y-%m}"
+
+
+def _key(row):
+    prescriptor_id = row["prescriptor_id"]
+    state_id = row["state_id"]
+    return (
+        NO_PRESCRIPTOR if prescriptor_id is None else str(prescriptor_id),
+        month_key(row["created_at"]),
+        NO_STATE if state_id is None else int(state_id),
+    )
+
+
+def _accumulate(deltas, rollup, row, factor):
+    bucket = deltas[rollup.source][_key(row)]
+    for name, value in rollup.measures(row).items():
+        bucket[name] = bucket.get(name, 0) + value * factor
+
+
+def _upsert_statement(dialect, rollup, rows):
+    """INSERT multi-fila que suma las medidas si la clave ya existe."""
+    table = rollup.table
+    measures = rollup.measures_columns()
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update({m: table.c[m] + stmt.inserted[m] for m in measures})
+    insert = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}[dialect]
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS), set_={m: table.c[m] + stmt.excluded[m] for m in measures}
+    )
+
+
+def _apply(session, deltas) -> None:
+    """Suma ``deltas`` ({origen: {clave: {medida: delta}}}) en la transacción de ``session``."""
+    if not any(deltas.values()):
+        return
+    connection = session.connection()
+    prescriptors = {key[0] for by_key in deltas.values() for key in by_key}
+    bump_versions([generation_name(p) for p in prescriptors], connection)
+    if not rollups_enabled(connection):
+        return
+    for source, by_key in deltas.items():
+        rollup = _ROLLUPS[source]
+        rows = [
+            dict(zip(KEY_COLUMNS, key), **{m: values.get(m, 0) for m in rollup.measures_columns()})
+            for key, values in by_key.items()
+            if any(values.values())
+        ]
+        if rows:
+            connection.execute(_upsert_statement(connection.dialect.name, rollup, rows))
+
+
+def _new_deltas():
+    return defaultdict(lambda: defaultdict(dict))
+
+
+# ---------------------------------------------------------------------------
+# Escrituras fuera del flush del ORM
+# ---------------------------------------------------------------------------
+
+
+def add_objects(objects, session=None) -> None:
+    """Aplica las altas insertadas con ``bulk_save_objects`` (no pasan por el flush)."""
+    from sigp import db
+
+    session = session or db.session
+    deltas = _new_deltas()
+    for obj in objects:
+        rollup = _rollup_for(obj)
+        if rollup is not None:
+            _accumulate(deltas, rollup, {f: getattr(obj, f, None) for f in rollup.fields}, 1)
+    _apply(session, deltas)
+
+
+def _query_rollup(query):
+    entity = query.column_descriptions[0]["entity"]
+    table = getattr(entity, "__table__", None)
+    return entity, _ROLLUPS.get(getattr(table, "name", None))
+
+
+def _snapshot(query, entity, rollup):
+    """Filas que va a tocar ``query``, bloqueadas (``FOR UPDATE``) hasta el commit.
+
+    Sin el bloqueo, en REPEATABLE READ el SELECT ve la foto de la transacción y el
+    UPDATE/DELETE las últimas filas confirmadas: un cambio concurrente entre ambos
+    descuadraría los agregados.
+    """
+    columns = [getattr(entity, f) for f in rollup.fields]
+    return [dict(zip(rollup.fields, row)) for row in query.with_entities(*columns).with_for_update().all()]
+
+
+def bulk_update(query, values, **kwargs) -> int:
+    """``query.update(values, **kwargs)`` manteniendo los agregados del modelo de ``query``."""
+    entity, rollup = _query_rollup(query)
+    changes = {getattr(k, "key", k): v for k, v in values.items()}
+    if rollup is None or not set(changes) & set(rollup.fields):
+        return query.update(values, **kwargs)
+    before = _snapshot(query, entity, rollup)
+    updated = query.update(values, **kwargs)
+    deltas = _new_deltas()
+    for row in before:
+        _accumulate(deltas, rollup, row, -1)
+        _accumulate(deltas, rollup, {**row, **{f: changes[f] for f in rollup.fields if f in changes}}, 1)
+    _apply(query.session, deltas)
+    return updated
+
+
+def bulk_delete(query, **kwargs) -> int:
+    """``query.delete(**kwargs)`` manteniendo los agregados del modelo de ``query``."""
+    entity, rollup = _query_rollup(query)
+    if rollup is None:
+        return query.delete(**kwargs)
+    before = _snapshot(query, entity, rollup)
+    deleted = query.delete(**kwargs)
+    deltas = _new_deltas()
+    for row in before:
+        _accumulate(deltas, rollup, row, -1)
+    _apply(query.session, deltas)
+    return deleted
+
+
+# ---------------------------------------------------------------------------
+# Recalculo completo
+# ---------------------------------------------------------------------------
+
+
+def _lock_for_rebuild(conn, models):
+    """Bloquea las tablas de origen (lectura) y de agregados (escritura) hasta el commit.
+
+    Así ninguna escritura en leads/ledger confirma entre el ``GROUP BY`` y el
+    ``DELETE``/``INSERT`` (su delta se perdería): esperan a que termine el recálculo
+    y aplican su delta sobre las tablas nuevas.
+    """
+    sources = [m.__table__.name for m in models]
+    targets = [r.table.name for r in _ROLLUPS.values()]
+    if conn.dialect.name == "mysql":
+        # LOCK TABLES toma todos los bloqueos a la vez (sin interbloqueos entre ellos)
+        locks = [f"{t} READ" for t in sources] + [f"{t} WRITE" for t in targets]
+        conn.exec_driver_sql("LOCK TABLES " + ", ".join(locks))
+        return True
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"LOCK TABLE {', '.join(sources)} IN SHARE MODE")
+        conn.exec_driver_sql(f"LOCK TABLE {', '.join(targets)} IN EXCLUSIVE MODE")
+    return False
+
+
+def rebuild_rollups(engine=None) -> dict:
+    """Recalcula las tablas desde ``leads`` / ``ledger``; devuelve las filas escritas por tabla.
+
+    Mientras dura, las escrituras en leads y ledger esperan (``_lock_for_rebuild``).
+    """
+    from sigp import db
+
+    engine = engine or db.engine
+    rollups = [(rollup, rollup.model()) for rollup in _ROLLUPS.values()]
+    rollups = [(rollup, model) for rollup, model in rollups if model is not None]
+    written = {}
+    with engine.connect() as conn:
+        table_locks = _lock_for_rebuild(conn, [model for _, model in rollups])
+        try:
+            for rollup, model in rollups:
+                year = sa.extract("year", model.created_at)
+                month = sa.extract("month", model.created_at)
+                columns = [model.prescriptor_id, year, month, model.state_id, sa.func.count()]
+                if rollup.source == "ledger":
+                    columns += [
+                        sa.func.sum(model.amount),
+                        sa.func.sum(model.amount * sa.func.coalesce(model.sign, 1)),
+                    ]
+                groups = conn.execute(
+                    sa.select(*columns).group_by(model.prescriptor_id, year, month, model.state_id)
+                )
+
+                totals = defaultdict(lambda: defaultdict(int))
+                for prescriptor_id, y, m, state_id, *measures in groups:
+                    created = None if y is None else f"{int(y):04d}-{int(m):02d}"
+                    key = _key({"prescriptor_id": prescriptor_id, "created_at": created, "state_id": state_id})
+                    for name, value in zip(rollup.measures_columns(), measures):
+                        totals[key][name] += value or 0
+                conn.execute(rollup.table.delete())
+                if totals:
+                    conn.execute(rollup.table.insert(), [dict(zip(KEY_COLUMNS, k), **v) for k, v in totals.items()])
+                written[rollup.table.name] = len(totals)
+            conn.commit()
+        finally:
+            if table_locks:
+                conn.rollback()
+                conn.exec_driver_sql("UNLOCK TABLES")
+    return written
+
+
+# ---------------------------------------------------------------------------
+# Flush del ORM
+# ---------------------------------------------------------------------------
+
+
+def _rollup_for(obj):
+    table = getattr(obj, "__table__", None)
+    return _ROLLUPS.get(table.name) if table is not None else None
+
+
+def _inserted_row(session, obj, rollup):
+    state = sa.inspect(obj)
+    row = {f: state.dict.get(f) for f in rollup.fields}
+    if row["created_at"] is None:
+        # DEFAULT CURRENT_TIMESTAMP de la BD: se lee la fila recién insertada
+        pk = state.mapper.primary_key
+        criteria = [col == val for col, val in zip(pk, state.identity or ())]
+        if criteria:
+            row["created_at"] = session.execute(sa.select(obj.__table__.c.created_at).where(*criteria)).scalar()
+    return row
+
+
+def _committed_row(obj, rollup):
+    """Valores antes del flush (``None`` si alguno no estaba cargado)."""
+    attrs = sa.inspect(obj).attrs
+    row = {}
+    for f in rollup.fields:
+        value = attrs[f].loaded_value
+        if value is NO_VALUE:
+            return None
+        row[f] = value
+    return row
+
+
+def _changed_rows(obj, rollup):
+    """(antes, después) si cambió algún campo agregado; ``None`` si no cambió o no se conoce."""
+    state = sa.inspect(obj)
+    before, after, changed = {}, {}, False
+    for f in rollup.fields:
+        history = state.attrs[f].history
+        if history.added or history.deleted:
+            if not history.deleted or not history.added:
+                return None  # valor anterior desconocido (lo corrige rebuild-rollups)
+            changed = True
+            before[f], after[f] = history.deleted[0], history.added[0]
+        elif f in state.dict:
+            before[f] = after[f] = state.dict[f]
+        else:
+            return None
+    return (before, after) if changed else None
+
+
+def _noop_set(target, value, oldvalue, initiator):
+    return value
+
+
+@sa.event.listens_for(sa.orm.Mapper, "mapper_configured")
+def _track_previous_values(mapper, cls):
+    # active_history: al asignar sobre un objeto expirado (p. ej. tras un commit)
+    # se carga el valor anterior para poder restarlo del agregado
+    rollup = _ROLLUPS.get(getattr(mapper.local_table, "name", None))
+    if rollup is None:
+        return
+    for f in rollup.fields:
+        if f in mapper.column_attrs:
+            sa.event.listen(getattr(cls, f), "set", _noop_set, active_history=True, retval=True)
+
+
+@sa.event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    touched = [
+        (obj, kind)
+        for kind, objs in (("new", session.new), ("deleted", session.deleted), ("dirty", session.dirty))
+        for obj in objs
+        if _rollup_for(obj) is not None
+    ]
+    if not touched:
+        return
+    deltas = _new_deltas()
+    for obj, kind in touched:
+        rollup = _rollup_for(obj)
+        if kind == "new":
+            _accumulate(deltas, rollup, _inserted_row(session, obj, rollup), 1)
+        elif kind == "deleted":
+            row = _committed_row(obj, rollup)
+            if row is not None:
+                _accumulate(deltas, rollup, row, -1)
+        else:
+            rows = _changed_rows(obj, rollup)
+            if rows is not None:
+                _accumulate(deltas, rollup, rows[0], -1)
+                _accumulate(deltas, rollup, rows[1], 1)
+    _apply(session, deltas)
@@ -0,0 +1,275 @@
+"""Búsqueda de leads por candidato (nombre, email o celular).
+
+``leads.search_text`` (migración 20261016_lead_search.sql) guarda el nombre y el
+email normalizados (minúsculas, sin tildes, sólo letras y dígitos) y los dígitos
+del celular (con y sin prefijo de país: el que va separado del número o, sin
+separador, uno de LEAD_SEARCH_COUNTRY_CODES), con un índice FULLTEXT. El filtro "Candidato" busca cada palabra
+como prefijo de alguna palabra del candidato::
+
+    "jose per"            -> José Pérez, Josefina Peralta...
+    "jperez@gma"          -> jperez@gmail.com
+    "+34 612 34", "61234" -> +34 612 345 678, 0034612345678
+
+En MySQL se resuelve con ``MATCH ... AGAINST ('+jose* +per*' IN BOOLEAN MODE)``;
+las palabras que el índice no guarda (más cortas que LEAD_SEARCH_MIN_TOKEN o
+stopwords de InnoDB) se comprueban con ``LIKE`` sobre las filas ya filtradas.
+
+La columna se rellena en cada flush al crear o editar un lead con el ORM;
+``flask sigp reindex-leads`` la recalcula para los leads existentes (tras la
+migración o al cambiar LEAD_SEARCH_COUNTRY_CODES). Sin la columna se vuelve a ``ILIKE '%...%'`` sobre las tres columnas.
+"""
+import random
+import re
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from flask import current_app
+
+from sigp.common.replica_utils import RoutingSession
+
+SEARCH_COLUMN = "search_text"
+SEARCH_TEXT_MAX = 700
+SOURCE_FIELDS = ("candidate_name", "candidate_email", "candidate_cellular")
+
+# Stopwords por defecto de InnoDB (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD)
+INNODB_STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or "
+    "that the this to was what when where who will with und www".split()
+)
+
+_NON_WORD = re.compile(r"[\W_]+")
+_NON_DIGIT = re.compile(r"\D+")
+_PHONE = re.compile(r"^\+?[\d\s().-]+$")
+_INTL = re.compile(r"^(?:\+|00)")
+_SEPARATED_CODE = re.compile(r"^(\d{1,3})[\s.-]+")
+
+
+def normalize(text) -> str:
+    """Minúsculas, sin tildes y con cualquier separador convertido en un espacio."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+def lead_search_text(name=None, email=None, cellular=None) -> str:
+    """Valor de ``leads.search_text`` para un candidato."""
+    parts = [normalize(name), normalize(email), *_phone_tokens(cellular)]
+    return " ".join(p for p in parts if p)[:SEARCH_TEXT_MAX]
+
+
+def _country_code(digits):
+    """Prefijo de LEAD_SEARCH_COUNTRY_CODES con el que empieza ``digits`` (el más largo)."""
+    codes = current_app.config.get("LEAD_SEARCH_COUNTRY_CODES") or ()
+    return max((c for c in codes if digits.startswith(c)), key=len, default=None)
+
+
+def _phone_tokens(cellular):
+    """Dígitos del celular (sin ``+``/``00``) y, si lleva prefijo de país, también sin él.
+
+    "+34 612...", "0034-612..." y "+34612..." dan ``34612...`` y ``612...``.
+    """
+    cellular = (cellular or "").strip()
+    intl = _INTL.match(cellular)
+    if not intl:
+        return [_NON_DIGIT.sub("", cellular)]
+    number = cellular[intl.end():]
+    digits = _NON_DIGIT.sub("", number)
+    separated = _SEPARATED_CODE.match(number)
+    code = separated.group(1) if separated else _country_code(digits)
+    if code and len(digits) > len(code):
+        return [digits, digits[len(code):]]
+    return [digits]
+
+
+def search_terms(text) -> list:
+    """Palabras a buscar; un teléfono ("+34 612 34") cuenta como una sola."""
+    text = (text or "").strip()
+    digits = _NON_DIGIT.sub("", _INTL.sub("", text))
+    if digits and _PHONE.match(text):
+        return [digits]
+    return list(dict.fromkeys(normalize(text).split()))
+
+
+def search_enabled(Model) -> bool:
+    return Model is not None and SEARCH_COLUMN in Model.__table__.c
+
+
+def _prefix_like(column, term):
+    # ``term`` sólo tiene letras y dígitos: no hay comodines que escapar
+    return sa.or_(column.like(f"{term}%"), column.like(f"% {term}%"))
+
+
+def search_clause(column, text, dialect="mysql"):
+    """Condición "todas las palabras de ``text`` son prefijo de alguna palabra de ``column``"."""
+    terms = search_terms(text)
+    if not terms:
+        return sa.true()
+    min_token = current_app.config.get("LEAD_SEARCH_MIN_TOKEN", 3)
+    indexed = [t for t in terms if len(t) >= min_token and t not in INNODB_STOPWORDS]
+    clauses = []
+    if dialect == "mysql" and indexed:
+        clauses.append(column.match(" ".join(f"+{t}*" for t in indexed)))
+        terms = [t for t in terms if t not in indexed]
+    clauses.extend(_prefix_like(column, t) for t in terms)
+    return sa.and_(*clauses)
+
+
+def lead_filter(Lead, text):
+    """Filtro del campo "Candidato" de los listados de leads."""
+    from sigp import db
+
+    if search_enabled(Lead):
+        return search_clause(Lead.__table__.c[SEARCH_COLUMN], text, db.engine.dialect.name)
+    like = f"%{(text or '').strip()}%"
+    return sa.or_(*[getattr(Lead, f).ilike(like) for f in SOURCE_FIELDS if hasattr(Lead, f)])
+
+
+def _is_lead(obj) -> bool:
+    table = getattr(obj, "__table__", None)
+    return table is not None and table.name == "leads" and SEARCH_COLUMN in table.c
+
+
+@sa.event.listens_for(RoutingSession, "before_flush")
+def _before_flush(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not _is_lead(obj):
+            continue
+        if obj not in session.new:
+            attrs = sa.inspect(obj).attrs
+            if not any(attrs[f].history.has_changes() for f in SOURCE_FIELDS):
+                continue
+        setattr(obj, SEARCH_COLUMN, lead_search_text(*(getattr(obj, f) for f in SOURCE_FIELDS)))
+
+
+# ---------- Mantenimiento y medición (CLI) ----------
+
+def reindex_leads(batch_size=1000) -> int:
+    """Recalcula ``search_text`` de todos los leads por lotes; devuelve cuántos cambiaron."""
+    from sigp import db
+
+    leads = sa.Table("leads", sa.MetaData(), autoload_with=db.engine)
+    cols = [leads.c.id, *(leads.c[f] for f in SOURCE_FIELDS), leads.c[SEARCH_COLUMN]]
+    changed, last_id = 0, None
+    while True:
+        q = sa.select(*cols).order_by(leads.c.id).limit(batch_size)
+        if last_id is not None:
+            q = q.where(leads.c.id > last_id)
+        with db.engine.begin() as conn:
+            rows = conn.execute(q).all()
+            if not rows:
+                return changed
+            updates = []
+            for row in rows:
+                value = lead_search_text(*row[1:4])
+                if value != row[4]:
+                    updates.append({"b_id": row[0], "b_value": value})
+            if updates:
+                conn.execute(
+                    leads.update().where(leads.c.id == sa.bindparam("b_id")).values({SEARCH_COLUMN: sa.bindparam("b_value")}),
+                    updates,
+                )
+            changed += len(updates)
+        last_id = rows[-1][0]
+
+
+BENCH_TABLE = "leads_search_bench"
+
+_FIRST = ("José", "María", "Lucía", "Jesús", "Inés", "Álvaro", "Martín", "Sofía", "Raúl", "Ángela",
+          "Juan", "Carmen", "Pedro", "Elena", "Tomás", "Noemí", "Iván", "Marta", "Óscar", "Julián")
+_LAST = ("García", "Pérez", "Núñez", "Martínez", "López", "Sánchez", "Gómez", "Fernández", "Díaz",
+         "Peña", "Muñoz", "Álvarez", "Romero", "Ibáñez", "Ortiz", "Rodríguez", "Castaño", "Marín")
+_DOMAINS = ("gmail.com", "hotmail.com", "yahoo.es", "outlook.com", "universidad.es")
+
+
+def _bench_table(metadata):
+    return sa.Table(
+        BENCH_TABLE,
+        metadata,
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("candidate_name", sa.String(100)),
+        sa.Column("candidate_email", sa.String(255)),
+        sa.Column("candidate_cellular", sa.String(255)),
+        sa.Column(SEARCH_COLUMN, sa.String(SEARCH_TEXT_MAX)),
+        sa.Column("created_at", sa.DateTime),
+        sa.Index(f"ft_{BENCH_TABLE}", SEARCH_COLUMN, mysql_prefix="FULLTEXT"),
+        sa.Index(f"idx_{BENCH_TABLE}_created_id", "created_at", "id"),
+        mysql_engine="InnoDB",
+        mysql_charset="utf8mb4",
+    )
+
+
+def _fake_lead(rnd, now):
+    first, last = rnd.choice(_FIRST), rnd.choice(_LAST)
+    name = f"{first} {last} {rnd.choice(_LAST)}"
+    email = f"{normalize(first).replace(' ', '')}.{normalize(last)}{rnd.randint(1, 9999)}@{rnd.choice(_DOMAINS)}"
+    cellular = f"+34 6{rnd.randint(0, 99):02d} {rnd.randint(0, 999):03d} {rnd.randint(0, 999):03d}"
+    return {
+        "candidate_name": name,
+        "candidate_email": email,
+        "candidate_cellular": cellular,
+        SEARCH_COLUMN: lead_search_text(name, email, cellular),
+        "created_at": now - timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60)),
+    }
+
+
+def seed_bench(rows, batch_size=10000, seed=42) -> int:
+    """Crea ``leads_search_bench`` y la completa hasta ``rows`` filas sintéticas."""
+    from sigp import db
+
+    table = _bench_table(sa.MetaData())
+    table.create(db.engine, checkfirst=True)
+    with db.engine.connect() as conn:
+        existing = conn.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+    rnd, now = random.Random(seed + existing), datetime.now().replace(microsecond=0)
+    for start in range(existing, rows, batch_size):
+        with db.engine.begin() as conn:
+            conn.execute(table.insert(), [_fake_lead(rnd, now) for _ in range(min(batch_size, rows - start))])
+    return max(rows - existing, 0)
+
+
+def drop_bench() -> None:
+    from sigp import db
+
+    _bench_table(sa.MetaData()).drop(db.engine, checkfirst=True)
+
+
+def _median_ms(conn, stmt, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(stmt).all()
+        times.append((time.perf_counter() - t0) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def bench_search(terms, per_page=25, repeat=5) -> list:
+    """Mide el listado (página + total) con ``ILIKE '%...%'`` y con ``search_text``.
+
+    Devuelve ``[(término, filas, ms antes, ms después)]`` con la mediana de ``repeat``.
+    """
+    from sigp import db
+
+    table = _bench_table(sa.MetaData())
+    dialect = db.engine.dialect.name
+    results = []
+    with db.engine.connect() as conn:
+        for term in terms:
+            old = table.c.candidate_name.ilike(f"%{term}%")
+            new = search_clause(table.c[SEARCH_COLUMN], term, dialect)
+            timings = []
+            for cond in (old, new):
+                page = (
+                    sa.select(table.c.id)
+                    .where(cond)
+                    .order_by(table.c.created_at.desc(), table.c.id.desc())
+                    .limit(per_page)
+                )
+                count = sa.select(sa.func.count()).select_from(table).where(cond)
+                timings.append(_median_ms(conn, page, repeat) + _median_ms(conn, count, repeat))
+            found = conn.execute(sa.select(sa.func.count()).select_from(table).where(new)).scalar()
+            results.append((term, found, *timings))
+    return results
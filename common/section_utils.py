@@ -0,0 +1,88 @@
+"""Ejecución concurrente de las secciones independientes de un dashboard.
+
+Cada sección es una función ``fn(session)`` que recibe su propia sesión sobre
+una conexión propia del pool y corre en un ``ThreadPoolExecutor`` acotado
+(``DASHBOARD_SECTION_WORKERS`` hilos por proceso). La página espera como mucho
+``DASHBOARD_SECTION_TIMEOUT`` segundos: las secciones que no han terminado o
+que fallan se devuelven como no disponibles en lugar de tumbar la página.
+En MySQL el mismo plazo se aplica a las consultas (``MAX_EXECUTION_TIME``)
+para que una sección abandonada no siga ocupando la conexión.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from sigp.common.replica_utils import read_engine
+
+_executor = {"pool": None}
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app) -> ThreadPoolExecutor:
+    with _executor_lock:
+        if _executor["pool"] is None:
+            _executor["pool"] = ThreadPoolExecutor(
+                max_workers=max(int(app.config.get("DASHBOARD_SECTION_WORKERS", 4)), 1),
+                thread_name_prefix="sigp-section",
+            )
+        return _executor["pool"]
+
+
+@contextmanager
+def section_session(engine, timeout=None):
+    """Sesión de sólo lectura sobre una conexión propia, con límite de tiempo en MySQL."""
+    with engine.connect() as conn:
+        previous = None
+        if engine.dialect.name == "mysql" and timeout:
+            previous = conn.exec_driver_sql("SELECT @@SESSION.max_execution_time").scalar()
+            conn.exec_driver_sql(f"SET SESSION max_execution_time = {int(timeout * 1000)}")
+        session = Session(bind=conn)
+        try:
+            yield session
+        finally:
+            session.close()
+            if previous is not None:
+                # La variable es de la conexión: restaurarla antes de devolverla al pool
+                try:
+                    conn.rollback()
+                    conn.exec_driver_sql(f"SET SESSION max_execution_time = {int(previous)}")
+                except SQLAlchemyError:
+                    conn.invalidate()
+
+
+def run_sections(sections: dict, engine=None, timeout=None):
+    """Ejecuta ``{nombre: fn(session)}`` en paralelo.
+
+    Devuelve ``(resultados, no_disponibles)``: un dict nombre -> valor con las
+    secciones que terminaron a tiempo y el conjunto de nombres que no.
+    """
+    app = current_app._get_current_object()
+    engine = engine or read_engine()
+    if timeout is None:
+        timeout = app.config.get("DASHBOARD_SECTION_TIMEOUT", 10)
+
+    def _run(fn):
+        with app.app_context(), section_session(engine, timeout) as session:
+            return fn(session)
+
+    executor = _get_executor(app)
+    futures = {executor.submit(_run, fn): name for name, fn in sections.items()}
+    done, pending = wait(futures, timeout=timeout or None)
+
+    results, unavailable = {}, set()
+    for future in pending:
+        future.cancel()  # si sigue en cola no llega a ejecutarse
+        unavailable.add(futures[future])
+        app.logger.warning("Sección %s sin respuesta tras %ss", futures[future], timeout)
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except Exception:  # pylint: disable=broad-except
+            unavailable.add(name)
+            app.logger.exception("Error calculando la sección %s", name)
+    return results, unavailable
@@ -1,10 +1,11 @@
 """Permission helpers relocated from sigp.security"""
 from functools import wraps
-from typing import Set
-from flask import abort
+import sqlalchemy as sa
+from flask import abort, current_app
 from flask_login import current_user
 from sigp import db
 from sigp.models import Base
+from sigp.common.cache_utils import VersionedCache, bump_version
 
 Permission = getattr(Base.classes, "permissions", None)
 Role = getattr(Base.classes, "roles", None)
@@ -18,9 +19,76 @@ if RolePerm is None:
 
 _perm_cache_attr = "_cached_perm_names"
 
-def _permission_names_for_user(user) -> Set[str]:
+# role_id -> PermissionIndex, compartida entre peticiones del proceso
+PERMISSIONS_CACHE = "permissions"
+_ROLE_PERMS = VersionedCache(PERMISSIONS_CACHE)
+_NO_ASSOC = object()
+_user_role_assoc_cache = []
+
+
+class PermissionIndex:
+    """Permisos de un rol compilados para consultas O(1).
+
+    Además del conjunto de nombres guarda todos los prefijos y sufijos que
+    quedan a cada lado de un ``_``: ``has_module("state_lead")`` equivale a
+    buscar un permiso que empiece por ``state_lead_`` o termine en
+    ``_state_lead`` sin recorrer la lista.
+    """
+
+    __slots__ = ("names", "_prefixes", "_suffixes")
+
+    def __init__(self, names=()):
+        self.names = frozenset(names)
+        prefixes, suffixes = set(), set()
+        for name in self.names:
+            for i, ch in enumerate(name):
+                if ch == "_":
+                    prefixes.add(name[:i])
+                    suffixes.add(name[i + 1:])
+        self._prefixes = frozenset(prefixes)
+        self._suffixes = frozenset(suffixes)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __or__(self, other):
+        return PermissionIndex(self.names | set(other))
+
+    def has_module(self, module: str) -> bool:
+        mod = module.lower()
+        mod_sing = mod[:-1] if mod.endswith('s') else mod
+        return (
+            mod in self._prefixes or mod_sing in self._prefixes
+            or mod in self._suffixes or mod_sing in self._suffixes
+        )
+
+
+EMPTY_INDEX = PermissionIndex()
+
+
+def _user_role_assoc():
+    """Clase de asociación usuario-rol (columnas user_id y role_id), buscada una sola vez."""
+    if not _user_role_assoc_cache:
+        assoc = _NO_ASSOC
+        for table in Base.metadata.sorted_tables:
+            if {"user_id", "role_id"}.issubset(table.c.keys()):
+                cls = getattr(Base.classes, table.name, None)
+                if cls is not None:
+                    assoc = cls
+                    break
+        _user_role_assoc_cache.append(assoc)
+    assoc = _user_role_assoc_cache[0]
+    return None if assoc is _NO_ASSOC else assoc
+
+def _permission_names_for_user(user) -> PermissionIndex:
     if not (user and user.is_authenticated and Permission is not None and RolePerm is not None and Role is not None):
-        return set()
+        return EMPTY_INDEX
     role_ids = []
     if hasattr(user, "roles") and getattr(user, "roles") is not None:
         val = getattr(user, "roles")
@@ -33,29 +101,49 @@ def _permission_names_for_user(user) -> Set[str]:
     if not role_ids and hasattr(user, "role_id") and user.role_id:
         role_ids = [user.role_id]
     if not role_ids:
-        assoc = None
-        for cls in Base.classes.values():
-            cols = {c.name for c in cls.__table__.columns}
-            if {"user_id", "role_id"}.issubset(cols):
-                assoc = cls; break
+        assoc = _user_role_assoc()
         if assoc:
             role_ids = [row.role_id for row in db.session.query(assoc.role_id).filter_by(user_id=user.id)]
     if not role_ids:
-        return set()
-    perm_ids = set()
-    if hasattr(RolePerm, 'permission_id'):
-        perm_ids = {rp.permission_id for rp in db.session.query(RolePerm.permission_id).filter(RolePerm.role_id.in_(role_ids))}
-    elif hasattr(RolePerm, 'c') and 'permission_id' in RolePerm.c:
-        rows = db.session.execute(RolePerm.select().with_only_columns(RolePerm.c.permission_id).where(RolePerm.c.role_id.in_(role_ids))).all()
-        perm_ids = {row[0] for row in rows}
-    if not perm_ids:
-        return set()
-    names = {p.name.lower() for p in db.session.query(Permission.name).filter(Permission.id.in_(perm_ids))}
-    return names
-
-def _perm_set(user):
+        return EMPTY_INDEX
+    indexes = [
+        _ROLE_PERMS.get(
+            str(role_id),
+            lambda rid=role_id: PermissionIndex(_load_role_permission_names(rid)),
+            ttl=current_app.config.get("PERMISSIONS_CACHE_TTL", 300),
+        )
+        for role_id in role_ids
+    ]
+    index = indexes[0]
+    for other in indexes[1:]:
+        index = index | other
+    return index
+
+def _load_role_permission_names(role_id) -> frozenset:
+    """Nombres de permiso (en minúsculas) de un rol, consultando la BD.
+
+    Del primario, como la versión de la caché: desde la réplica (vistas
+    ``@read_replica``) se podría cachear un permiso ya retirado con la versión nueva.
+    """
+    role_perms = getattr(RolePerm, "__table__", RolePerm)
+    if "permission_id" not in role_perms.c:
+        return frozenset()
+    permissions = Permission.__table__
+    query = (
+        sa.select(permissions.c.name)
+        .join(role_perms, role_perms.c.permission_id == permissions.c.id)
+        .where(role_perms.c.role_id == role_id)
+    )
+    with db.engine.connect() as conn:
+        return frozenset(name.lower() for name in conn.execute(query).scalars() if name)
+
+def invalidate_permissions(session=None) -> None:
+    """Avisa a todos los workers de que cambiaron roles o permisos (commit a cargo del llamador)."""
+    bump_version(PERMISSIONS_CACHE, session)
+
+def _perm_set(user) -> PermissionIndex:
     if not user or not user.is_authenticated:
-        return set()
+        return EMPTY_INDEX
     if not hasattr(user, _perm_cache_attr):
         setattr(user, _perm_cache_attr, _permission_names_for_user(user))
     return getattr(user, _perm_cache_attr)
@@ -65,13 +153,7 @@ def has_perm(user, perm_name: str) -> bool:
 
 def has_any_prefix(user, module: str) -> bool:
     """True si el usuario tiene algún permiso que empiece o termine con el módulo indicado."""
-    perms = _perm_set(user)
-    mod = module.lower()
-    mod_sing = mod[:-1] if mod.endswith('s') else mod
-    return any((pl := p.lower()) and (
-        pl.startswith(f"{mod}_") or pl.startswith(f"{mod_sing}_") or
-        pl.endswith(f"_{mod}") or pl.endswith(f"_{mod_sing}")
-    ) for p in perms)
+    return _perm_set(user).has_module(module)
 
 def require_perm(name: str):
     def decorator(func):
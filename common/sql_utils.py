@@ -0,0 +1,188 @@
+"""Instrumentación SQL por petición: nº de sentencias, tiempo en BD y detección de N+1.
+
+Cada petición acumula en ``g`` las sentencias ejecutadas agrupadas por "forma"
+(SQL normalizado, sin literales ni listas IN). Al responder se añade la
+cabecera ``Server-Timing`` y, si una misma forma se repite más de
+``SQL_NPLUSONE_THRESHOLD`` veces, se registra un aviso con el endpoint.
+
+Las sentencias que superan ``SLOW_QUERY_MS`` se escriben en un JSONL rotativo
+con sus parámetros, el endpoint y el ``EXPLAIN FORMAT=JSON`` de MySQL.
+"""
+import datetime as _dt
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+_G_KEY = "_sigp_sql"
+
+slow_log = logging.getLogger("sigp.slow_query")
+# Configuración del log de consultas lentas (se fija en install_sql_instrumentation)
+_SLOW = {"ms": 0, "explain": False, "explain_interval": 300}
+_explained = {}  # forma -> último EXPLAIN (monotonic)
+_explained_lock = threading.Lock()
+
+_IN_LIST = re.compile(r"\(\s*(?:%s|\?|:\w+|%\(\w+\)s)(?:\s*,\s*(?:%s|\?|:\w+|%\(\w+\)s))*\s*\)")
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normaliza una sentencia para agrupar las que sólo difieren en parámetros."""
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_sigp_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("_sigp_query_start")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    if _SLOW["ms"] and elapsed_ms >= _SLOW["ms"]:
+        _log_slow_query(conn, statement, parameters, executemany, elapsed_ms)
+    if not has_app_context():
+        return
+    stats = g.get(_G_KEY)
+    if stats is None:
+        return
+    stats["count"] += 1
+    stats["ms"] += elapsed_ms
+    stats["shapes"][statement_shape(statement)] += 1
+
+
+def _short(value, limit=200):
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _jsonable_params(parameters):
+    if isinstance(parameters, dict):
+        return {k: _short(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_short(v) for v in parameters]
+    return _short(parameters)
+
+
+def _explain(conn, statement, parameters):
+    """EXPLAIN FORMAT=JSON por un cursor DBAPI aparte (no vuelve a disparar eventos)."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN FORMAT=JSON " + statement, parameters or None)
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return json.loads(row[0]) if row else None
+
+
+def _should_explain(conn, statement, executemany, shape):
+    if not _SLOW["explain"] or executemany or conn.dialect.name != "mysql":
+        return False
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return False
+    now = time.monotonic()
+    with _explained_lock:
+        last = _explained.get(shape)
+        if last is not None and now - last < _SLOW["explain_interval"]:
+            return False
+        _explained[shape] = now
+    return True
+
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed_ms):
+    shape = statement_shape(statement)
+    record = {
+        "ts": _dt.datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+        "ms": round(elapsed_ms, 1),
+        "endpoint": request.endpoint if has_request_context() else None,
+        "method": request.method if has_request_context() else None,
+        "path": request.path if has_request_context() else None,
+        "statement": statement,
+        "parameters": None if executemany else _jsonable_params(parameters),
+        "shape": shape,
+    }
+    if _should_explain(conn, statement, executemany, shape):
+        try:
+            record["explain"] = _explain(conn, statement, parameters)
+        except Exception as exc:  # pylint: disable=broad-except
+            record["explain_error"] = str(exc)
+    slow_log.warning(json.dumps(record, default=str, ensure_ascii=False))
+
+
+def _configure_slow_log(app):
+    _SLOW["ms"] = app.config.get("SLOW_QUERY_MS", 0) or 0
+    _SLOW["explain"] = app.config.get("SLOW_QUERY_EXPLAIN", True)
+    _SLOW["explain_interval"] = app.config.get("SLOW_QUERY_EXPLAIN_INTERVAL", 300)
+    if not _SLOW["ms"] or slow_log.handlers:
+        return
+    path = app.config.get("SLOW_QUERY_LOG_PATH") or str(Path(app.instance_path) / "slow_queries.jsonl")
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=app.config.get("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024),
+        backupCount=app.config.get("SLOW_QUERY_LOG_BACKUPS", 5),
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_log.addHandler(handler)
+    slow_log.setLevel(logging.WARNING)
+    slow_log.propagate = False
+
+
+def request_sql_stats():
+    """Estadísticas de la petición en curso (o None fuera de una petición instrumentada)."""
+    return g.get(_G_KEY) if has_app_context() else None
+
+
+def install_sql_instrumentation(app, engines):
+    """Registra los hooks de SQLAlchemy y de Flask (SQL_INSTRUMENTATION / SLOW_QUERY_MS)."""
+    _configure_slow_log(app)
+    stats_enabled = app.config.get("SQL_INSTRUMENTATION", True)
+    if not stats_enabled and not _SLOW["ms"]:
+        return
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    if not stats_enabled:
+        return
+
+    threshold = app.config.get("SQL_NPLUSONE_THRESHOLD", 10)
+
+    @app.before_request
+    def _sql_stats_start():
+        g.setdefault(_G_KEY, {"count": 0, "ms": 0.0, "shapes": Counter(), "started": time.perf_counter()})
+
+    @app.after_request
+    def _sql_stats_finish(response):
+        stats = g.get(_G_KEY)
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - stats["started"]) * 1000
+        timing = [
+            f'db;dur={stats["ms"]:.1f};desc="{stats["count"]} queries"',
+            f"app;dur={total_ms:.1f}",
+        ]
+        if stats["shapes"]:
+            shape, repeats = stats["shapes"].most_common(1)[0]
+            if repeats > threshold:
+                timing.append(f'nplusone;desc="{repeats}x {request.endpoint}"')
+                app.logger.warning(
+                    "Posible N+1 en %s: %d sentencias iguales (de %d): %s",
+                    request.endpoint, repeats, stats["count"], shape[:300],
+                )
+        response.headers.add("Server-Timing", ", ".join(timing))
+        return response
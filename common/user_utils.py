@@ -0,0 +1,51 @@
+"""Caché de usuarios para ``login_manager.user_loader``.
+
+Cada petición autenticada empezaba con ``db.session.get(User, id)``. Ahora se
+guarda en el proceso una copia separada de la sesión (sólo columnas) y se
+incorpora a la sesión de la petición con ``merge(load=False)``, sin SQL.
+Las relaciones (``user.role``...) se siguen cargando bajo demanda.
+
+La caché es LRU (USER_CACHE_SIZE) con caducidad (USER_CACHE_TTL) y se vacía en
+todos los workers cuando se edita, borra o cambia de estado un usuario
+(``invalidate_user_cache``).
+"""
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from sigp import db
+from sigp.config import Config
+from sigp.common.cache_utils import VersionedCache, bump_version
+
+USER_CACHE = "users"
+_users = VersionedCache(USER_CACHE, maxsize=Config.USER_CACHE_SIZE)
+
+
+def _detached_copy(user):
+    """Copia de las columnas de ``user`` en estado *detached* (compartible entre peticiones)."""
+    User = type(user)
+    values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+    copy = User(**values)
+    make_transient_to_detached(copy)
+    return copy
+
+
+def load_cached_user(User, user_id):
+    """Usuario ``user_id`` unido a la sesión actual, desde la caché si es posible."""
+    ttl = current_app.config.get("USER_CACHE_TTL", 60)
+    if not ttl:
+        return db.session.get(User, user_id)
+
+    def _load():
+        user = db.session.get(User, user_id)
+        return _detached_copy(user) if user is not None else None
+
+    snapshot = _users.get(str(user_id), _load, ttl=ttl)
+    if snapshot is None:
+        return None
+    return db.session.merge(snapshot, load=False)
+
+
+def invalidate_user_cache(session=None) -> None:
+    """Descarta los usuarios cacheados en todos los workers (commit a cargo del llamador)."""
+    bump_version(USER_CACHE, session)
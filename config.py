@@ -22,6 +22,97 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Pool de conexiones (Flask-SQLAlchemy y db/session.py)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    # Reciclar antes del wait_timeout de MySQL/RDS para no usar conexiones cerradas
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 280))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() in {"1", "true", "yes"}
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+    # Réplica de lectura opcional para informes (vacío => todo va al primario)
+    SQLALCHEMY_REPLICA_URI = os.getenv("SQLALCHEMY_REPLICA_URI", "")
+    SQLALCHEMY_BINDS = {"replica": SQLALCHEMY_REPLICA_URI} if SQLALCHEMY_REPLICA_URI else {}
+    # Retraso máximo admitido en la réplica (s); tras escribir, el usuario lee del primario ese tiempo
+    REPLICA_LAG_TOLERANCE = float(os.getenv("REPLICA_LAG_TOLERANCE", 5))
+    REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", 10))
+
+    # Instrumentación SQL por petición (cabecera Server-Timing y aviso de N+1)
+    SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "True").lower() in {"1", "true", "yes"}
+    SQL_NPLUSONE_THRESHOLD = int(os.getenv("SQL_NPLUSONE_THRESHOLD", 10))
+    # Log de consultas lentas (JSONL rotativo con EXPLAIN FORMAT=JSON); 0 => desactivado
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 500))
+    SLOW_QUERY_LOG_PATH = os.getenv("SLOW_QUERY_LOG_PATH", "")  # vacío => <instance>/slow_queries.jsonl
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", 5))
+    SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "True").lower() in {"1", "true", "yes"}
+    # Como mucho un EXPLAIN por forma de sentencia en este intervalo (s)
+    SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+    # Profiler bajo demanda (cProfile): token firmado del usuario (cabecera X-SIGP-Profile o cookie) o muestreo
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "True").lower() in {"1", "true", "yes"}
+    PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0))  # 0.01 => 1% de las peticiones
+    PROFILER_SPOOL_DIR = os.getenv("PROFILER_SPOOL_DIR", "")  # vacío => <instance>/profiles
+    PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", 200))
+    PROFILER_TOKEN_MAX_AGE = int(os.getenv("PROFILER_TOKEN_MAX_AGE", 600))
+    # Cachés de proceso (permisos por rol...): cada cuánto se relee cache_versions (s)
+    CACHE_VERSION_CHECK_SECONDS = int(os.getenv("CACHE_VERSION_CHECK_SECONDS", 5))
+    # Datos del prescriptor conectado que se muestran en base.html (s)
+    PRESCRIPTOR_SNAPSHOT_TTL = int(os.getenv("PRESCRIPTOR_SNAPSHOT_TTL", 60))
+    # Usuarios de Flask-Login cacheados en el proceso (LRU); TTL 0 => sin caché
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 512))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))
+    # Resultados de /dashboard/report cacheados en el proceso (LRU); TTL 0 => sin caché
+    REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 256))
+    REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", 300))
+    # Listados con paginación por cursor: total cacheado por filtro (s); 0 => COUNT(*) exacto
+    LIST_COUNT_TTL = int(os.getenv("LIST_COUNT_TTL", 60))
+    # Búsqueda de leads: palabras más cortas no están en el FULLTEXT (innodb_ft_min_token_size)
+    LEAD_SEARCH_MIN_TOKEN = int(os.getenv("LEAD_SEARCH_MIN_TOKEN", 3))
+    # Prefijos de país que se quitan de los celulares escritos sin separador ("+34612...")
+    LEAD_SEARCH_COUNTRY_CODES = [c.strip() for c in os.getenv(
+        "LEAD_SEARCH_COUNTRY_CODES", "34,351,33,44,49,39,1,52,54,56,57,51,58,593,591,595,598,506,507,502,503,504,505"
+    ).split(",") if c.strip()]
+    # Catálogos (estados, programas, ediciones...) cacheados en el proceso (s)
+    CATALOGUE_CACHE_TTL = int(os.getenv("CATALOGUE_CACHE_TTL", 300))
+    # Permisos por rol cacheados en el proceso (s): acota una copia obsoleta aunque falle la versión
+    PERMISSIONS_CACHE_TTL = int(os.getenv("PERMISSIONS_CACHE_TTL", 300))
+    # Secciones del dashboard de dirección: hilos por proceso y plazo máximo por página (s)
+    DASHBOARD_SECTION_WORKERS = int(os.getenv("DASHBOARD_SECTION_WORKERS", 4))
+    DASHBOARD_SECTION_TIMEOUT = float(os.getenv("DASHBOARD_SECTION_TIMEOUT", 10))
+    # Snapshots del dashboard de dirección: antigüedad tras la que la vista pide
+    # recalcular en segundo plano (s) y días de la gráfica de evolución
+    DASHBOARD_SNAPSHOT_MAX_AGE = int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE", 1800))
+    # Plazo por sección al calcular un snapshot (fuera de la petición: puede ser más largo)
+    DASHBOARD_SNAPSHOT_TIMEOUT = float(os.getenv("DASHBOARD_SNAPSHOT_TIMEOUT", 120))
+    DASHBOARD_TREND_DAYS = int(os.getenv("DASHBOARD_TREND_DAYS", 90))
+    # Métricas Prometheus en /metrics (con varios workers definir PROMETHEUS_MULTIPROC_DIR)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in {"1", "true", "yes"}
+    # IPs que pueden leer /metrics (separadas por coma; vacío => cualquiera)
+    METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()]
+    # Token para /metrics (cabecera "Authorization: Bearer <token>"); vacío => sólo la lista de IPs
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    # Proxies inversos de confianza delante de la app (ProxyFix: X-Forwarded-For/Proto); 0 => ninguno
+    PROXY_FIX_X_FOR = int(os.getenv("PROXY_FIX_X_FOR", 0))
+
+    # Snapshot del esquema reflejado (evita la reflexión completa en cada arranque)
+    # Ruta vacía => <instance_path>/schema_snapshot.pickle
+    SCHEMA_SNAPSHOT_ENABLED = os.getenv("SCHEMA_SNAPSHOT_ENABLED", "True").lower() in {"1", "true", "yes"}
+    SCHEMA_SNAPSHOT_PATH = os.getenv("SCHEMA_SNAPSHOT_PATH", "")
+    # "automap" refleja al arrancar; "generated" usa sigp/models/generated.py (flask sigp gen-models)
+    MODELS_SOURCE = os.getenv("MODELS_SOURCE", "automap").lower()
+    # "full" refleja todo al arrancar; "lazy" refleja cada tabla en su primer uso
+    SCHEMA_REFLECT_MODE = os.getenv("SCHEMA_REFLECT_MODE", "full").lower()
+    # Blueprints a registrar (nombres separados por coma; vacío => todos).
+    # Ej. worker público: ENABLED_BLUEPRINTS=landing,leads,auth
+    ENABLED_BLUEPRINTS = [b.strip() for b in os.getenv("ENABLED_BLUEPRINTS", "").split(",") if b.strip()]
+
     # Flask-WTF
     WTF_CSRF_ENABLED = True
 
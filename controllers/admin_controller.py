@@ -8,8 +8,11 @@ from flask_login import login_required
 from sigp import db
 from sigp.models import Base
 from sigp.security import require_perm
+from sigp.common.replica_utils import read_replica
 from sigp.common.lead_utils import log_lead_change
 from sigp.common.email_utils import send_simple_mail
+from sigp.common.rollup_utils import bulk_update
+from sigp.services import catalogue_service
 from typing import Optional
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
@@ -40,6 +43,11 @@ def _notify_and_log(ledger_rows, new_state_id):
     presc_ids = {r.prescriptor_id for r in ledger_rows}
     prescs = db.session.query(Prescriptor).filter(Prescriptor.id.in_(presc_ids)).all()
     presc_map = {p.id: p for p in prescs}
+    # emails de usuario para prescriptores sin email propio (una sola consulta)
+    user_emails = {}
+    user_ids = {p.user_id for p in prescs if not getattr(p, "email", None) and getattr(p, "user_id", None)}
+    if User is not None and user_ids:
+        user_emails = dict(db.session.query(User.id, User.email).filter(User.id.in_(user_ids)).all())
     # email body per prescriptor
     mail_data = {}
     for r in ledger_rows:
@@ -47,9 +55,8 @@ def _notify_and_log(ledger_rows, new_state_id):
         if not p:
             continue
         email_to = getattr(p, "email", None)
-        if not email_to and User is not None and getattr(p, "user_id", None):
-            usr = db.session.get(User, p.user_id)
-            email_to = getattr(usr, "email", None)
+        if not email_to and getattr(p, "user_id", None):
+            email_to = user_emails.get(p.user_id)
         if not email_to:
             continue
         mail_data.setdefault(email_to, []).append(r)
@@ -63,6 +70,10 @@ def _notify_and_log(ledger_rows, new_state_id):
     if Lead is not None and lead_ids:
         leads=db.session.query(Lead).filter(Lead.id.in_(lead_ids)).all()
         lead_map={l.id:l for l in leads}
+    program_names={}
+    prog_ids={getattr(l,'program_info_id', getattr(l,'program_id', None)) for l in lead_map.values()} - {None}
+    if Program is not None and prog_ids:
+        program_names={pid: catalogue_service.label("programs", pid) for pid in prog_ids}
 
     state_name=_state_name(new_state_id)
     for email, items in mail_data.items():
@@ -81,7 +92,7 @@ def _notify_and_log(ledger_rows, new_state_id):
                 'lead_id': it.lead_id,
                 'lead_name': lead_name,
                 'enroll_date': getattr(lead_obj,'matriculation_date', getattr(lead_obj,'enroll_date', getattr(lead_obj,'created_at', None))),
-                'program_name': (lambda pid: db.session.get(Program, pid).name if Program and pid else "") (getattr(lead_obj,'program_info_id', getattr(lead_obj,'program_id', None))),
+                'program_name': program_names.get(getattr(lead_obj,'program_info_id', getattr(lead_obj,'program_id', None)), ""),
                 'concept': it.concept,
                 'amount': it.amount,
             })
@@ -92,29 +103,18 @@ def _notify_and_log(ledger_rows, new_state_id):
 
 
 def _state_name(state_id: int) -> str:
-    if StateLedger is None:
-        return str(state_id)
-    st = db.session.get(StateLedger, state_id)
-    return st.name if st else str(state_id)
+    return catalogue_service.label("state_ledger", state_id, str(state_id))
 
 def _state_id(code: str) -> Optional[int]:
     """Devuelve el id de state_ledger dado su código."""
-    if StateLedger is None:
-        return None
-    col = None
-    if hasattr(StateLedger, "code"):
-        col = StateLedger.code
-    elif hasattr(StateLedger, "name"):
-        col = StateLedger.name
-    if col is None:
-        return None
-    row = db.session.query(StateLedger).filter(col == code).first()
-    return row.id if row else None
+    columns = ("code",) if StateLedger is not None and hasattr(StateLedger, "code") else ("name",)
+    return catalogue_service.find_id("state_ledger", code, columns=columns)
 
 
 @admin_bp.get("/payments/approval")
 @login_required
 @require_perm("manage_payments")
+@read_replica
 def pay_approval():
     # Filtros de periodo
     now = _dt.datetime.utcnow()
@@ -169,10 +169,10 @@ def bulk_approve(): # approve selected
     if not ids:
         flash("No seleccionaste movimientos", "warning")
         return redirect(url_for("admin.pay_approval"))
-    updated = (
-        db.session.query(Ledger)
-        .filter(Ledger.id.in_(ids), Ledger.state_id == PEND_APROB_ID)
-        .update({Ledger.state_id: PEND_FACT_ID, Ledger.approved_at: _dt.datetime.utcnow()}, synchronize_session=False)
+    updated = bulk_update(
+        db.session.query(Ledger).filter(Ledger.id.in_(ids), Ledger.state_id == PEND_APROB_ID),
+        {Ledger.state_id: PEND_FACT_ID, Ledger.approved_at: _dt.datetime.utcnow()},
+        synchronize_session=False,
     )
     db.session.commit()
     # fetch affected rows for email/history
@@ -269,6 +269,7 @@ def invoice_payment(ledger_id):
 @admin_bp.get("/payments/settlements")
 @login_required
 @require_perm("manage_payments")
+@read_replica
 def settlements_form():
     Prescriptor = getattr(Base.classes, "prescriptors", None)
     if Invoice is None or Prescriptor is None:
@@ -345,10 +346,10 @@ def settlements_save():
     # update ledgers linked
     if inv_rows:
         inv_ids = [inv.id for inv in inv_rows]
-        updated = (
-            db.session.query(Ledger)
-            .filter(Ledger.invoice_id.in_(inv_ids))
-            .update({Ledger.state_id: rend_id}, synchronize_session=False)
+        updated = bulk_update(
+            db.session.query(Ledger).filter(Ledger.invoice_id.in_(inv_ids)),
+            {Ledger.state_id: rend_id},
+            synchronize_session=False,
         )
         if hasattr(Ledger, "paid_at"):
             db.session.query(Ledger).filter(Ledger.invoice_id.in_(inv_ids)).update({Ledger.paid_at: _today}, synchronize_session=False)
@@ -420,6 +421,7 @@ def notify_settlement(inv_rows):
 @admin_bp.get("/payments/suspended")
 @login_required
 @require_perm("manage_payments")
+@read_replica
 def list_suspended():
     now = _dt.datetime.utcnow()
     def _opt_int(name):
@@ -459,6 +461,7 @@ def list_suspended():
 @admin_bp.get("/payments/canceled")
 @login_required
 @require_perm("manage_payments")
+@read_replica
 def list_canceled():
     now = _dt.datetime.utcnow()
     def _opt_int(name):
@@ -503,10 +506,10 @@ def bulk_cancel():
     if not ids:
         flash("No seleccionaste movimientos", "warning")
         return redirect(url_for("admin.pay_approval"))
-    upd = (
-        db.session.query(Ledger)
-        .filter(Ledger.id.in_(ids), Ledger.state_id == PEND_APROB_ID)
-        .update({Ledger.state_id: ANULADO_ID, Ledger.approved_at: _dt.datetime.utcnow()}, synchronize_session=False)
+    upd = bulk_update(
+        db.session.query(Ledger).filter(Ledger.id.in_(ids), Ledger.state_id == PEND_APROB_ID),
+        {Ledger.state_id: ANULADO_ID, Ledger.approved_at: _dt.datetime.utcnow()},
+        synchronize_session=False,
     )
     db.session.commit()
     rows = db.session.query(Ledger).filter(Ledger.id.in_(ids)).all()
@@ -523,10 +526,10 @@ def bulk_suspend():
     if not ids:
         flash("No seleccionaste movimientos", "warning")
         return redirect(url_for("admin.pay_approval"))
-    upd = (
-        db.session.query(Ledger)
-        .filter(Ledger.id.in_(ids), Ledger.state_id == PEND_APROB_ID)
-        .update({Ledger.state_id: SUSPENDIDO_ID, Ledger.approved_at: _dt.datetime.utcnow()}, synchronize_session=False)
+    upd = bulk_update(
+        db.session.query(Ledger).filter(Ledger.id.in_(ids), Ledger.state_id == PEND_APROB_ID),
+        {Ledger.state_id: SUSPENDIDO_ID, Ledger.approved_at: _dt.datetime.utcnow()},
+        synchronize_session=False,
     )
     db.session.commit()
     rows = db.session.query(Ledger).filter(Ledger.id.in_(ids)).all()
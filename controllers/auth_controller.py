@@ -154,7 +154,9 @@ def reset_password_post(token):
     User=_get_user_class();user=db.session.query(User).filter_by(email=email).first() if User else None
     if not user:
         flash("Usuario no encontrado", "danger");return redirect(url_for('auth.login_get'))
-    import hashlib;user.password_hash=hashlib.sha256(form.password.data.encode()).hexdigest();db.session.commit()
+    import hashlib;user.password_hash=hashlib.sha256(form.password.data.encode()).hexdigest()
+    from sigp.common.user_utils import invalidate_user_cache
+    invalidate_user_cache();db.session.commit()
     flash("Contraseña actualizada, inicia sesión", "success")
     return redirect(url_for('auth.login_get'))
 
@@ -383,12 +385,7 @@ def login_post():
 def logout():
     _audit_event(current_user.id if current_user.is_authenticated else None, True, "LOGOUT")
     logout_user()
-    # Cierra la sesión del contexto actual
+    # Cierra la sesión del contexto actual (la conexión vuelve al pool)
     db.session.remove()
-    # Fuerza cierre del pool completo
-    try:
-        db.engine.dispose(close=True)
-    except Exception:
-        current_app.logger.exception("Error disposing engine on logout")
     # flash("Sesión finalizada", "info")
     return redirect(url_for("auth.login_get"))
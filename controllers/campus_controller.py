@@ -5,6 +5,7 @@ from flask_login import login_required
 
 from sigp import db
 from sigp.models import Base
+from sigp.services import catalogue_service
 
 campus_bp = Blueprint("campus", __name__, url_prefix="/campus")
 
@@ -52,6 +53,7 @@ def campus_new():
             return redirect(url_for("campus.campus_new"))
         c = Campus(id=str(uuid.uuid4()), name=name)
         db.session.add(c)
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Campus creado", "success")
         return redirect(url_for("campus.campus_list"))
@@ -70,6 +72,7 @@ def campus_edit(campus_id):
         return redirect(url_for("campus.campus_list"))
     if request.method == "POST":
         campus.name = request.form.get("name", campus.name).strip()
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Campus actualizado", "success")
         return redirect(url_for("campus.campus_list"))
@@ -85,6 +88,7 @@ def campus_delete(campus_id):
     campus = db.session.get(Campus, campus_id)
     if campus:
         db.session.delete(campus)
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Campus eliminado", "info")
     return redirect(url_for("campus.campus_list"))
@@ -6,6 +6,7 @@ from sqlalchemy.exc import IntegrityError
 
 from sigp import db
 from sigp.models import Base
+from sigp.services import catalogue_service
 from sigp.security import require_perm
 
 confidence_level_bp = Blueprint("confidence_level", __name__, url_prefix="/confidence-levels")
@@ -59,6 +60,7 @@ def _form(row_id=None):
                     row = M(id=None)
                     db.session.add(row)
                 row.name = name
+                catalogue_service.invalidate()
                 db.session.commit()
                 flash("Nivel de confianza guardado", "success")
                 return redirect(url_for("confidence_level.levels_list"))
@@ -95,6 +97,7 @@ def delete(row_id):
     row = db.session.get(M, row_id)
     if row:
         db.session.delete(row)
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Nivel de confianza eliminado", "info")
     return redirect(url_for("confidence_level.levels_list"))
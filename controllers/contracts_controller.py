@@ -10,8 +10,10 @@ from sigp.services.contract_service import (
     stamp_signature_image,
     stamp_text_overlay,
     embed_pdf_metadata_xmp,
+    president_signature_path,
 )
 from sigp.common.email_utils import send_simple_mail
+from sigp.common.prescriptor_utils import invalidate_prescriptor_snapshot
 import uuid
 from datetime import datetime
 import os
@@ -111,6 +113,7 @@ def generate_for_prescriptor(prescriptor_id):
     abs_url = url_for("static", filename=f"contracts/{os.path.basename(pdf_path)}", _external=True)
     if hasattr(prescriptor, "contract_url"):
         prescriptor.contract_url = rel_url
+    invalidate_prescriptor_snapshot()
     try:
         db.session.commit()
     except Exception as exc:  # noqa
@@ -317,7 +320,7 @@ def sign_draw_post():
     final_fname = f"contract_final_{prescriptor_id}.pdf"
     output_pdf = Path(current_app.root_path) / "static" / "contracts" / final_fname
     
-    jesus_sig_path = sig_dir / "firma_jesus_base.png"
+    jesus_sig_path = president_signature_path()
     ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
     presc_name = getattr(prescriptor, "squeeze_page_name", "") or getattr(prescriptor, "name", "Prescriptor")
     pres_name = current_app.config.get("PRESIDENT_DISPLAY_NAME", "Jesús Serrano Sanz")
@@ -386,6 +389,7 @@ def sign_draw_post():
     final_url = url_for("static", filename=f"contracts/{final_fname}")
     final_url_abs = url_for("static", filename=f"contracts/{final_fname}", _external=True)
     prescriptor.contract_url = final_url
+    invalidate_prescriptor_snapshot()
 
     try:
         # 1. Pasar automáticamente a ACTIVO (Estado 1 general)
@@ -511,7 +515,7 @@ def sign_president_post():
     # =========================================================
     # NUEVO: Usar la firma PNG oficial de Jesús automáticamente
     # =========================================================
-    jesus_sig_path = Path(current_app.root_path) / "static" / "contracts" / "signatures" / "firma_jesus_base.png"
+    jesus_sig_path = president_signature_path()
     
     if not jesus_sig_path.exists():
         flash("Falta el archivo de firma oficial de Jesús (firma_jesus_base.png) en el servidor.", "danger")
@@ -609,6 +613,7 @@ def sign_president_post():
     final_url = url_for("static", filename=f"contracts/{signed_name}")
     final_url_abs = url_for("static", filename=f"contracts/{signed_name}", _external=True)
     prescriptor.contract_url = final_url
+    invalidate_prescriptor_snapshot()
 
     # Cambiar subestado a CAPACITACIÓN
     try:
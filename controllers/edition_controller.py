@@ -6,6 +6,7 @@ from sqlalchemy.exc import IntegrityError
 
 from sigp import db
 from sigp.models import Base
+from sigp.services import catalogue_service
 from sigp.security import require_perm
 
 edition_bp = Blueprint("edition", __name__, url_prefix="/editions")
@@ -59,6 +60,7 @@ def _form(row_id=None):
                     row = M(id=None)
                     db.session.add(row)
                 row.name = name
+                catalogue_service.invalidate()
                 db.session.commit()
                 flash("Edición guardada", "success")
                 return redirect(url_for("edition.editions_list"))
@@ -95,6 +97,7 @@ def delete(row_id):
     row = db.session.get(M, row_id)
     if row:
         db.session.delete(row)
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Edición eliminada", "info")
     return redirect(url_for("edition.editions_list"))
@@ -14,6 +14,7 @@ from wtforms.validators import DataRequired, Email, Length, Optional
 
 from sigp import db
 from sigp.models import Base
+from sigp.services import catalogue_service
 
 # Tablas reflejadas
 Prescriptor = getattr(Base.classes, "prescriptors", None)
@@ -72,6 +73,7 @@ def landing_page(prescriptor_id: str):
     # Poblar choices de programas
     # Poblar programas comisionables para este prescriptor (commission_value > 0)
     PrescComm = getattr(Base.classes, "prescriptor_commission", None)
+    prog_rows = []
     if Program is not None and PrescComm is not None:
         prog_rows = (
             db.session.query(Program)
@@ -93,15 +95,8 @@ def landing_page(prescriptor_id: str):
         # Crear lead ligado al prescriptor
         # Determinar estado del lead: si la squeeze está en TEST utilizar estado 'TEST' si existe.
         state_id = DEFAULT_LEAD_STATE_ID
-        StateLead = getattr(Base.classes, "state_lead", None)
-        if prescriptor.squeeze_page_status == "TEST" and StateLead is not None:
-            test_state = (
-                db.session.query(StateLead)
-                .filter(StateLead.name.ilike("test"))
-                .first()
-            )
-            if test_state:
-                state_id = test_state.id
+        if prescriptor.squeeze_page_status == "TEST":
+            state_id = catalogue_service.find_id("state_lead", "test", columns=("name",)) or state_id
         new_lead = Lead(
             id=str(uuid.uuid4()),
             prescriptor_id=prescriptor_id,
@@ -154,10 +149,12 @@ def landing_page(prescriptor_id: str):
         if img_url:
             images.append(img_url)
 
+    # URLs de programa a partir de los programas ya cargados (sin una consulta por opción)
+    programs_by_id = {p.id: p for p in prog_rows}
     return render_template(
         "public/landing_prescriptor.html",
         prescriptor=prescriptor,
         images=images,
-         program_urls={pid: (prog.program_url if prog else None) for pid,_ in getattr(form.program_info_id,'choices',[]) for prog in [db.session.get(Program, pid)]} if Program else {},
+        program_urls={pid: getattr(programs_by_id.get(pid), "program_url", None) for pid, _ in getattr(form.program_info_id, 'choices', [])} if Program else {},
         form=form,
     )
@@ -15,6 +15,10 @@ from sigp import db
 from sigp.models import Base
 from flask_login import current_user
 from sigp.security import require_perm
+from sigp.common.pagination_utils import cached_count, keyset_paginate
+from sigp.common.rollup_utils import bulk_delete
+from sigp.common.search_utils import lead_filter
+from sigp.services import catalogue_service
 
 leads_bp = Blueprint("leads", __name__, url_prefix="/leads")
 
@@ -71,9 +75,8 @@ def leads_list():
     """Paginated list of leads."""
     if Lead is None:
         flash("Tabla leads no disponible", "danger")
-        return render_template("list/leads_list.html", leads=[], total=0, page=1, per_page=1)
+        return render_template("list/leads_list.html", leads=[], total=0, pager=None, filters={})
 
-    page = request.args.get("page", 1, type=int)
     per_page = 25
 
     # Filtros
@@ -83,15 +86,17 @@ def leads_list():
 
     q = db.session.query(Lead)
     if cand_q:
-        q = q.filter(Lead.candidate_name.ilike(f"%{cand_q}%"))
+        q = q.filter(lead_filter(Lead, cand_q))
     if presc_q:
         q = q.filter(Lead.prescriptor_id == presc_q)
     if state_q:
         q = q.filter(Lead.state_id == int(state_q))
 
-    q = q.order_by(Lead.created_at.desc())
-    total = q.count()
-    leads = q.offset((page - 1) * per_page).limit(per_page).all()
+    total = cached_count(q, ("leads", cand_q, presc_q, state_q))
+    pager = keyset_paginate(
+        q, [(Lead.created_at, True), (Lead.id, True)], per_page, request.args.get("cursor"), total=total
+    )
+    leads = pager.items
 
     pres_map = {}
     if Prescriptor is not None and leads:
@@ -110,21 +115,14 @@ def leads_list():
                 commercial_map[u.id] = nombre
 
     # Mapear id -> nombre de estado
-    state_map = {}
-    if StateLead is not None and leads:
-        sids = {l.state_id for l in leads}
-        state_rows = db.session.query(StateLead).filter(StateLead.id.in_(sids)).all()
-        state_map = {s.id: s.name for s in state_rows}
+    state_map = catalogue_service.names("state_lead") if leads else {}
 
     # Choices para filtros
     presc_choices = []
     if Prescriptor is not None:
         presc_rows = db.session.query(Prescriptor).order_by(Prescriptor.squeeze_page_name).all()
         presc_choices = [(p.id, _presc_label(p)) for p in presc_rows]
-    state_choices = []
-    if StateLead is not None:
-        state_rows_all = db.session.query(StateLead).order_by(StateLead.name).all()
-        state_choices = [(s.id, s.name) for s in state_rows_all]
+    state_choices = catalogue_service.choices("state_lead")
 
     return render_template(
         "list/leads_list.html",
@@ -136,8 +134,7 @@ def leads_list():
         state_choices=state_choices,
         filters={"candidate": cand_q, "prescriptor": presc_q, "state": state_q},
         total=total,
-        page=page,
-        per_page=per_page,
+        pager=pager,
     )
 
 
@@ -172,7 +169,7 @@ def my_leads():
 
     q = db.session.query(Lead).filter(Lead.prescriptor_id == my_presc_id)
     if cand_q:
-        q = q.filter(Lead.candidate_name.ilike(f"%{cand_q}%"))
+        q = q.filter(lead_filter(Lead, cand_q))
     if state_q:
         q = q.filter(Lead.state_id == int(state_q))
     if from_q:
@@ -185,19 +182,11 @@ def my_leads():
     leads = q.offset((page - 1) * per_page).limit(per_page).all()
 
     # State map
-    state_map = {}
-    state_choices = []
-    if StateLead is not None:
-        srows = db.session.query(StateLead).all()
-        state_map = {s.id: s.name for s in srows}
-        state_choices = [(s.id, s.name) for s in srows]
+    state_map = catalogue_service.names("state_lead")
+    state_choices = catalogue_service.choices("state_lead", order="id")
 
     # Program map
-    program_map = {}
-    if Program is not None and leads:
-        pids = {l.program_info_id for l in leads if l.program_info_id}
-        prow = db.session.query(Program).filter(Program.id.in_(pids)).all()
-        program_map = {p.id: getattr(p, "name", getattr(p, "nombre", p.id)) for p in prow}
+    program_map = catalogue_service.names("programs") if leads else {}
 
     return render_template(
         "list/my_leads.html",
@@ -238,14 +227,10 @@ def new_lead():
             form.prescriptor_id.data = my_presc.id
     form.prescriptor_id.choices = presc_choices
     # Program choices
-    if Program is not None:
-        prog_rows = db.session.query(Program).all()
-        form.program_info_id.choices = [(p.id, getattr(p, 'name', getattr(p, 'nombre', str(p.id)))) for p in prog_rows]
-    else:
-        form.program_info_id.choices = []
+    form.program_info_id.choices = catalogue_service.choices("programs", order="id")
 
     if StateLead:
-        form.state_id.choices = [(s.id, s.name) for s in db.session.query(StateLead).order_by(StateLead.id)]
+        form.state_id.choices = catalogue_service.choices("state_lead", order="id")
 
     if form.validate_on_submit():
         lead_id = str(uuid.uuid4())
@@ -267,7 +252,7 @@ def new_lead():
 
         # enviar notificación a comerciales si el programa tiene emails configurados
         if Program is not None and form.program_info_id.data:
-            program = db.session.get(Program, form.program_info_id.data)
+            program = catalogue_service.get("programs", form.program_info_id.data)
             if program and getattr(program, "commercial_emails", None):
                 from sigp.common.email_utils import send_simple_mail
                 emails = [e.strip() for e in program.commercial_emails.split(',') if e.strip()]
@@ -316,6 +301,9 @@ def new_lead():
                                     created_at=datetime.datetime.utcnow(),
                                 ))
                             db.session.bulk_save_objects(notif_objects)
+                            from sigp.common.notification_utils import adjust_unread
+                            for notif in notif_objects:
+                                adjust_unread(notif.user_id, 1)
                             db.session.commit()
 
         flash("Lead creado", "success")
@@ -349,7 +337,7 @@ def delete_lead(lead_id):
     try:
         # Borrar ledger asociado
         if Ledger is not None:
-            db.session.query(Ledger).filter(Ledger.lead_id == lead_id).delete()
+            bulk_delete(db.session.query(Ledger).filter(Ledger.lead_id == lead_id))
         # Borrar historial
         if LeadHistory is not None:
             db.session.query(LeadHistory).filter(LeadHistory.lead_id == lead_id).delete()
@@ -386,7 +374,7 @@ def delete_test_lead(lead_id):
     if LeadHistory is not None:
         db.session.query(LeadHistory).filter(LeadHistory.lead_id == lead_id).delete()
     if Ledger is not None:
-        db.session.query(Ledger).filter(Ledger.lead_id == lead_id).delete()
+        bulk_delete(db.session.query(Ledger).filter(Ledger.lead_id == lead_id))
     db.session.delete(lead)
     db.session.commit()
     flash("Lead de prueba eliminado", "success")
@@ -405,10 +393,7 @@ def lead_history(lead_id):
     history = db.session.query(LeadHistory).filter(LeadHistory.lead_id == lead_id).order_by(LeadHistory.changed_at.desc()).all()
 
     # maps
-    state_map = {}
-    if StateLead is not None:
-        srows = db.session.query(StateLead.id, StateLead.name).all()
-        state_map = {s.id: s.name for s in srows}
+    state_map = catalogue_service.names("state_lead")
     user_map = {}
     User = getattr(Base.classes, "users", None)
     if User is not None:
@@ -442,20 +427,10 @@ def update_status(lead_id):
     form = LeadStatusForm()
     # cargar choices estados
     if StateLead is not None:
-        states = db.session.query(StateLead).order_by(StateLead.name).all()
-        form.state_id.choices = [(s.id, s.name) for s in states]
-    # cargar programas
-    if Program is not None:
-        prows = db.session.query(Program).order_by(Program.name).all()
-        form.program_id.choices = [(p.id, getattr(p, "name", getattr(p, "nombre", p.id))) for p in prows]
-    else:
-        form.program_id.choices = []
-    # Ediciones
-    if Edition is not None:
-        erows = db.session.query(Edition).order_by(Edition.name).all()
-        form.edition_id.choices = [(e.id, e.name) for e in erows]
-    else:
-        form.edition_id.choices = []
+        form.state_id.choices = catalogue_service.choices("state_lead")
+    # cargar programas y ediciones
+    form.program_id.choices = catalogue_service.choices("programs")
+    form.edition_id.choices = catalogue_service.choices("editions")
 
     # inicial GET
     if request.method == "GET":
@@ -506,16 +481,8 @@ def update_status(lead_id):
             lead.start_month = form.start_month.data
             lead.start_year = form.start_year.data
             # Obtener nombres legibles
-            prog_name = str(lead.program_id)
-            if Program is not None and lead.program_id:
-                pr = db.session.get(Program, lead.program_id)
-                if pr:
-                    prog_name = getattr(pr, 'name', prog_name)
-            ed_name = str(lead.edition_id) if lead.edition_id else "-"
-            if Edition is not None and lead.edition_id:
-                ed = db.session.get(Edition, lead.edition_id)
-                if ed:
-                    ed_name = getattr(ed, 'name', ed_name)
+            prog_name = catalogue_service.label("programs", lead.program_id, str(lead.program_id))
+            ed_name = catalogue_service.label("editions", lead.edition_id, str(lead.edition_id)) if lead.edition_id else "-"
             obs = f"Matriculado en programa {prog_name} edición {ed_name} cuotas {lead.payment_fees or '-'} inicio {lead.start_month}/{lead.start_year}"
         else:
             lead.observations = obs
@@ -529,8 +496,8 @@ def update_status(lead_id):
             try:
                 asignar = False
                 # Detectar si el estado previo es "Pendiente de contactar"
-                if StateLead is not None and old_state_id is not None:
-                    prev_state = db.session.get(StateLead, old_state_id)
+                if old_state_id is not None:
+                    prev_state = catalogue_service.get("state_lead", old_state_id)
                     if prev_state:
                         name_upper = prev_state.name.upper()
                         if "PENDIENTE" in name_upper and "CONTACT" in name_upper:
@@ -572,11 +539,7 @@ def update_status(lead_id):
                     presc_email = presc_email or getattr(presc, 'email', None)
                 if presc_email:
                     # obtener nombre del estado
-                    state_name = str(new_state)
-                    if StateLead is not None:
-                        st = db.session.get(StateLead, new_state)
-                        if st:
-                            state_name = getattr(st, 'name', state_name)
+                    state_name = catalogue_service.label("state_lead", new_state, str(new_state))
                     subject = f"Tu lead ha cambiado de estado a {state_name}"
                     plain_body = f"El lead {lead.candidate_name or lead.id} ahora está en estado {state_name}. Observaciones: {obs}"
                     html_body = render_template('emails/lead_state_change.html',
@@ -646,14 +609,10 @@ def edit_lead(lead_id):
         ]
     form.prescriptor_id.choices = presc_choices
     # Program choices
-    if Program is not None:
-        prog_rows = db.session.query(Program).all()
-        form.program_info_id.choices = [(p.id, getattr(p, 'name', getattr(p, 'nombre', str(p.id)))) for p in prog_rows]
-    else:
-        form.program_info_id.choices = []
+    form.program_info_id.choices = catalogue_service.choices("programs", order="id")
 
     if StateLead:
-        form.state_id.choices = [(s.id, s.name) for s in db.session.query(StateLead).order_by(StateLead.id)]
+        form.state_id.choices = catalogue_service.choices("state_lead", order="id")
 
     # Deshabilitar el campo estado para todos excepto rol "Comercial"
     from flask_login import current_user
@@ -705,8 +664,7 @@ def _default_pending_state_id():
     """Try to find a 'Pendiente de contactar' like state, else fallback to 1."""
     try:
         if StateLead is not None:
-            srows = db.session.query(StateLead).all()
-            for s in srows:
+            for s in catalogue_service.rows("state_lead"):
                 name = getattr(s, "name", "").upper()
                 if "PENDIENTE" in name and "CONTACT" in name:
                     return s.id
@@ -743,7 +701,7 @@ def embed_lead_get():
     programs = []
     if Program is not None:
         try:
-            programs = db.session.query(Program).order_by(Program.name).all()
+            programs = catalogue_service.rows("programs", order="name")
         except Exception:
             programs = []
 
@@ -764,7 +722,7 @@ def embed_lead_get():
 def embed_lead_guide():
     # Public guide page for prescriptors
     try:
-        programs = db.session.query(Program).order_by(Program.name).all() if Program is not None else []
+        programs = catalogue_service.rows("programs", order="name")
     except Exception:
         programs = []
     html = render_template("public/lead_embed_guide.html", programs=programs)
@@ -803,7 +761,7 @@ def embed_lead_post():
             candidate_cellular=cellular,
             observations=observations,
             program_id=program_id,
-            programs=db.session.query(Program).order_by(Program.name).all() if Program is not None else [],
+            programs=catalogue_service.rows("programs", order="name"),
         )
         return _apply_frame_headers(make_response(html))
 
@@ -841,7 +799,7 @@ def embed_lead_post():
         # notify commercials if program has configured emails (best-effort)
         try:
             if Program is not None and program_id:
-                program = db.session.get(Program, program_id)
+                program = catalogue_service.get("programs", program_id)
                 if program and getattr(program, "commercial_emails", None):
                     from sigp.common.email_utils import send_simple_mail
                     emails = [e.strip() for e in program.commercial_emails.split(',') if e.strip()]
@@ -945,7 +903,7 @@ def embed_lead_post():
             candidate_email=email,
             candidate_cellular=cellular,
             program_id=program_id,
-            programs=db.session.query(Program).order_by(Program.name).all() if Program is not None else [],
+            programs=catalogue_service.rows("programs", order="name"),
         )
         return _apply_frame_headers(make_response(html))
 
@@ -0,0 +1,80 @@
+"""Endpoints de monitorización (estado interno del proceso)."""
+import os
+
+from flask import (
+    Blueprint, abort, current_app, flash, jsonify, redirect, render_template, request, send_from_directory, url_for,
+)
+from flask_login import current_user, login_required
+
+from sigp import db
+from sigp.security import require_perm
+from sigp.common.pool_utils import pool_stats
+from sigp.common.profiler_utils import (
+    TOKEN_COOKIE, TOKEN_HEADER, list_profiles, make_profile_token, spool_dir,
+)
+
+monitoring_bp = Blueprint("monitoring", __name__, url_prefix="/monitoring")
+
+_PROFILE_KINDS = {"prof", "collapsed", "json"}
+
+
+@monitoring_bp.get("/pool")
+@login_required
+@require_perm("read_monitoring")
+def pool():
+    """Estadísticas del pool de conexiones de este worker."""
+    data = dict(pid=os.getpid(), pool=pool_stats(db.engine))
+    replica = db.engines.get("replica")
+    if replica is not None:
+        data["replica_pool"] = pool_stats(replica)
+    return jsonify(data)
+
+
+@monitoring_bp.get("/profiles")
+@login_required
+@require_perm("read_monitoring")
+def profiles():
+    """Perfiles recientes y token para perfilar una petición concreta."""
+    return render_template(
+        "list/profiles.html",
+        profiles=list_profiles(),
+        token=make_profile_token(current_user.get_id()),
+        token_header=TOKEN_HEADER,
+        token_minutes=current_app.config.get("PROFILER_TOKEN_MAX_AGE", 600) // 60,
+        profiling=TOKEN_COOKIE in request.cookies,
+        sample_rate=current_app.config.get("PROFILER_SAMPLE_RATE", 0),
+        enabled=current_app.config.get("PROFILER_ENABLED", True),
+    )
+
+
+@monitoring_bp.post("/profiles/cookie")
+@login_required
+@require_perm("read_monitoring")
+def profile_cookie():
+    """Activa (o quita) la cookie que perfila las peticiones de este navegador."""
+    response = redirect(url_for("monitoring.profiles"))
+    if request.form.get("action") == "stop":
+        response.delete_cookie(TOKEN_COOKIE)
+        flash("Perfilado desactivado en este navegador", "info")
+        return response
+    max_age = current_app.config.get("PROFILER_TOKEN_MAX_AGE", 600)
+    response.set_cookie(
+        TOKEN_COOKIE,
+        make_profile_token(current_user.get_id()),
+        max_age=max_age,
+        httponly=True,
+        secure=request.is_secure,
+        samesite="Lax",
+    )
+    flash(f"Se perfilarán tus peticiones desde este navegador durante {max_age // 60} minutos", "info")
+    return response
+
+
+@monitoring_bp.get("/profiles/<profile_id>.<kind>")
+@login_required
+@require_perm("read_monitoring")
+def profile_download(profile_id, kind):
+    """Descarga el .prof, las pilas plegadas o los metadatos de un perfil."""
+    if kind not in _PROFILE_KINDS:
+        abort(404)
+    return send_from_directory(spool_dir(), f"{profile_id}.{kind}", as_attachment=True)
@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import datetime
-import math
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
@@ -14,6 +13,8 @@ import uuid
 from sigp import db
 from sigp.models import Base
 from sigp.security import require_perm
+from sigp.common.notification_utils import adjust_unread, reset_unread
+from sigp.common.pagination_utils import cached_count, keyset_paginate
 
 notifications_bp = Blueprint("notifications", __name__, url_prefix="/notifications")
 
@@ -29,9 +30,7 @@ def my_notifications():
         flash("Tabla notifications no disponible", "danger")
         return redirect(url_for("main.index"))
 
-    page = request.args.get("page", 1, type=int)
     status = request.args.get("status", "all")
-    page = request.args.get("page", 1, type=int)
     per_page = 10
     
     q = db.session.query(Notification).filter_by(user_id=current_user.id)
@@ -39,18 +38,21 @@ def my_notifications():
         q = q.filter_by(is_read=0)
     elif status == "read":
         q = q.filter_by(is_read=1)
-    q = q.order_by(Notification.created_at.desc())
+    # Total exacto: cambia al marcar leídas y con el índice (user_id, created_at, id) es barato
     total = q.count()
-    notifications = q.offset((page - 1) * per_page).limit(per_page).all()
-    pages = math.ceil(total / per_page)
+    pager = keyset_paginate(
+        q,
+        [(Notification.created_at, True), (Notification.id, True)],
+        per_page,
+        request.args.get("cursor"),
+        total=total,
+    )
 
     return render_template(
         "list/my_notifications.html",
-        notifs=notifications,
+        notifs=pager.items,
         total=total,
-        page=page,
-        per_page=per_page,
-        pages=pages,
+        pager=pager,
         status=status,
     )
 
@@ -74,6 +76,7 @@ def mark_all_read():
         return redirect(url_for("notifications.my_notifications"))
     # marcar todas no leídas del usuario
     db.session.query(Notification).filter_by(user_id=current_user.id, is_read=0).update({Notification.is_read: 1})
+    reset_unread(current_user.id)
     db.session.commit()
     flash("Todas las notificaciones han sido marcadas como leídas", "success")
     return redirect(url_for("notifications.my_notifications"))
@@ -87,21 +90,21 @@ def list_all():
         flash("Tabla notifications no disponible", "danger")
         return redirect(url_for("main.index"))
     status = request.args.get("status", "all")
-    page = request.args.get("page", 1, type=int)
     per_page = 10
     q = db.session.query(Notification)
     if status == "unread":
         q = q.filter_by(is_read=0)
     elif status == "read":
         q = q.filter_by(is_read=1)
-    total = q.count()
-    notifs = (
-        q.order_by(Notification.created_at.desc())
-        .limit(per_page)
-        .offset((page - 1) * per_page)
-        .all()
+    total = cached_count(q, ("notifications", status))
+    pager = keyset_paginate(
+        q,
+        [(Notification.created_at, True), (Notification.id, True)],
+        per_page,
+        request.args.get("cursor"),
+        total=total,
     )
-    pages = math.ceil(total / per_page)
+    notifs = pager.items
     # build user name map
     user_map = {}
     if User is not None:
@@ -115,8 +118,7 @@ def list_all():
         "list/notifications_admin.html",
         notifs=notifs,
         status=status,
-        page=page,
-        pages=pages,
+        pager=pager,
         user_map=user_map,
     )
 
@@ -170,6 +172,9 @@ def new_notification():
                 created_at=datetime.datetime.utcnow()
             ))
         db.session.bulk_save_objects(to_insert)
+        # bulk_save_objects no pasa por el flush del ORM
+        for notif in to_insert:
+            adjust_unread(notif.user_id, 1)
         db.session.commit()
         flash(f"Se crearon {len(to_insert)} notificaciones", "success")
         return redirect(url_for("notifications.list_all"))
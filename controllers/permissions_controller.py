@@ -4,6 +4,7 @@ from flask_login import login_required
 
 from sigp import db
 from sigp.models import Base
+from sigp.common.security import invalidate_permissions
 
 perm_bp = Blueprint("permissions", __name__, url_prefix="/permissions")
 
@@ -32,6 +33,7 @@ MODULE_LABELS = {
     'payments': 'Pagos',
     'own': 'Propios',
     'own_leads': 'Leads Propios',
+    'monitoring': 'Monitorización',
 }
 
 
@@ -106,6 +108,7 @@ def assign_permissions(role_id):
             else:
                 ensure_assoc(key)
 
+        invalidate_permissions()
         db.session.commit()
         flash("Permisos actualizados", "success")
         return redirect(url_for("permissions.roles_select"))
@@ -22,6 +22,10 @@ from wtforms.validators import DataRequired, Length, Optional, URL
 from sigp import db
 from sigp.services.contract_service import generate_contract_pdf, sha256_file
 from sigp.common.email_utils import send_simple_mail
+from sigp.common.pagination_utils import cached_count, keyset_paginate
+from sigp.common.prescriptor_utils import invalidate_prescriptor_snapshot
+from sigp.common.user_utils import invalidate_user_cache
+from sigp.services import catalogue_service
 from itsdangerous import URLSafeTimedSerializer
 import os
 from werkzeug.utils import secure_filename
@@ -42,11 +46,7 @@ prescriptors_bp = Blueprint("prescriptors", __name__, url_prefix="/prescriptors"
 
 
 def _get_select_choices(model_name: str):
-    Model = getattr(Base.classes, model_name, None)
-    if not Model:
-        return []
-    rows = db.session.query(Model).all()
-    return [(str(r.id), getattr(r, "name", getattr(r, "nombre", ""))) for r in rows]
+    return [(str(r.id), getattr(r, "name", getattr(r, "nombre", ""))) for r in catalogue_service.rows(model_name)]
 
 
 def prescriptor_form_factory(is_create=True):
@@ -146,24 +146,9 @@ def _get_model():
 # Invoice upload
 StateLedger = getattr(Base.classes, "state_ledger", None)
 
-_DEF_STATE_IDS = {}
-
 def _state_id(slug: str):
-    """Devuelve id del estado con nombre o codigo dado (cache)."""
-    if slug in _DEF_STATE_IDS:
-        return _DEF_STATE_IDS[slug]
-    if StateLedger is None:
-        return None
-    q = db.session.query(StateLedger.id)
-    if hasattr(StateLedger, "code"):
-        q = q.filter((StateLedger.name == slug) | (StateLedger.code == slug))
-    else:
-        q = q.filter(StateLedger.name == slug)
-    row = q.first()
-    if row:
-        _DEF_STATE_IDS[slug] = row.id
-        return row.id
-    return None
+    """Devuelve id del estado de ledger con nombre o codigo dado."""
+    return catalogue_service.find_id("state_ledger", slug, columns=("name", "code"))
 
 DEFAULT_PEND_FACT_ID = 2  # fallback cuando no se puede acceder a BD
 DEFAULT_FACTURADO_ID = 3
@@ -368,11 +353,7 @@ def my_lead_history(lead_id):
     if not lead or lead.prescriptor_id != _get_prescriptor_id(current_user):
         abort(403)
     history = db.session.query(LeadHistory).filter(LeadHistory.lead_id==lead_id).order_by(LeadHistory.changed_at.desc()).all()
-    StateLead = getattr(Base.classes, "state_lead", None)
-    state_map = {}
-    if StateLead is not None:
-        srows = db.session.query(StateLead.id, StateLead.name).all()
-        state_map = {s.id: s.name for s in srows}
+    state_map = catalogue_service.names("state_lead")
     return render_template("list/lead_history.html", history=history, state_map=state_map, user_map={})
 
 # Libro mayor del prescriptor
@@ -414,7 +395,7 @@ def my_ledger():
     if state_f:
         query = query.filter(Ledger.state_id == state_f)
     rows = query.all() if prescriptor_id else []
-    states = db.session.query(StateLedger.id, StateLedger.name).all()
+    states = catalogue_service.rows("state_ledger")
 
     # lista de prescriptores para selector si admin
     presc_choices = []
@@ -448,7 +429,6 @@ def list_prescriptors():
         return redirect("/")
 
     # Parámetros de paginación y filtros
-    page = request.args.get("page", 1, type=int)
     per_page = 20
     nombre_f = request.args.get("nombre", type=str, default="").strip()
     tipo_f = request.args.get("tipo", type=str, default="")
@@ -470,6 +450,7 @@ def list_prescriptors():
             Model.sub_state_id.label("sub_state_id"),
             Model.confidence_level_id.label("confidence_level_id"),
             Model.squeeze_page_status.label("squeeze_page_status"),
+            Model.created_at.label("created_at"),
         )
         .outerjoin(Types, Types.id == Model.type_id)
         .outerjoin(States, States.id == Model.state_id)
@@ -484,13 +465,11 @@ def list_prescriptors():
     if estado_f:
         query = query.filter(Model.state_id == int(estado_f))
 
-    total = query.count()
-    items = (
-        query.order_by(Model.created_at.desc())
-        .offset((page - 1) * per_page)
-        .limit(per_page)
-        .all()
+    total = cached_count(query, ("prescriptors", nombre_f, tipo_f, estado_f))
+    pager = keyset_paginate(
+        query, [(Model.created_at, True), (Model.id, True)], per_page, request.args.get("cursor"), total=total
     )
+    items = pager.items
 
     # Build label maps
     substate_choices = _get_select_choices("substate_prescriptor")
@@ -528,8 +507,7 @@ def list_prescriptors():
     return render_template(
         "list/prescriptors.html",
         items=display_items,
-        page=page,
-        per_page=per_page,
+        pager=pager,
         filters={"nombre": nombre_f, "tipo": tipo_f, "estado": estado_f},
         type_choices=type_choices,
         state_choices=state_choices,
@@ -779,6 +757,7 @@ def edit_my_prescriptor():
             form.squeeze_page_image_1_file.data.save(path_sp)
             prescriptor.photo_url = url_for("static", filename=f"prescriptors/{filename_sp}")
         try:
+            invalidate_prescriptor_snapshot()
             db.session.commit()
             flash("Datos actualizados", "success")
             return redirect(url_for("index"))
@@ -1020,8 +999,10 @@ def update_prescriptor(prescriptor_id):
                     return render_template("records/prescriptor_form.html", form=form, action=url_for("prescriptors.edit_prescriptor", prescriptor_id=prescriptor_id))
                 u.email = form.email.data
                 u.cellular = form.cellular.data
+                invalidate_user_cache()
 
         try:
+            invalidate_prescriptor_snapshot()
             db.session.commit()
             flash("Prescriptor actualizado", "success")
             # ---- Enviar contrato para firma si el SUBESTADO cambió a "FIRMA DE CONTRATO" ----
@@ -1054,6 +1035,7 @@ def update_prescriptor(prescriptor_id):
                     # Guardamos la URL base limpia
                     base_rel_url = url_for("static", filename=f"contracts/{os.path.basename(pdf_path)}")
                     obj.contract_url = base_rel_url
+                    invalidate_prescriptor_snapshot()
                     db.session.commit()
 
                     # 2) Construir token de firma para el prescriptor
@@ -1235,8 +1217,7 @@ def my_commissions():
         rows = db.session.query(PrescComm).filter_by(prescriptor_id=presc.id).all()
 
     # mapas auxiliares
-    prog_rows = db.session.query(Program.id, Program.name).all()
-    prog_map = {pid: name for pid, name in prog_rows}
+    prog_map = catalogue_service.names("programs")
 
     return render_template(
         "records/my_commissions.html",
@@ -1276,14 +1257,9 @@ def prescriptor_commissions(prescriptor_id):
         from sigp.common.prescriptor_utils import sync_commissions_for_prescriptor
         sync_commissions_for_prescriptor(prescriptor_id)
         rows = db.session.query(PrescComm).filter_by(prescriptor_id=prescriptor_id).all()
-    Campus = getattr(Base.classes, "campus", None)
-    prog_rows = db.session.query(Program.id, Program.name, Program.campus_id).all()
-    prog_map = {pid: name for pid, name, _ in prog_rows}
-    prog_campus = {pid: camp_id for pid, _, camp_id in prog_rows}
-    campus_map = {}
-    if Campus is not None:
-        campus_rows = db.session.query(Campus.id, Campus.name).all()
-        campus_map = {cid: cname for cid, cname in campus_rows}
+    prog_map = catalogue_service.names("programs")
+    prog_campus = {p.id: p.campus_id for p in catalogue_service.rows("programs")}
+    campus_map = catalogue_service.names("campus")
     return render_template(
         "records/prescriptor_commissions.html",
         rows=rows,
@@ -26,6 +26,7 @@ def _model(name):
 from uuid import uuid4
 from sigp.security import require_perm
 from sigp.common.email_utils import send_simple_mail
+from sigp.services import catalogue_service
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -106,6 +107,7 @@ def _program_form(program_id=None):
             if url_saved:
                 setattr(program, attr, url_saved)
         try:
+            catalogue_service.invalidate()
             db.session.commit()
             
             # -----------------------------------------------------------------------
@@ -158,8 +160,7 @@ def _program_form(program_id=None):
             current_app.logger.exception("Error guardando programa: %s", e)
             flash("Error al guardar programa. Verifique los campos obligatorios.", "danger")
 
-    Campus = _model("campus")
-    campuses = db.session.query(Campus).all() if Campus else []
+    campuses = catalogue_service.rows("campus")
     return render_template("records/program_form.html", program=program, campuses=campuses)
 
 
@@ -192,13 +193,7 @@ def programs_list():
     pages = math.ceil(total / per_page)
 
     # campus map
-    Campus = _model("campus")
-    campus_map = {}
-    if Campus is not None and programs:
-        campus_ids = {p.campus_id for p in programs if getattr(p, "campus_id", None)}
-        if campus_ids:
-            rows = db.session.query(Campus.id, Campus.name).filter(Campus.id.in_(campus_ids)).all()
-            campus_map = {cid: cname for cid, cname in rows}
+    campus_map = catalogue_service.names("campus") if programs else {}
 
     return render_template(
         "list/programs.html",
@@ -241,6 +236,7 @@ def program_duplicate(program_id):
         setattr(new, f, getattr(src, f))
     new.name = f"{src.name} (copia)"
     db.session.add(new)
+    catalogue_service.invalidate()
     db.session.commit()
     
     # -----------------------------------------------------------------------
@@ -324,6 +320,7 @@ def program_toggle(program_id):
     if program:
         new_state = "Desactivado" if (program.state or "Activo") == "Activo" else "Activo"
         program.state = new_state
+        catalogue_service.invalidate()
         db.session.commit()
         flash(f"Programa marcado como {new_state}", "info")
     return redirect(url_for("programs.programs_list"))
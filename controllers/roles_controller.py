@@ -6,6 +6,7 @@ from flask_login import login_required
 
 from sigp import db
 from sigp.models import Base
+from sigp.common.security import invalidate_permissions
 
 roles_bp = Blueprint("roles", __name__, url_prefix="/roles")
 
@@ -75,6 +76,7 @@ def role_edit(role_id):
     if request.method == "POST":
         role.name = request.form.get("name", role.name).strip()
         role.description = request.form.get("description", role.description).strip()
+        invalidate_permissions()
         db.session.commit()
         flash("Rol actualizado", "success")
         return redirect(url_for("roles.roles_list"))
@@ -106,6 +108,7 @@ def role_delete(role_id):
             db.session.flush()
         try:
             db.session.delete(role)
+            invalidate_permissions()
             db.session.commit()
             flash("Rol eliminado", "info")
         except Exception as e:
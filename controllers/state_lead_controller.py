@@ -7,6 +7,7 @@ from sqlalchemy.exc import IntegrityError
 
 from sigp import db
 from sigp.models import Base
+from sigp.services import catalogue_service
 from sigp.security import require_perm
 
 state_lead_bp = Blueprint("state_lead", __name__, url_prefix="/state-leads")
@@ -91,6 +92,7 @@ def _state_lead_form(lead_id=None):
                     lead.description = description or None
                 if hasattr(lead, "color"):
                     lead.color = color or None
+                catalogue_service.invalidate()
                 db.session.commit()
                 flash("Estado guardado", "success")
                 return redirect(url_for("state_lead.state_leads_list"))
@@ -129,6 +131,7 @@ def state_lead_delete(lead_id):
     lead = db.session.get(StateLead, lead_id)
     if lead:
         db.session.delete(lead)
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Estado eliminado", "info")
     return redirect(url_for("state_lead.state_leads_list"))
@@ -6,6 +6,7 @@ from sqlalchemy.exc import IntegrityError
 
 from sigp import db
 from sigp.models import Base
+from sigp.services import catalogue_service
 from sigp.security import require_perm
 
 state_ledger_bp = Blueprint("state_ledger", __name__, url_prefix="/state-ledgers")
@@ -68,6 +69,7 @@ def _state_ledger_form(ledger_id=None):
                     ledger = StateLedger(id=None)
                     db.session.add(ledger)
                 ledger.name = name
+                catalogue_service.invalidate()
                 db.session.commit()
                 flash("Estado guardado", "success")
                 return redirect(url_for("state_ledger.state_ledgers_list"))
@@ -102,6 +104,7 @@ def state_ledger_delete(ledger_id):
     ledger = db.session.get(StateLedger, ledger_id)
     if ledger:
         db.session.delete(ledger)
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Estado eliminado", "info")
     return redirect(url_for("state_ledger.state_ledgers_list"))
@@ -6,6 +6,7 @@ from sqlalchemy.exc import IntegrityError
 
 from sigp import db
 from sigp.models import Base
+from sigp.services import catalogue_service
 from sigp.security import require_perm
 
 state_prescriptor_bp = Blueprint("state_prescriptor", __name__, url_prefix="/state-prescriptors")
@@ -49,6 +50,7 @@ def _form(row_id=None):
                     row = M(id=None)
                     db.session.add(row)
                 row.name = name
+                catalogue_service.invalidate()
                 db.session.commit()
                 flash("Estado guardado", "success")
                 return redirect(url_for("state_prescriptor.state_prescriptors_list"))
@@ -79,6 +81,7 @@ def delete(row_id):
     row = db.session.get(M, row_id)
     if row:
         db.session.delete(row)
+        catalogue_service.invalidate()
         db.session.commit()
         flash("Estado eliminado", "info")
     return redirect(url_for("state_prescriptor.state_prescriptors_list"))
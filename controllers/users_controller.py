@@ -1,6 +1,5 @@
 """Users controller: ABM con paginación y filtro."""
 import uuid
-import math
 import hashlib
 from flask import (
     Blueprint,
@@ -15,6 +14,8 @@ from flask_login import login_required
 from sigp import db
 from sqlalchemy import or_
 from sigp.models import Base
+from sigp.common.pagination_utils import cached_count, keyset_paginate
+from sigp.common.user_utils import invalidate_user_cache
 
 users_bp = Blueprint("users", __name__, url_prefix="/users")
 
@@ -62,24 +63,18 @@ def users_list():
     if state_filter:
         query = query.filter(User.state_id == int(state_filter))
 
-    page = int(request.args.get("page", 1))
     per_page = 10
-    total = query.count()
-    users = (
-        query.order_by(User.email)
-        .limit(per_page)
-        .offset((page - 1) * per_page)
-        .all()
+    total = cached_count(query, ("users", q, role_filter, state_filter))
+    pager = keyset_paginate(
+        query, [(User.email, False), (User.id, False)], per_page, request.args.get("cursor"), total=total
     )
-    pages = math.ceil(total / per_page)
     roles_full = _get_choices(Role)
     roles_lookup = {r.id: r.name for r in roles_full}
     return render_template(
         "list/users.html",
-        users=users,
+        users=pager.items,
         q=q,
-        page=page,
-        pages=pages,
+        pager=pager,
         roles=roles_full,
         roles_lookup=roles_lookup,
         role_filter=role_filter,
@@ -156,6 +151,7 @@ def _user_form(user_id=None):
         if password:
             user.password_hash = hashlib.sha256(password.encode()).hexdigest()
 
+        invalidate_user_cache()
         db.session.commit()
         flash("Usuario guardado", "success")
         return redirect(url_for("users.users_list"))
@@ -182,6 +178,7 @@ def user_delete(user_id):
     user = db.session.get(User, user_id)
     if user:
         db.session.delete(user)
+        invalidate_user_cache()
         db.session.commit()
         flash("Usuario eliminado", "info")
     return redirect(url_for("users.users_list"))
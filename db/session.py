@@ -6,6 +6,9 @@ from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from sigp.config import Config
+from sigp.common.pool_utils import install_pool_metrics
+
 load_dotenv()
 
 DATABASE_URI = (
@@ -13,7 +16,8 @@ DATABASE_URI = (
     or "mysql+pymysql://admin:<PASSWORD>@db-prescriptores.cl0glysfjbui.eu-west-1.rds.amazonaws.com:3306/db_sigp"
 )
 
-engine = create_engine(DATABASE_URI, pool_pre_ping=True)
+engine = create_engine(DATABASE_URI, **Config.SQLALCHEMY_ENGINE_OPTIONS)
+install_pool_metrics(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
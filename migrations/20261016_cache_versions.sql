@@ -0,0 +1,14 @@
+-- Script: 20261016_cache_versions.sql
+-- Objetivo: contadores de versión de las cachés de proceso (permisos por rol, ...).
+-- Al modificar roles o permisos se incrementa la versión y cada worker vacía su caché.
+
+CREATE TABLE IF NOT EXISTS cache_versions (
+  name VARCHAR(64) NOT NULL,
+  version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO cache_versions (name, version)
+SELECT 'permissions', 0
+WHERE NOT EXISTS (SELECT 1 FROM cache_versions WHERE name = 'permissions');
@@ -0,0 +1,16 @@
+-- Script: 20261016_dashboard_snapshot.sql
+-- Objetivo: snapshots precalculados del dashboard de dirección (/directive/dashboard).
+-- Un cron ejecuta cada N minutos:
+--   flask sigp snapshot-dashboard
+-- La vista sirve el último snapshot y los anteriores se conservan para la
+-- gráfica de evolución de prescriptores por estado.
+-- MySQL 8+ (JSON supported)
+
+CREATE TABLE IF NOT EXISTS dashboard_snapshot (
+  id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  computed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  duration_ms INT UNSIGNED NOT NULL DEFAULT 0,
+  payload JSON NOT NULL,
+  PRIMARY KEY (id),
+  KEY idx_dashboard_snapshot_computed (computed_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
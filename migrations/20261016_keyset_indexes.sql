@@ -0,0 +1,23 @@
+-- Script: 20261016_keyset_indexes.sql
+-- Objetivo: índices compuestos para la paginación por cursor (common/pagination_utils.py).
+-- Cada listado ordena por (created_at, id) o (email, id) y pide "filas después de la
+-- última vista"; con estos índices la página N cuesta lo mismo que la primera.
+
+-- Leads: listado general, filtrado por prescriptor y por estado
+ALTER TABLE leads
+    ADD INDEX IF NOT EXISTS idx_leads_created_id (created_at, id),
+    ADD INDEX IF NOT EXISTS idx_leads_prescriptor_created_id (prescriptor_id, created_at, id),
+    ADD INDEX IF NOT EXISTS idx_leads_state_created_id (state_id, created_at, id);
+
+-- Prescriptores
+ALTER TABLE prescriptors
+    ADD INDEX IF NOT EXISTS idx_prescriptors_created_id (created_at, id);
+
+-- Usuarios: el listado filtra por estado (Activo por defecto) y ordena por email
+ALTER TABLE users
+    ADD INDEX IF NOT EXISTS idx_users_state_email_id (state_id, email, id);
+
+-- Notificaciones: "mis notificaciones" y listado de administración
+ALTER TABLE notifications
+    ADD INDEX IF NOT EXISTS idx_notifications_user_created_id (user_id, created_at, id),
+    ADD INDEX IF NOT EXISTS idx_notifications_created_id (created_at, id);
@@ -0,0 +1,16 @@
+-- Script: 20261016_lead_search.sql
+-- Objetivo: búsqueda indexada de leads por nombre, email o celular del candidato
+-- (filtro "Candidato" de los listados; ver common/search_utils.py).
+-- search_text = nombre y email normalizados (minúsculas, sin tildes) + dígitos del celular.
+-- Se mantiene al crear/editar leads con el ORM; tras aplicar la migración hay que
+-- rellenarla una vez:
+--   flask sigp reindex-leads
+--
+-- El índice FULLTEXT no guarda palabras más cortas que innodb_ft_min_token_size (3 por
+-- defecto); si se cambia esa variable, ajustar LEAD_SEARCH_MIN_TOKEN y recrear el índice.
+
+ALTER TABLE leads
+    ADD COLUMN IF NOT EXISTS search_text VARCHAR(700) NULL;
+
+ALTER TABLE leads
+    ADD FULLTEXT INDEX IF NOT EXISTS ft_leads_search_text (search_text);
@@ -0,0 +1,7 @@
+-- Script: 20261016_monitoring_permission.sql
+-- Objetivo: permiso para los endpoints de /monitoring (pool de conexiones, etc.)
+
+-- MySQL 8.0+
+INSERT INTO permissions (id, name, description)
+SELECT UUID(), 'read_monitoring', 'Ver métricas internas (pool de conexiones, rendimiento)'
+WHERE NOT EXISTS (SELECT 1 FROM permissions WHERE name = 'read_monitoring');
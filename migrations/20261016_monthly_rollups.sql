@@ -0,0 +1,31 @@
+-- Script: 20261016_monthly_rollups.sql
+-- Objetivo: agregados mensuales de leads y ledger por prescriptor/mes/estado para el
+-- reporte de prescriptores y el dashboard de dirección (sin recorrer todo el histórico).
+-- Se mantienen en la misma transacción que las escrituras (common/rollup_utils.py).
+-- Tras aplicar la migración hay que rellenarlas una vez:
+--   flask sigp rebuild-rollups
+--
+-- Valores centinela (las columnas de la clave primaria no admiten NULL):
+--   prescriptor_id = ''  -> movimiento sin prescriptor
+--   ym = ''              -> created_at NULL
+--   state_id = 0         -> sin estado
+
+CREATE TABLE IF NOT EXISTS leads_monthly (
+  prescriptor_id VARCHAR(36) NOT NULL DEFAULT '',
+  ym CHAR(7) NOT NULL DEFAULT '',
+  state_id INT NOT NULL DEFAULT 0,
+  count INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (prescriptor_id, ym, state_id),
+  KEY idx_leads_monthly_ym (ym, state_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS ledger_monthly (
+  prescriptor_id VARCHAR(36) NOT NULL DEFAULT '',
+  ym CHAR(7) NOT NULL DEFAULT '',
+  state_id INT NOT NULL DEFAULT 0,
+  count INT NOT NULL DEFAULT 0,
+  amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+  amount_signed DECIMAL(14,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (prescriptor_id, ym, state_id),
+  KEY idx_ledger_monthly_ym (ym, state_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
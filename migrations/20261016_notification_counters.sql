@@ -0,0 +1,15 @@
+-- Script: 20261016_notification_counters.sql
+-- Objetivo: contador de notificaciones no leídas por usuario (evita COUNT(*) en cada página).
+-- Se rellena solo (COUNT la primera vez que se lee cada usuario); para recalcularlo:
+--   flask sigp reconcile-unread
+
+CREATE TABLE IF NOT EXISTS notification_counters (
+  user_id VARCHAR(36) NOT NULL,
+  unread INT UNSIGNED NOT NULL DEFAULT 0,
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Índice para el recálculo y para los listados de "no leídas"
+ALTER TABLE notifications
+    ADD INDEX IF NOT EXISTS idx_notifications_user_read (user_id, is_read);
@@ -1,25 +1,389 @@
 """
 Inicializa la reflexión de tablas existentes mediante SQLAlchemy automap.
+
+La reflexión completa contra RDS implica decenas de consultas a
+INFORMATION_SCHEMA. Para acelerar el arranque de los workers el ``MetaData``
+reflejado se guarda en un snapshot local (pickle) junto a una huella barata del
+esquema; si la huella coincide se carga el snapshot y sólo se reflexiona en
+vivo cuando el esquema cambió. El snapshot empieza por una cabecera (formato,
+versión de SQLAlchemy y huella) que se lee antes que el ``MetaData``: tras
+actualizar SQLAlchemy no se intenta deserializar un pickle de otra versión.
+
+Con ``SCHEMA_REFLECT_MODE = "lazy"`` no se mapea nada al arrancar: cada tabla
+(y sus vecinas por FK) se refleja la primera vez que se accede a
+``Base.classes.<tabla>``, de modo que un worker que sólo sirve la landing
+pública no paga la reflexión de contratos, multimedia o liquidaciones. Las
+tablas de asociación (p.ej. ``role_permissions``) se cargan junto con cualquiera
+de sus dos extremos para que existan las mismas relaciones muchos a muchos
+(``<tabla>_collection`` con ``secondary``) que en la reflexión completa.
 """
+import logging
+import pickle
+import threading
+import time
+from pathlib import Path
+
+import sqlalchemy
 from flask import current_app
-from sqlalchemy.ext.automap import automap_base
+from sqlalchemy import MetaData, inspect, text, util
+from sqlalchemy.exc import NoSuchTableError, InvalidRequestError
+from sqlalchemy.ext.automap import automap_base, name_for_scalar_relationship, name_for_collection_relationship
+from sqlalchemy.orm import relationship, backref, configure_mappers
 from sigp import db
 
 Base = automap_base()
 
+log = logging.getLogger("sigp")
+
+# 2: cabecera y MetaData en dos pickles consecutivos
+_SNAPSHOT_FORMAT = 2
+
+# Una sola consulta: número de columnas y checksums de columnas, índices, FKs y
+# reglas ON UPDATE / ON DELETE de las FKs.
+_FINGERPRINT_SQL = text(
+    """
+    SELECT
+      (SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()),
+      (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION,
+              COLUMN_TYPE, IS_NULLABLE, COALESCE(COLUMN_DEFAULT, ''), COLUMN_KEY, EXTRA))), 0)
+         FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+      (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX,
+              COLUMN_NAME, NON_UNIQUE))), 0)
+         FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()),
+      (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME,
+              COALESCE(REFERENCED_TABLE_NAME, ''), COALESCE(REFERENCED_COLUMN_NAME, '')))), 0)
+         FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = DATABASE()),
+      (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME, UPDATE_RULE, DELETE_RULE,
+              COALESCE(REFERENCED_TABLE_NAME, ''), MATCH_OPTION))), 0)
+         FROM information_schema.REFERENTIAL_CONSTRAINTS WHERE CONSTRAINT_SCHEMA = DATABASE())
+    """
+)
+
+# Tablas de asociación (dos FKs que cubren todas las columnas) y las tablas a las que apuntan
+_ASSOCIATIONS_SQL = text(
+    """
+    SELECT k.TABLE_NAME, k.REFERENCED_TABLE_NAME
+      FROM information_schema.KEY_COLUMN_USAGE k
+     WHERE k.TABLE_SCHEMA = DATABASE() AND k.REFERENCED_TABLE_NAME IS NOT NULL
+       AND k.TABLE_NAME IN (
+           SELECT f.TABLE_NAME FROM information_schema.KEY_COLUMN_USAGE f
+            WHERE f.TABLE_SCHEMA = DATABASE() AND f.REFERENCED_TABLE_NAME IS NOT NULL
+            GROUP BY f.TABLE_NAME
+           HAVING COUNT(DISTINCT f.CONSTRAINT_NAME) = 2
+              AND COUNT(DISTINCT f.COLUMN_NAME) = (
+                  SELECT COUNT(*) FROM information_schema.COLUMNS c
+                   WHERE c.TABLE_SCHEMA = DATABASE() AND c.TABLE_NAME = f.TABLE_NAME))
+    """
+)
+
+
+def schema_fingerprint(engine):
+    """Huella del esquema en una única consulta (None si no se puede calcular)."""
+    if engine.dialect.name != "mysql":
+        return None
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(_FINGERPRINT_SQL).one()
+    except Exception as exc:  # pylint: disable=broad-except
+        current_app.logger.warning("No se pudo calcular la huella del esquema: %s", exc)
+        return None
+    return ":".join(str(v) for v in row)
+
+
+def snapshot_path(app=None):
+    """Ruta del snapshot de esquema (configurable con SCHEMA_SNAPSHOT_PATH)."""
+    app = app or current_app
+    cfg = app.config.get("SCHEMA_SNAPSHOT_PATH")
+    if cfg:
+        return Path(cfg)
+    return Path(app.instance_path) / "schema_snapshot.pickle"
+
+
+def _snapshot_header(fingerprint: str) -> dict:
+    return {"format": _SNAPSHOT_FORMAT, "sqlalchemy": sqlalchemy.__version__, "fingerprint": fingerprint}
+
+
+def load_snapshot(path: Path, fingerprint: str):
+    """Devuelve el MetaData guardado si formato, versión de SQLAlchemy y huella coinciden; si no, None."""
+    try:
+        with open(path, "rb") as fh:
+            header = pickle.load(fh)
+            if not isinstance(header, dict) or header.get("metadata") is not None:
+                return None  # formato 1: cabecera y MetaData en un solo pickle
+            if header != _snapshot_header(fingerprint):
+                return None
+            return pickle.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:  # pylint: disable=broad-except
+        current_app.logger.warning("Snapshot de esquema ilegible (%s): %s", path, exc)
+        return None
+
+
+def save_snapshot(path: Path, fingerprint: str, metadata: MetaData) -> None:
+    """Guarda el MetaData reflejado de forma atómica (cabecera y MetaData por separado)."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump(_snapshot_header(fingerprint), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(metadata, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+    except Exception as exc:  # pylint: disable=broad-except
+        current_app.logger.warning("No se pudo guardar el snapshot de esquema en %s: %s", path, exc)
+
+
+class _LazyRegistry:
+    """Refleja y mapea tablas bajo demanda (modo ``lazy``)."""
+
+    def __init__(self):
+        self.engine = None
+        self.snapshot = None  # MetaData del snapshot, si es válido
+        self.attempted = set()
+        self.associations = None  # tabla de asociación -> tablas que enlaza
+        self.lock = threading.RLock()
+
+    @property
+    def enabled(self):
+        return self.engine is not None
+
+    def configure(self, engine, snapshot=None):
+        self.engine = engine
+        self.snapshot = snapshot
+
+    def load(self, name: str) -> bool:
+        """Refleja ``name`` y sus tablas referenciadas. True si se intentó por primera vez."""
+        if self.engine is None or name.startswith("_") or name in self.attempted:
+            return False
+        with self.lock:
+            if name in self.attempted:
+                return False
+            self.attempted.add(name)
+            started = time.perf_counter()
+            mapped_before = {cls.__table__: cls for cls in Base.classes.values()}
+            try:
+                if self.snapshot is not None and name not in self.snapshot.tables:
+                    return False
+                self._add(name)
+                self._add_associations()
+            except (NoSuchTableError, InvalidRequestError):
+                return False
+            Base.prepare()
+            new_classes = [cls for cls in Base.classes.values() if cls.__table__ not in mapped_before]
+            _link_to_mapped(new_classes, mapped_before)
+            if any(cls.__table__.name == "users" for cls in new_classes):
+                _inject_user_mixin()
+            log.debug(
+                "Reflexión diferida de %s en %.0f ms (+%d clases)",
+                name, (time.perf_counter() - started) * 1000, len(new_classes),
+            )
+            return True
+
+    def _add(self, name: str) -> None:
+        """Añade ``name`` y las tablas que referencia (transitivamente) a ``Base.metadata``."""
+        if self.snapshot is not None:
+            for table in _fk_closure(self.snapshot.tables[name]):
+                if table.key not in Base.metadata.tables:
+                    table.to_metadata(Base.metadata)
+        else:
+            Base.metadata.reflect(
+                self.engine,
+                only=[name],
+                resolve_fks=True,
+                extend_existing=True,
+                autoload_replace=False,
+            )
+
+    def _add_associations(self) -> None:
+        """Añade las tablas de asociación de las tablas ya cargadas (y su otro extremo).
+
+        Así los dos extremos se mapean en la misma tanda y ``Base.prepare()`` crea la
+        relación muchos a muchos, que no puede crear si uno venía de una carga previa.
+        """
+        if self.associations is None:
+            self.associations = self._find_associations()
+        while True:
+            pending = [
+                assoc for assoc, ends in self.associations.items()
+                if assoc not in Base.metadata.tables and ends & set(Base.metadata.tables)
+            ]
+            if not pending:
+                return
+            for assoc in pending:
+                self._add(assoc)
+
+    def _find_associations(self) -> dict:
+        if self.snapshot is not None:
+            return {
+                table.key: {fk.referred_table.key for fk in table.foreign_key_constraints}
+                for table in self.snapshot.tables.values()
+                if _is_association(table)
+            }
+        associations = {}
+        if self.engine.dialect.name == "mysql":
+            with self.engine.connect() as conn:
+                for table_name, referred in conn.execute(_ASSOCIATIONS_SQL):
+                    associations.setdefault(table_name, set()).add(referred)
+            return associations
+        # Otros motores (desarrollo): inspección tabla a tabla
+        insp = inspect(self.engine)
+        for table_name in insp.get_table_names():
+            fks = insp.get_foreign_keys(table_name)
+            fk_cols = {col for fk in fks for col in fk["constrained_columns"]}
+            if len(fks) == 2 and fk_cols == {col["name"] for col in insp.get_columns(table_name)}:
+                associations[table_name] = {fk["referred_table"] for fk in fks}
+        return associations
+
+
+_registry = _LazyRegistry()
+
+
+class _LazyClasses(util.Properties):
+    """``Base.classes`` que, en modo lazy, refleja la tabla pedida si aún no está mapeada.
+
+    ``in`` e iterar sólo ven las clases ya cargadas (no disparan reflexión).
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, key):
+        try:
+            return self._data[key]
+        except KeyError:
+            pass
+        if _registry.load(key) and key in self._data:
+            return self._data[key]
+        raise AttributeError(key)
+
+    def __getitem__(self, key):
+        try:
+            return self.__getattr__(key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self.__getattr__(key)
+        except AttributeError:
+            return default
+
+
+Base.classes = _LazyClasses({})
+
+
+def _fk_closure(table):
+    """Tabla más todas las que referencia (transitivamente) por FK."""
+    seen = {}
+    pending = [table]
+    while pending:
+        tbl = pending.pop()
+        if tbl.key in seen:
+            continue
+        seen[tbl.key] = tbl
+        for fk in tbl.foreign_keys:
+            pending.append(fk.column.table)
+    return list(seen.values())
+
+
+def _link_to_mapped(new_classes, mapped_before):
+    """Crea las relaciones de las clases nuevas hacia clases mapeadas en cargas previas.
+
+    ``Base.prepare()`` incremental sólo relaciona las tablas de la misma tanda; se
+    replican aquí los nombres de automap (``<tabla>`` / ``<tabla>_collection``).
+    """
+    for cls in new_classes:
+        for fk in cls.__table__.foreign_key_constraints:
+            referred = mapped_before.get(fk.referred_table)
+            if referred is None:
+                continue
+            attr = name_for_scalar_relationship(Base, cls, referred, fk)
+            backref_name = name_for_collection_relationship(Base, referred, cls, fk)
+            if (
+                attr in cls.__table__.c
+                or cls.__mapper__.has_property(attr)
+                or referred.__mapper__.has_property(backref_name)
+            ):
+                continue
+            cols = [elem.parent for elem in fk.elements]
+            cls.__mapper__.add_property(
+                attr,
+                relationship(referred, foreign_keys=cols, backref=backref(backref_name, foreign_keys=cols)),
+            )
+
+
+def _is_association(table) -> bool:
+    """Tabla de asociación según automap: dos FKs que cubren todas sus columnas."""
+    fks = table.foreign_key_constraints
+    return len(fks) == 2 and {elem.parent for fk in fks for elem in fk.elements} == set(table.c)
+
 
 def reflect_db(app=None):
     """
     Ejecuta la reflexión de metadatos solo una vez.
     """
-    if Base.classes:
+    if Base.classes or _registry.enabled:
         # Ya se reflejó
         return
 
+    app = app or current_app
+    started = time.perf_counter()
+
     # Obtener engine ya inicializado por Flask-SQLAlchemy
     engine = db.engine
-    Base.prepare(engine, reflect=True)
+    if app.config.get("MODELS_SOURCE", "automap") == "generated" and _load_generated(app):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        app.extensions["sigp_schema"] = {"source": "generated", "ms": elapsed_ms, "tables": len(Base.metadata.tables)}
+        app.logger.info("Modelos generados cargados en %.0f ms: %d tablas", elapsed_ms, len(Base.metadata.tables))
+        _inject_user_mixin()
+        return
+
+    use_snapshot = app.config.get("SCHEMA_SNAPSHOT_ENABLED", True)
+    fingerprint = schema_fingerprint(engine) if use_snapshot else None
+    path = snapshot_path(app)
+
+    source = "live"
+    cached = load_snapshot(path, fingerprint) if fingerprint else None
+    if app.config.get("SCHEMA_REFLECT_MODE", "full") == "lazy":
+        # Las tablas se reflejan al primer acceso a Base.classes.<tabla>
+        _registry.configure(engine, cached)
+        app.extensions["sigp_schema"] = {"source": "lazy", "ms": 0.0, "tables": 0}
+        app.logger.info("Esquema en modo lazy (snapshot %s)", "sí" if cached is not None else "no")
+        return
+    if cached is not None:
+        for table in cached.sorted_tables:
+            table.to_metadata(Base.metadata)
+        Base.prepare()
+        source = "snapshot"
+    else:
+        Base.prepare(engine, reflect=True)
+        if fingerprint:
+            save_snapshot(path, fingerprint, Base.metadata)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    app.extensions["sigp_schema"] = {"source": source, "ms": elapsed_ms, "tables": len(Base.metadata.tables)}
+    app.logger.info(
+        "Esquema cargado (%s) en %.0f ms: %d tablas", source, elapsed_ms, len(Base.metadata.tables)
+    )
+
+    _inject_user_mixin()
+
+
+def _load_generated(app):
+    """Registra en ``Base.classes`` los modelos de ``sigp/models/generated.py`` (sin consultar la BD)."""
+    try:
+        from sigp.models import generated
+    except ImportError:
+        app.logger.warning("MODELS_SOURCE=generated pero no existe sigp/models/generated.py; se usa automap")
+        return False
+    for table_name, cls in generated.MODELS.items():
+        Base.classes[table_name] = cls
+    # Compilar los mappers una vez, al arrancar
+    configure_mappers()
+    return True
+
 
+def _inject_user_mixin():
     # Integrar mixin de Flask-Login en la clase users reflejada
     try:
         from flask_login import UserMixin
@@ -34,4 +398,4 @@ def reflect_db(app=None):
                 return getattr(self, "state_id", 2) == 2
             setattr(User, "is_active", _is_active)
     except Exception as e:
-        current_app.logger.warning("No se pudo inyectar UserMixin en users: %s", e)
\ No newline at end of file
+        log.warning("No se pudo inyectar UserMixin en users: %s", e)
@@ -0,0 +1,259 @@
+"""
+Generador de modelos declarativos estáticos a partir del esquema reflejado.
+
+``flask sigp gen-models`` refleja la base de datos una vez y escribe
+``sigp/models/generated.py`` con columnas, índices y relaciones explícitas. Los
+nombres de clase en ``Base.classes`` y de relaciones (``<tabla>`` para el lado
+escalar, ``<tabla>_collection`` para las colecciones) replican los que genera
+automap, de modo que el código existente sigue funcionando sin cambios.
+"""
+from __future__ import annotations
+
+import keyword
+import re
+
+import sqlalchemy as sa
+from sqlalchemy import ForeignKeyConstraint, UniqueConstraint
+
+HEADER = '''"""
+Modelos generados por ``flask sigp gen-models``. NO EDITAR A MANO.
+
+Uso directo: ``from sigp.models.generated import {example}``. Con
+``MODELS_SOURCE=generated`` ``reflect_db`` registra estas clases en
+``Base.classes`` y no reflexiona la base de datos al arrancar.
+"""
+# fmt: off
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import declarative_base, relationship
+
+from sigp.models import Base as _AutomapBase
+
+SCHEMA_FINGERPRINT = {fingerprint!r}
+
+Model = declarative_base(metadata=_AutomapBase.metadata)
+'''
+
+
+def class_name(table_name: str) -> str:
+    """``state_lead`` -> ``StateLead``."""
+    name = "".join(part[:1].upper() + part[1:] for part in re.split(r"[^0-9a-zA-Z]+", table_name) if part)
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = "T" + name
+    return name
+
+
+def _is_many_to_many(table):
+    """Misma regla que automap: dos FKs que cubren todas las columnas."""
+    fks = sorted(
+        (c for c in table.constraints if isinstance(c, ForeignKeyConstraint)),
+        key=lambda c: [e.parent.name for e in c.elements],
+    )
+    if len(fks) != 2:
+        return None
+    cols = {e.parent for fk in fks for e in fk.elements}
+    if cols != set(table.c):
+        return None
+    return fks
+
+
+def _render_type(type_) -> str:
+    cls = type(type_)
+    if cls.__module__.startswith("sqlalchemy.dialects.mysql"):
+        return "mysql." + repr(type_)
+    if hasattr(sa, cls.__name__):
+        return "sa." + repr(type_)
+    return "sa.types." + repr(type_)
+
+
+def _render_default(default) -> str:
+    arg = getattr(default, "arg", default)
+    return "sa.text(%r)" % str(getattr(arg, "text", arg))
+
+
+def _render_column(col) -> str:
+    args = [repr(col.name), _render_type(col.type)]
+    if col.primary_key:
+        args.append("primary_key=True")
+    if isinstance(col.autoincrement, bool) and col.primary_key:
+        args.append("autoincrement=%r" % col.autoincrement)
+    if not col.primary_key:
+        args.append("nullable=%r" % col.nullable)
+    if col.server_default is not None:
+        args.append("server_default=" + _render_default(col.server_default))
+    if col.comment:
+        args.append("comment=%r" % col.comment)
+    return "sa.Column(%s)" % ", ".join(args)
+
+
+def _render_fk(fk) -> str:
+    local = [e.parent.name for e in fk.elements]
+    remote = ["%s.%s" % (e.column.table.name, e.column.name) for e in fk.elements]
+    args = [repr(local), repr(remote)]
+    if fk.name:
+        args.append("name=%r" % fk.name)
+    if fk.ondelete:
+        args.append("ondelete=%r" % fk.ondelete)
+    if fk.onupdate:
+        args.append("onupdate=%r" % fk.onupdate)
+    return "sa.ForeignKeyConstraint(%s)" % ", ".join(args)
+
+
+def _table_args(table) -> list[str]:
+    items = []
+    index_names = set()
+    for idx in sorted(table.indexes, key=lambda i: i.name or ""):
+        index_names.add(idx.name)
+        cols = ", ".join(repr(c.name) for c in idx.columns)
+        unique = ", unique=True" if idx.unique else ""
+        items.append("sa.Index(%r, %s%s)" % (idx.name, cols, unique))
+    for cons in sorted(table.constraints, key=lambda c: c.name or ""):
+        if isinstance(cons, UniqueConstraint) and cons.name not in index_names:
+            cols = ", ".join(repr(c.name) for c in cons.columns)
+            items.append("sa.UniqueConstraint(%s, name=%r)" % (cols, cons.name))
+    for fk in _sorted_fks(table):
+        items.append(_render_fk(fk))
+    return items
+
+
+def _sorted_fks(table):
+    return sorted(
+        (c for c in table.constraints if isinstance(c, ForeignKeyConstraint)),
+        key=lambda c: (c.referred_table.name, [e.parent.name for e in c.elements]),
+    )
+
+
+def _plan_relationships(tables, classes):
+    """Calcula las relaciones con la misma precedencia y nombres que automap."""
+    taken = {t.name: {c.name for c in t.c} for t in tables if t.name in classes}
+    rels = {name: [] for name in taken}
+
+    def _free(table_name, attr):
+        return attr not in taken[table_name]
+
+    for table in tables:
+        m2m = _is_many_to_many(table)
+        if m2m is not None:
+            lcl, rem = (fk.referred_table.name for fk in m2m)
+            if lcl not in classes or rem not in classes:
+                continue
+            attr = rem.lower() + "_collection"
+            back = lcl.lower() + "_collection"
+            if not _free(lcl, attr) or not _free(rem, back):
+                continue
+            var = "t_" + table.name
+            pj = " & ".join("(%s.%s == %s.c.%s)" % (classes[lcl], e.column.name, var, e.parent.name) for e in m2m[0].elements)
+            sj = " & ".join("(%s.%s == %s.c.%s)" % (classes[rem], e.column.name, var, e.parent.name) for e in m2m[1].elements)
+            rels[lcl].append(
+                "%s = relationship(%r, secondary=lambda: %s, primaryjoin=lambda: %s, "
+                "secondaryjoin=lambda: %s, back_populates=%r, overlaps=\"__*\")"
+                % (attr, classes[rem], var, pj, sj, back)
+            )
+            rels[rem].append(
+                "%s = relationship(%r, secondary=lambda: %s, primaryjoin=lambda: %s, "
+                "secondaryjoin=lambda: %s, back_populates=%r, overlaps=\"__*\")"
+                % (back, classes[lcl], var, sj, pj, attr)
+            )
+            taken[lcl].add(attr)
+            taken[rem].add(back)
+            continue
+        if table.name not in classes:
+            continue
+        for fk in _sorted_fks(table):
+            referred = fk.referred_table.name
+            if referred not in classes:
+                continue
+            attr = referred.lower()
+            back = table.name.lower() + "_collection"
+            if not _free(table.name, attr) or not _free(referred, back):
+                continue
+            local_cls = classes[table.name]
+            fk_cols = "[%s]" % ", ".join("%s.%s" % (local_cls, e.parent.name) for e in fk.elements)
+            extra = ""
+            if referred == table.name:
+                remote = "[%s]" % ", ".join("%s.%s" % (local_cls, e.column.name) for e in fk.elements)
+                extra = ", remote_side=lambda: %s" % remote
+            rels[table.name].append(
+                "%s = relationship(%r, foreign_keys=lambda: %s, back_populates=%r%s)"
+                % (attr, classes[referred], fk_cols, back, extra)
+            )
+            ondelete = (fk.ondelete or "").lower()
+            if False in {e.parent.nullable for e in fk.elements}:
+                o2m = ', cascade="all, delete-orphan"'
+                if ondelete == "cascade":
+                    o2m += ", passive_deletes=True"
+            else:
+                o2m = ", passive_deletes=True" if ondelete == "set null" else ""
+            rels[referred].append(
+                "%s = relationship(%r, foreign_keys=lambda: %s, back_populates=%r%s)"
+                % (back, local_cls, fk_cols, attr, o2m)
+            )
+            taken[table.name].add(attr)
+            taken[referred].add(back)
+    return rels
+
+
+def render_models(metadata: sa.MetaData, fingerprint: str | None = None) -> str:
+    """Devuelve el código fuente del módulo de modelos para ``metadata``."""
+    tables = sorted(metadata.tables.values(), key=lambda t: t.name)
+    classes = {}
+    used = set()
+    for table in tables:
+        if not table.primary_key or _is_many_to_many(table) is not None:
+            continue
+        name = class_name(table.name)
+        while name in used:
+            name += "_"
+        used.add(name)
+        classes[table.name] = name
+
+    rels = _plan_relationships(tables, classes)
+    example = classes.get("prescriptors") or next(iter(classes.values()), "Model")
+    out = [HEADER.format(example=example, fingerprint=fingerprint)]
+
+    # Tablas sin clase (asociación M2M o sin PK)
+    for table in tables:
+        if table.name in classes:
+            continue
+        out.append("")
+        out.append("t_%s = sa.Table(" % table.name)
+        out.append("    %r, Model.metadata," % table.name)
+        for col in table.c:
+            out.append("    %s," % _render_column(col))
+        for item in _table_args(table):
+            out.append("    %s," % item)
+        out.append(")")
+
+    for table in tables:
+        if table.name not in classes:
+            continue
+        out.append("")
+        out.append("")
+        out.append("class %s(Model):" % classes[table.name])
+        out.append("    __tablename__ = %r" % table.name)
+        args = _table_args(table)
+        if args:
+            out.append("    __table_args__ = (")
+            for item in args:
+                out.append("        %s," % item)
+            out.append("    )")
+        out.append("")
+        for col in table.c:
+            attr = col.name
+            if not attr.isidentifier() or keyword.iskeyword(attr):
+                attr = "col_" + re.sub(r"\W", "_", attr)
+            out.append("    %s = %s" % (attr, _render_column(col)))
+        if rels[table.name]:
+            out.append("")
+            for line in rels[table.name]:
+                out.append("    " + line)
+
+    out.append("")
+    out.append("")
+    out.append("# Nombre de tabla -> clase (mismo criterio que Base.classes de automap)")
+    out.append("MODELS = {")
+    for table_name, name in classes.items():
+        out.append("    %r: %s," % (table_name, name))
+    out.append("}")
+    out.append("")
+    return "\n".join(out)
@@ -3,15 +3,41 @@ from datetime import datetime
 from pathlib import Path
 from flask import current_app
 
+# Imágenes decodificadas una sola vez (cabecera, firma del presidente): ruta -> ImageReader
+_IMAGE_CACHE: dict = {}
+
+
+def header_image_path() -> Path:
+    return Path(current_app.root_path) / "static" / "img" / "head_contracts.png"
+
+
+def preload_image(path) -> bool:
+    """Decodifica la imagen y la guarda en memoria para reutilizarla entre PDFs."""
+    from reportlab.lib.utils import ImageReader
+
+    path = Path(path)
+    if not path.exists():
+        return False
+    reader = ImageReader(str(path))
+    reader.getRGBData()  # fuerza la decodificación ahora y no en la primera petición
+    _IMAGE_CACHE[str(path)] = reader
+    return True
+
+
+def image_source(path):
+    """ImageReader precargado si existe; si no, la ruta para que reportlab la abra."""
+    return _IMAGE_CACHE.get(str(path), str(path))
+
+
 def draw_header(c, width, height):
     """Dibuja el logo en el encabezado si existe."""
     try:
-        header_path = Path(current_app.root_path) / "static" / "img" / "head_contracts.png"
-        if header_path.exists():
+        header_path = header_image_path()
+        if str(header_path) in _IMAGE_CACHE or header_path.exists():
             img_w, img_h = 500, 80
             x = (width - img_w) / 2
             y = height - 100
-            c.drawImage(str(header_path), x, y, width=img_w, height=img_h, preserveAspectRatio=True, mask='auto')
+            c.drawImage(image_source(header_path), x, y, width=img_w, height=img_h, preserveAspectRatio=True, mask='auto')
     except Exception:
         pass
 
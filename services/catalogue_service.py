@@ -0,0 +1,127 @@
+"""Catálogos pequeños (estados, tipos, programas...) cacheados en el proceso.
+
+Casi todas las vistas necesitan estos catálogos para pintar nombres o rellenar
+desplegables y antes los releían con ``.all()`` en cada petición. Aquí se
+cargan una vez por proceso como copias inmutables (``SimpleNamespace`` con
+todas las columnas, sin sesión) con su mapa id -> nombre y las listas de
+opciones ya ordenadas.
+
+Los controladores CRUD de cada catálogo llaman a ``invalidate()`` dentro de su
+transacción: la versión ``catalogues`` de ``cache_versions`` cambia y cada
+worker descarta su copia en unos segundos. ``CATALOGUE_CACHE_TTL`` acota además
+lo que puede durar una copia si alguien modifica las tablas por fuera.
+"""
+from types import SimpleNamespace
+
+import sqlalchemy as sa
+from flask import current_app
+
+from sigp import db
+from sigp.common.cache_utils import VersionedCache, bump_version
+from sigp.models import Base
+
+CATALOGUE_CACHE = "catalogues"
+# Tablas cacheables (todas con columna id)
+CATALOGUES = (
+    "state_lead",
+    "state_ledger",
+    "state_prescriptor",
+    "substate_prescriptor",
+    "confidence_level",
+    "prescriptor_types",
+    "programs",
+    "editions",
+    "campus",
+)
+
+_catalogues = VersionedCache(CATALOGUE_CACHE)
+
+
+def _label(row):
+    name = getattr(row, "name", None)
+    if name is None:
+        name = getattr(row, "nombre", None)
+    return row.id if name is None else name
+
+
+class Catalogue:
+    """Copia inmutable de un catálogo: filas por id, nombres y opciones."""
+
+    def __init__(self, rows):
+        self.rows = tuple(sorted(rows, key=lambda r: r.id))
+        self.rows_by_name = tuple(sorted(self.rows, key=lambda r: str(_label(r)).casefold()))
+        self.names = {r.id: _label(r) for r in self.rows}
+        self._by_key = {str(r.id): r for r in self.rows}
+        self.choices_by_id = [(r.id, _label(r)) for r in self.rows]
+        self.choices_by_name = sorted(self.choices_by_id, key=lambda c: str(c[1]).casefold())
+
+    def get(self, row_id):
+        """Fila con ese id (acepta el id como texto, p.ej. de un formulario)."""
+        return None if row_id is None else self._by_key.get(str(row_id))
+
+
+_EMPTY = Catalogue(())
+
+
+def _load(table: str) -> Catalogue:
+    # Del primario, como la versión: desde la réplica (vistas ``@read_replica``)
+    # se podría cachear una copia anterior con la versión nueva
+    Model = getattr(Base.classes, table, None)
+    if Model is None:
+        return _EMPTY
+    with db.engine.connect() as conn:
+        result = conn.execute(sa.select(Model.__table__)).mappings().all()
+    return Catalogue(SimpleNamespace(**row) for row in result)
+
+
+def catalogue(table: str) -> Catalogue:
+    """Catálogo ``table`` desde la caché del proceso (vacío si la tabla no existe)."""
+    if table not in CATALOGUES:
+        raise KeyError(f"{table} no es un catálogo cacheable")
+    ttl = current_app.config.get("CATALOGUE_CACHE_TTL", 300)
+    return _catalogues.get(table, lambda: _load(table), ttl=ttl)
+
+
+def rows(table: str, order: str = "id"):
+    """Todas las filas, ordenadas por id o por nombre."""
+    cat = catalogue(table)
+    return cat.rows_by_name if order == "name" else cat.rows
+
+
+def get(table: str, row_id):
+    """Fila ``row_id`` o None."""
+    return catalogue(table).get(row_id)
+
+
+def label(table: str, row_id, default=None):
+    """Nombre de la fila ``row_id`` (``default`` si no existe)."""
+    row = catalogue(table).get(row_id)
+    return default if row is None else _label(row)
+
+
+def names(table: str) -> dict:
+    """Mapa id -> nombre (copia: se puede modificar)."""
+    return dict(catalogue(table).names)
+
+
+def choices(table: str, order: str = "name"):
+    """Lista ``[(id, nombre)]`` para desplegables, por nombre o por id."""
+    cat = catalogue(table)
+    return list(cat.choices_by_name if order == "name" else cat.choices_by_id)
+
+
+def find_id(table: str, text: str, columns=("code", "slug", "name")):
+    """Id de la fila cuyo código/slug/nombre coincide con ``text`` (sin distinguir mayúsculas)."""
+    wanted = (text or "").casefold()
+    cat = catalogue(table)
+    for column in columns:
+        for row in cat.rows:
+            value = getattr(row, column, None)
+            if value is not None and str(value).casefold() == wanted:
+                return row.id
+    return None
+
+
+def invalidate(session=None) -> None:
+    """Descarta los catálogos cacheados en todos los workers (commit a cargo del llamador)."""
+    bump_version(CATALOGUE_CACHE, session)
@@ -1,23 +1,44 @@
 import os
 import hashlib
+import importlib
 from datetime import datetime
 from pathlib import Path
 from flask import current_app
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 from typing import Optional
 
-# Importamos los constructores (Asegúrate de crear los archivos en el paso 3)
-from sigp.services.builders import hibrida_builder_es
-from sigp.services.builders import hibrida_builder_en
-from sigp.services.builders import juridica_builder_es
-from sigp.services.builders import juridica_builder_en
-from sigp.services.builders import tutor_builder_es
-from sigp.services.builders import tutor_builder_en
-from sigp.services.builders import alumno_builder_es
-from sigp.services.builders import alumno_builder_en
-from sigp.services.builders import externo_builder_es
-from sigp.services.builders import externo_builder_en
+from sigp.common.metrics_utils import CONTRACT_FAILURES, CONTRACT_SECONDS, timed
+
+# reportlab, pypdf, pikepdf, pyHanko y los constructores se importan dentro de
+# cada función: el arranque de la app no debe cargarlos (flask sigp import-budget).
+
+# Constructores por (categoría, inglés) -> módulo en sigp.services.builders
+_BUILDERS = {
+    ("Persona juridica - institucional", False): "juridica_builder_es",
+    ("Persona juridica - institucional", True): "juridica_builder_en",
+    ("Persona Tutor", False): "tutor_builder_es",
+    ("Persona Tutor", True): "tutor_builder_en",
+    ("Persona Alumno", False): "alumno_builder_es",
+    ("Persona Alumno", True): "alumno_builder_en",
+    ("Prescriptor Externo", False): "externo_builder_es",
+    ("Prescriptor Externo", True): "externo_builder_en",
+}
+_DEFAULT_BUILDERS = {False: "hibrida_builder_es", True: "hibrida_builder_en"}
+
+
+# Firmante PKCS#12 ya cargado: (ruta, mtime) -> SimpleSigner
+_SIGNER_CACHE: dict = {}
+
+
+def president_signature_path() -> Path:
+    """PNG de la firma manuscrita del presidente."""
+    return Path(current_app.root_path) / "static" / "contracts" / "signatures" / "firma_jesus_base.png"
+
+
+def _builder_for(categoria: str, idioma: str):
+    """Importa bajo demanda el constructor de la categoría/idioma (por defecto Persona Híbrida)."""
+    english = idioma == 'Inglés'
+    name = _BUILDERS.get((categoria, english)) or _DEFAULT_BUILDERS[english]
+    return importlib.import_module(f"sigp.services.builders.{name}")
 
 def _contracts_dir() -> Path:
     base = current_app.config.get("CONTRACT_UPLOAD_FOLDER")
@@ -34,8 +55,12 @@ def sha256_file(path: Path) -> str:
             h.update(chunk)
     return h.hexdigest()
 
+@timed(CONTRACT_SECONDS, CONTRACT_FAILURES, operation="generate")
 def generate_contract_pdf(prescriptor, filename: Optional[str] = None) -> Path:
     """Orquestador principal: Dirige el tráfico sin lógica comercial."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
     out_dir = _contracts_dir()
     if not filename:
         filename = f"contract_{getattr(prescriptor, 'id', 'unknown')}.pdf"
@@ -70,31 +95,7 @@ def generate_contract_pdf(prescriptor, filename: Optional[str] = None) -> Path:
     c.setCreator("SIGP")
 
     # 3. Despachador (Routing)
-    if categoria == 'Persona juridica - institucional':
-        if idioma == 'Inglés':
-            juridica_builder_en.build(c, prescriptor, datos_contrato)
-        else:
-            juridica_builder_es.build(c, prescriptor, datos_contrato)
-    elif categoria == 'Persona Tutor':
-        if idioma == 'Inglés':
-            tutor_builder_en.build(c, prescriptor, datos_contrato)
-        else:
-            tutor_builder_es.build(c, prescriptor, datos_contrato)
-    elif categoria == 'Persona Alumno':
-        if idioma == 'Inglés':
-            alumno_builder_en.build(c, prescriptor, datos_contrato)
-        else:
-            alumno_builder_es.build(c, prescriptor, datos_contrato)
-    elif categoria == 'Prescriptor Externo':
-        if idioma == 'Inglés':
-            externo_builder_en.build(c, prescriptor, datos_contrato)
-        else:
-            externo_builder_es.build(c, prescriptor, datos_contrato)
-    else:
-        if idioma == 'Inglés':
-            hibrida_builder_en.build(c, prescriptor, datos_contrato)
-        else:
-            hibrida_builder_es.build(c, prescriptor, datos_contrato)
+    _builder_for(categoria, idioma).build(c, prescriptor, datos_contrato)
 
     c.save()
 
@@ -470,6 +471,7 @@ def _build_externo_en(c, prescriptor, datos):
     c.drawString(320, y_sig_base + 65, "Firma del Presidente:")
     c.rect(320, y_sig_base, 220, 55)
 
+@timed(CONTRACT_SECONDS, CONTRACT_FAILURES, operation="stamp_image")
 def stamp_signature_image(input_pdf: Path, signature_png: Path, output_pdf: Path,
                            page: int = 1, x: int = 200, y: int = 120, w: int = 200, h: int = 40) -> None:
     """Superpone una imagen PNG de firma sobre el PDF en la página indicada.
@@ -478,6 +480,8 @@ def stamp_signature_image(input_pdf: Path, signature_png: Path, output_pdf: Path
     """
     from tempfile import NamedTemporaryFile
     from pypdf import PdfReader, PdfWriter
+    from reportlab.pdfgen import canvas
+    from sigp.services.builders.utils import image_source
 
     # Crear un PDF de overlay con la imagen en la posición deseada
     with NamedTemporaryFile(suffix="_overlay.pdf", delete=False) as tmp:
@@ -493,7 +497,7 @@ def stamp_signature_image(input_pdf: Path, signature_png: Path, output_pdf: Path
 
         c = canvas.Canvas(str(overlay_path), pagesize=(width, height))
         # Dibujar la imagen (ajustar a w x h)
-        c.drawImage(str(signature_png), x, y, width=w, height=h, mask='auto')
+        c.drawImage(image_source(signature_png), x, y, width=w, height=h, mask='auto')
         c.showPage()
         c.save()
 
@@ -573,6 +577,7 @@ def embed_pdf_metadata_xmp(pdf_path: Path, *, title: str, author: str, subject:
         pdf.save(str(pdf_path))
 
 
+@timed(CONTRACT_SECONDS, CONTRACT_FAILURES, operation="stamp_text")
 def stamp_text_overlay(input_pdf: Path, output_pdf: Path, text_lines: list[str],
                        page: int = 1, x: int = 200, y: int = 60, w: int = 200, h: int = 40) -> None:
     """Dibuja texto dentro del recuadro indicado y lo fusiona sobre el PDF.
@@ -580,6 +585,7 @@ def stamp_text_overlay(input_pdf: Path, output_pdf: Path, text_lines: list[str],
     """
     from tempfile import NamedTemporaryFile
     from pypdf import PdfReader, PdfWriter
+    from reportlab.pdfgen import canvas
 
     # Crear overlay con el texto, ajustado al ancho del recuadro
     with NamedTemporaryFile(suffix="_overlay.pdf", delete=False) as tmp:
@@ -636,11 +642,9 @@ def stamp_text_overlay(input_pdf: Path, output_pdf: Path, text_lines: list[str],
         except Exception:
             pass
 
-def sign_pades(input_pdf: Path, output_pdf: Path) -> None:
-    """Firma el PDF con PAdES-BES usando el certificado P12 configurado."""
+def load_president_signer():
+    """Carga el certificado P12 del presidente; se reutiliza mientras el fichero no cambie."""
     from pyhanko.sign import signers
-    from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
-    from pyhanko.sign.general import SigningError
     import traceback
 
     p12_path = current_app.config.get("PRESIDENT_CERT_PATH")
@@ -657,6 +661,11 @@ def sign_pades(input_pdf: Path, output_pdf: Path) -> None:
     
     if not p12_abs.exists():
         raise RuntimeError(f"Certificado P12 no encontrado en: {p12_abs}")
+
+    cache_key = (str(p12_abs), p12_abs.stat().st_mtime)
+    signer = _SIGNER_CACHE.get(cache_key)
+    if signer is not None:
+        return signer
     
     current_app.logger.info(f"Cargando certificado desde: {p12_abs}")
     
@@ -710,6 +719,20 @@ def sign_pades(input_pdf: Path, output_pdf: Path) -> None:
         current_app.logger.error(f"Traceback: {traceback.format_exc()}")
         raise RuntimeError(f"Fallo cargando certificado desde {p12_abs}: {exc}")
 
+    _SIGNER_CACHE.clear()
+    _SIGNER_CACHE[cache_key] = signer
+    return signer
+
+
+@timed(CONTRACT_SECONDS, CONTRACT_FAILURES, operation="sign")
+def sign_pades(input_pdf: Path, output_pdf: Path) -> None:
+    """Firma el PDF con PAdES-BES usando el certificado P12 configurado."""
+    from pyhanko.sign import signers
+    from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+    import traceback
+
+    signer = load_president_signer()
+
     # Intentar firma con manejo robusto de errores
     try:
         current_app.logger.info("Abriendo PDF para firma")
@@ -0,0 +1,358 @@
+"""Datos del dashboard de dirección (``/directive/dashboard``).
+
+``compute_payload`` calcula todas las secciones en paralelo
+(``common/section_utils.run_sections``) y devuelve un dict serializable en JSON.
+
+Con la tabla ``dashboard_snapshot`` (migración 20261016_dashboard_snapshot.sql)
+un cron guarda el resultado cada N minutos (``flask sigp snapshot-dashboard``)
+y la vista sirve el último snapshot sin consultar nada más; ``refresh_async``
+lo recalcula en un hilo aparte ("Actualizar ahora" o snapshot demasiado
+antiguo). Los snapshots anteriores se conservan: ``state_trend`` dibuja la
+evolución de prescriptores por estado leyendo sólo esta tabla.
+
+Un snapshot se calcula en un solo proceso a la vez (``GET_LOCK`` en MySQL), con
+DASHBOARD_SNAPSHOT_TIMEOUT por sección y leyendo de la réplica si está al día.
+Las secciones que no terminan conservan el valor del snapshot anterior y se
+marcan en ``stale``.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import partial
+
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from sigp import db
+from sigp.common.replica_utils import background_read_engine
+from sigp.common.rollup_utils import LEADS_MONTHLY, LEDGER_MONTHLY, NO_STATE, rollups_enabled
+from sigp.common.section_utils import run_sections
+from sigp.models import Base
+from sigp.services import catalogue_service
+
+# Reflected models (pueden no existir en alguna instalación)
+Prescriptor = getattr(Base.classes, "prescriptors", None)
+StatePrescriptor = getattr(Base.classes, "state_prescriptor", None)
+SubState = getattr(Base.classes, "substate_prescriptor", None)
+Lead = getattr(Base.classes, "leads", None)
+LeadState = getattr(Base.classes, "state_lead", None)
+Program = getattr(Base.classes, "programs", None)
+Ledger = getattr(Base.classes, "ledger", None)
+
+_metadata = sa.MetaData()
+
+DASHBOARD_SNAPSHOT = sa.Table(
+    "dashboard_snapshot",
+    _metadata,
+    sa.Column("id", sa.BigInteger, primary_key=True, autoincrement=True),
+    sa.Column("computed_at", sa.DateTime, nullable=False),
+    sa.Column("duration_ms", sa.Integer, nullable=False, default=0),
+    sa.Column("payload", sa.JSON, nullable=False),
+)
+
+# Valor de cada sección cuando no está disponible
+DEFAULTS = {
+    "pres_total": 0,
+    "pres_by_state": [],
+    "pres_by_substate": [],
+    "leads_total": 0,
+    "leads_matric": 0,
+    "leads_by_state": [],
+    "rentab_program": [],
+    "ranking": [],
+}
+
+SNAPSHOT_LOCK = "sigp_dashboard_snapshot"
+
+_state = {"snapshots": None}
+_refresh_lock = threading.Lock()
+_refresh = {"thread": None}
+
+
+def _state_id(slug: str):
+    """Id de un estado relevante por código/slug/nombre."""
+    table = "state_ledger" if getattr(Base.classes, "state_ledger", None) is not None else "state_lead"
+    return catalogue_service.find_id(table, slug)
+
+
+# ---------- Secciones (cada una con su propia sesión, ver common/section_utils) ----------
+
+def _pres_total(session):
+    return session.query(Prescriptor).count()
+
+
+def _pres_by_state(session):
+    rows = session.query(Prescriptor.state_id, db.func.count(Prescriptor.id)).group_by(Prescriptor.state_id).all()
+    state_map = catalogue_service.names("state_prescriptor")
+    return [(state_map.get(sid, sid), cnt) for sid, cnt in rows]
+
+
+def _pres_by_substate(session):
+    rows = (
+        session.query(Prescriptor.sub_state_id, db.func.count(Prescriptor.id))
+        .group_by(Prescriptor.sub_state_id)
+        .all()
+    )
+    sub_map = catalogue_service.names("substate_prescriptor")
+    return [(sub_map.get(sid, sid if sid is not None else "-"), cnt) for sid, cnt in rows]
+
+
+def _leads_by_state(session, use_rollups):
+    if use_rollups:
+        rows = [
+            (None if sid == NO_STATE else sid, int(cnt or 0))
+            for sid, cnt in session.query(LEADS_MONTHLY.c.state_id, db.func.sum(LEADS_MONTHLY.c.count))
+            .group_by(LEADS_MONTHLY.c.state_id)
+            .all()
+        ]
+    else:
+        rows = session.query(Lead.state_id, db.func.count(Lead.id)).group_by(Lead.state_id).all()
+    ls_map = catalogue_service.names("state_lead")
+    return [(ls_map.get(sid, sid), cnt) for sid, cnt in rows]
+
+
+def _lead_totals(session, use_rollups, matric_id):
+    """(leads generados, leads matriculados)."""
+    if use_rollups:
+        total_q = session.query(db.func.sum(LEADS_MONTHLY.c.count))
+        leads_total = int(total_q.scalar() or 0)
+        if not matric_id:
+            # si no se encontró id, contar todos los leads como matriculados
+            return leads_total, leads_total
+        return leads_total, int(total_q.filter(LEADS_MONTHLY.c.state_id == matric_id).scalar() or 0)
+    leads_total = session.query(Lead).count()
+    if not matric_id:
+        return leads_total, leads_total
+    return leads_total, session.query(Lead).filter(Lead.state_id == matric_id).count()
+
+
+def _rentab_program(session, rend_id):
+    # Rentabilidad por programa sumando montos de ledger de leads rendidos
+    q = (
+        session.query(Lead.program_id, db.func.sum(Ledger.amount).label("total"))
+        .join(Lead, Lead.id == Ledger.lead_id)
+    )
+    if rend_id:
+        q = q.filter(Ledger.state_id == rend_id)
+    sub = q.group_by(Lead.program_id).subquery()
+    rows = session.query(Program, sub.c.total).join(sub, Program.id == sub.c.program_id).all()
+    return [(getattr(p, "name", getattr(p, "nombre", p.id)), total or 0) for p, total in rows]
+
+
+def _ranking(session, use_rollups, rend_id):
+    src = LEDGER_MONTHLY.c if use_rollups else Ledger
+    q = session.query(src.prescriptor_id, db.func.sum(src.amount).label("total"))
+    if rend_id:
+        q = q.filter(src.state_id == rend_id)
+    sub = (
+        q.group_by(src.prescriptor_id)
+        .order_by(db.desc(db.func.sum(src.amount)))
+        .limit(10)
+    ).subquery()
+    rows = session.query(Prescriptor, sub.c.total).join(sub, Prescriptor.id == sub.c.prescriptor_id).all()
+    return [(getattr(p, "squeeze_page_name", getattr(p, "name", p.id)), total or 0) for p, total in rows]
+
+
+def _sections():
+    """Secciones disponibles en este esquema: nombre -> fn(session)."""
+    use_rollups = rollups_enabled()
+    matric_id = (_state_id("MATRICULADO") or _state_id("MATRICULADO/A")) if Lead else None
+    rend_id = _state_id("RENDIDO")
+
+    sections = {}
+    if Prescriptor:
+        sections["pres_total"] = _pres_total
+        if StatePrescriptor:
+            sections["pres_by_state"] = _pres_by_state
+        if SubState and hasattr(Prescriptor, "sub_state_id"):
+            sections["pres_by_substate"] = _pres_by_substate
+    if Lead:
+        sections["lead_totals"] = partial(_lead_totals, use_rollups=use_rollups, matric_id=matric_id)
+        if LeadState and hasattr(Lead, "state_id"):
+            sections["leads_by_state"] = partial(_leads_by_state, use_rollups=use_rollups)
+    if Program and Ledger and Lead:
+        sections["rentab_program"] = partial(_rentab_program, rend_id=rend_id)
+    if Prescriptor and Ledger:
+        sections["ranking"] = partial(_ranking, use_rollups=use_rollups, rend_id=rend_id)
+    return sections
+
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def compute_payload(timeout=None, engine=None) -> dict:
+    """Todas las secciones del dashboard; ``unavailable`` lista las que no terminaron."""
+    results, unavailable = run_sections(_sections(), engine=engine, timeout=timeout)
+    if "lead_totals" in results:
+        results["leads_total"], results["leads_matric"] = results.pop("lead_totals")
+    elif "lead_totals" in unavailable:
+        unavailable.discard("lead_totals")
+        unavailable.update(("leads_total", "leads_matric"))
+    payload = {name: _jsonable(results.get(name, default)) for name, default in DEFAULTS.items()}
+    payload["unavailable"] = sorted(unavailable)
+    return payload
+
+
+# ---------- Snapshots ----------
+
+def snapshots_enabled() -> bool:
+    """True si existe la tabla dashboard_snapshot (se comprueba una vez por proceso)."""
+    if _state["snapshots"] is None:
+        try:
+            _state["snapshots"] = sa.inspect(db.engine).has_table(DASHBOARD_SNAPSHOT.name)
+        except SQLAlchemyError:
+            return False
+    return _state["snapshots"]
+
+
+def save_snapshot(payload: dict, duration_ms=0, computed_at=None) -> dict:
+    """Guarda un snapshot en el primario (transacción propia) y lo devuelve."""
+    snapshot = {
+        "computed_at": computed_at or datetime.now().replace(microsecond=0),
+        "duration_ms": int(duration_ms),
+        "payload": payload,
+    }
+    with db.engine.begin() as conn:
+        conn.execute(DASHBOARD_SNAPSHOT.insert().values(**snapshot))
+    return snapshot
+
+
+@contextmanager
+def _snapshot_lock(wait=0):
+    """True si este proceso puede calcular el snapshot (``GET_LOCK`` en MySQL).
+
+    Se espera como mucho ``wait`` segundos a que lo suelte otro proceso.
+    """
+    with db.engine.connect() as conn:
+        if conn.dialect.name != "mysql":
+            yield True
+            return
+        got = conn.execute(sa.text("SELECT GET_LOCK(:name, :wait)"), {"name": SNAPSHOT_LOCK, "wait": wait}).scalar()
+        try:
+            yield got == 1
+        finally:
+            if got == 1:
+                conn.execute(sa.text("SELECT RELEASE_LOCK(:name)"), {"name": SNAPSHOT_LOCK})
+
+
+def _carry_over(payload, previous) -> None:
+    """Secciones no disponibles: valor del snapshot anterior (marcadas en ``stale``)."""
+    if previous is None:
+        return
+    before = previous["payload"]
+    missing = set(before.get("unavailable") or [])
+    stale = []
+    for name in payload["unavailable"]:
+        if name in before and name not in missing:
+            payload[name] = before[name]
+            stale.append(name)
+    payload["unavailable"] = [n for n in payload["unavailable"] if n not in stale]
+    payload["stale"] = sorted(stale)
+
+
+def compute_snapshot(timeout=None, max_age=None, wait=0):
+    """Calcula el dashboard completo y lo guarda como snapshot.
+
+    Devuelve el snapshot guardado, el existente si tiene menos de ``max_age``
+    segundos o ``None`` si otro proceso lo está calculando (tras esperar ``wait``).
+    """
+    if timeout is None:
+        timeout = current_app.config.get("DASHBOARD_SNAPSHOT_TIMEOUT", 120)
+    with _snapshot_lock(wait) as acquired:
+        if not acquired:
+            return None
+        with db.engine.connect() as conn:
+            previous = latest_snapshot(conn)
+        if previous is not None and max_age is not None:
+            if (datetime.now() - previous["computed_at"]).total_seconds() < max_age:
+                return previous
+        t0 = time.perf_counter()
+        payload = compute_payload(timeout=timeout, engine=background_read_engine())
+        _carry_over(payload, previous)
+        return save_snapshot(payload, (time.perf_counter() - t0) * 1000)
+
+
+def latest_snapshot(session=None):
+    """Último snapshot (dict con computed_at, duration_ms y payload) o None."""
+    session = session or db.session
+    row = session.execute(
+        sa.select(DASHBOARD_SNAPSHOT.c.computed_at, DASHBOARD_SNAPSHOT.c.duration_ms, DASHBOARD_SNAPSHOT.c.payload)
+        .order_by(DASHBOARD_SNAPSHOT.c.id.desc())
+        .limit(1)
+    ).first()
+    return dict(row._mapping) if row else None
+
+
+def _refresh_worker(app, timeout, max_age):
+    with app.app_context():
+        try:
+            compute_snapshot(timeout=timeout, max_age=max_age)
+        except Exception:  # pylint: disable=broad-except
+            app.logger.exception("Error recalculando el snapshot del dashboard de dirección")
+
+
+def refresh_running() -> bool:
+    thread = _refresh["thread"]
+    return thread is not None and thread.is_alive()
+
+
+def refresh_async(timeout=None, max_age=None) -> bool:
+    """Recalcula el snapshot en un hilo aparte; False si ya hay uno en curso en este proceso.
+
+    Con ``max_age`` no se recalcula si otro proceso acaba de guardar uno más reciente.
+    """
+    app = current_app._get_current_object()
+    with _refresh_lock:
+        if refresh_running():
+            return False
+        thread = threading.Thread(
+            target=_refresh_worker, args=(app, timeout, max_age), name="sigp-dashboard-snapshot", daemon=True
+        )
+        _refresh["thread"] = thread
+        thread.start()
+    return True
+
+
+def state_trend(session=None, days=None) -> dict:
+    """Prescriptores por estado a lo largo del tiempo (último snapshot de cada día).
+
+    Devuelve ``{"labels": [fechas], "series": [{"label": estado, "data": [...]}]}``;
+    los días en que la sección no estuvo disponible (o arrastraba el valor
+    anterior) quedan como ``None``.
+    """
+    session = session or db.session
+    if days is None:
+        days = current_app.config.get("DASHBOARD_TREND_DAYS", 90)
+    t = DASHBOARD_SNAPSHOT.c
+    last_of_day = (
+        sa.select(sa.func.max(t.id))
+        .where(t.computed_at >= datetime.now() - timedelta(days=days))
+        .group_by(sa.func.date(t.computed_at))
+    )
+    rows = session.execute(
+        sa.select(t.computed_at, t.payload).where(t.id.in_(last_of_day)).order_by(t.computed_at)
+    ).all()
+
+    labels, points, states = [], [], {}
+    for computed_at, payload in rows:
+        labels.append(computed_at.strftime("%Y-%m-%d"))
+        if "pres_by_state" in (payload.get("unavailable") or []) + (payload.get("stale") or []):
+            points.append(None)
+            continue
+        counts = {str(name): cnt for name, cnt in payload.get("pres_by_state") or []}
+        for name in counts:
+            states.setdefault(name, None)
+        points.append(counts)
+    series = [
+        {"label": name, "data": [None if p is None else p.get(name, 0) for p in points]}
+        for name in states
+    ]
+    return {"labels": labels, "series": series}
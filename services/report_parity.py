@@ -0,0 +1,263 @@
+"""Comprobación de paridad del reporte de prescriptores (``flask sigp check-report-parity``).
+
+``reference_report`` reproduce el cálculo original, que recorría en Python todos
+los leads y movimientos del rango y los agrupaba por mes y estado;
+``current_report`` usa las consultas ``GROUP BY`` de ``report_service``, con las
+tablas de agregados (``leads_monthly`` / ``ledger_monthly``) si existen y sin
+ellas. Cualquier diferencia en series mensuales, conteos por estado o KPIs se
+devuelve como ``(caso, modo, campo, referencia, actual)``.
+
+``seed`` añade leads y movimientos sintéticos (fechas y signos NULL, estados
+variados, varios prescriptores) con el ORM, así que los agregados se mantienen
+como en producción; el comando lo hace dentro de una transacción que deshace al
+terminar.
+"""
+import math
+import random
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+
+from sigp.common import rollup_utils
+from sigp.models import Base
+from sigp.services import report_service
+
+Lead = getattr(Base.classes, "leads", None)
+Ledger = getattr(Base.classes, "ledger", None)
+Prescriptor = getattr(Base.classes, "prescriptors", None)
+
+FIELDS = (
+    "month_labels", "lead_series", "mat_series", "paid_series", "pending_series",
+    "lead_states", "ledger_states",
+    "lead_count", "conversion_count", "commission_sum", "paid_sum", "pending_sum",
+)
+
+
+def reference_report(session, prescriptor_id, date_from, date_to, today) -> dict:
+    """Reporte calculado como antes de ``report_service``: fila a fila en Python."""
+    if date_from and date_to:
+        start_month = date_from.replace(day=1)
+        end_month = date_to.replace(day=1)
+    else:
+        end_month = today.replace(day=1)
+        start_month = (end_month.replace(day=15) - timedelta(days=365)).replace(day=1)
+    months = OrderedDict()
+    cur = start_month
+    while cur <= end_month:
+        months[cur.strftime("%Y-%m")] = {"leads": 0, "mats": 0, "paid": 0.0, "pending": 0.0}
+        cur = cur.replace(year=cur.year + cur.month // 12, month=cur.month % 12 + 1)
+
+    lead_states, ledger_states = {}, {}
+    lq = session.query(Lead.created_at, Lead.state_id)
+    if prescriptor_id:
+        lq = lq.filter(Lead.prescriptor_id == prescriptor_id)
+    if date_from:
+        lq = lq.filter(Lead.created_at >= start_month)
+    if date_to:
+        lq = lq.filter(Lead.created_at <= date_to)
+    for created, st in lq:
+        label = created.strftime("%Y-%m") if created else None
+        if label not in months:
+            continue
+        months[label]["leads"] += 1
+        if st == report_service.MATRICULADO_ID:
+            months[label]["mats"] += 1
+        lead_states[str(st)] = lead_states.get(str(st), 0) + 1
+
+    gq = session.query(Ledger.created_at, Ledger.amount, Ledger.sign, Ledger.state_id)
+    if prescriptor_id:
+        gq = gq.filter(Ledger.prescriptor_id.in_([prescriptor_id, str(prescriptor_id)]))
+    if date_from:
+        gq = gq.filter(Ledger.created_at >= start_month)
+    if date_to:
+        gq = gq.filter(Ledger.created_at <= date_to)
+    for created, amount, sign, st in gq:
+        label = created.strftime("%Y-%m") if created else None
+        if label not in months:
+            continue
+        value = float(amount) * (1 if sign is None else sign)
+        months[label]["paid" if st == report_service.PAGADO_ID else "pending"] += value
+        ledger_states[str(st)] = ledger_states.get(str(st), 0) + 1
+
+    q = session.query(Lead)
+    if prescriptor_id:
+        q = q.filter(Lead.prescriptor_id == prescriptor_id)
+    if date_from:
+        q = q.filter(Lead.created_at >= date_from)
+    if date_to:
+        q = q.filter(Lead.created_at <= date_to)
+    lead_count = q.count()
+    conversion_count = q.filter(Lead.state_id == report_service.MATRICULADO_ID).count()
+
+    kq = session.query(Ledger.amount, Ledger.sign, Ledger.state_id)
+    if prescriptor_id:
+        kq = kq.filter(Ledger.prescriptor_id.in_([prescriptor_id, str(prescriptor_id)]))
+    if date_from:
+        kq = kq.filter(Ledger.created_at >= date_from)
+    if date_to:
+        kq = kq.filter(Ledger.created_at <= date_to)
+    paid = pending = 0.0
+    for amount, sign, st in kq:
+        value = float(amount) * (1 if sign is None else sign)
+        if st == report_service.PAGADO_ID:
+            paid += value
+        else:
+            pending += value
+
+    return {
+        "month_labels": list(months),
+        "lead_series": [m["leads"] for m in months.values()],
+        "mat_series": [m["mats"] for m in months.values()],
+        "paid_series": [round(m["paid"], 2) for m in months.values()],
+        "pending_series": [round(m["pending"], 2) for m in months.values()],
+        "lead_states": lead_states,
+        "ledger_states": ledger_states,
+        "lead_count": lead_count,
+        "conversion_count": conversion_count,
+        "commission_sum": round(paid + pending, 2),
+        "paid_sum": round(paid, 2),
+        "pending_sum": round(pending, 2),
+    }
+
+
+def current_report(session, prescriptor_id, date_from, date_to, today) -> dict:
+    """El mismo reporte con las consultas de ``report_service``."""
+    window = report_service.month_window(date_from, date_to, today)
+    lead_series, mat_series, lead_states = report_service.lead_monthly(
+        session, prescriptor_id, date_from, date_to, window
+    )
+    paid_series, pending_series, ledger_states = report_service.ledger_monthly(
+        session, prescriptor_id, date_from, date_to, window
+    )
+    lead_count, conversion_count = report_service.lead_kpis(session, prescriptor_id, date_from, date_to)
+    commission, paid, pending = report_service.ledger_kpis(session, prescriptor_id, date_from, date_to)
+    return {
+        "month_labels": window[2],
+        "lead_series": lead_series,
+        "mat_series": mat_series,
+        "paid_series": paid_series,
+        "pending_series": pending_series,
+        "lead_states": dict(lead_states),
+        "ledger_states": dict(ledger_states),
+        "lead_count": lead_count,
+        "conversion_count": conversion_count,
+        "commission_sum": round(commission, 2),
+        "paid_sum": round(paid, 2),
+        "pending_sum": round(pending, 2),
+    }
+
+
+def _same(a, b) -> bool:
+    # Los importes se suman en otro orden: se admite un céntimo de redondeo
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, abs_tol=0.011)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _month(today, back):
+    """Día 1 del mes ``back`` meses antes del de ``today`` (negativo: después)."""
+    index = today.year * 12 + today.month - 1 - back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def default_cases(session, today, prescriptors=2) -> list:
+    """Todos los prescriptores y los ``prescriptors`` con más leads × rangos de fechas variados."""
+    ids = [
+        pid for pid, _ in session.query(Lead.prescriptor_id, sa.func.count())
+        .filter(Lead.prescriptor_id.isnot(None))
+        .group_by(Lead.prescriptor_id)
+        .order_by(sa.func.count().desc())
+        .limit(prescriptors)
+    ]
+    one_day = timedelta(days=1)
+    ranges = [
+        (None, None),
+        (_month(today, 11) + timedelta(days=4), None),
+        (None, _month(today, 5) - one_day),
+        (_month(today, 14) + timedelta(days=13), _month(today, 7) + one_day),
+        (_month(today, 9), _month(today, 8) - one_day),
+        (_month(today, 16), None),
+        (_month(today, 16), _month(today, 3)),
+        (_month(today, 16) - one_day, _month(today, 15)),
+        (None, _month(today, -1)),
+        (_month(today, 7), _month(today, 7)),
+    ]
+    return [(pid, date_from, date_to) for pid in ["", *ids] for date_from, date_to in ranges]
+
+
+@contextmanager
+def _rollups(enabled):
+    previous = rollup_utils._state["enabled"]
+    rollup_utils._state["enabled"] = enabled
+    try:
+        yield
+    finally:
+        rollup_utils._state["enabled"] = previous
+
+
+def check_parity(session, cases=None, today=None) -> tuple:
+    """Compara referencia y consultas actuales; devuelve ``(nº de comparaciones, diferencias)``."""
+    today = today or date.today()
+    cases = cases if cases is not None else default_cases(session, today)
+    modes = [("sin agregados", False)]
+    if rollup_utils.rollups_enabled():
+        modes.append(("con agregados", True))
+    diffs, checked = [], 0
+    for case in cases:
+        expected = reference_report(session, *case, today)
+        for mode, enabled in modes:
+            with _rollups(enabled):
+                actual = current_report(session, *case, today)
+            checked += 1
+            diffs.extend(
+                (case, mode, field, expected[field], actual[field])
+                for field in FIELDS
+                if not _same(expected[field], actual[field])
+            )
+    return checked, diffs
+
+
+def _new_id(model):
+    column = model.__table__.c.id
+    return str(uuid.uuid4()) if isinstance(column.type, sa.String) else None
+
+
+def seed(session, rows, seed_value=42, today=None, days=500) -> None:
+    """Añade ``rows`` leads y ``rows`` movimientos sintéticos en ``session`` (sin commit)."""
+    from sigp.services import catalogue_service
+
+    rnd = random.Random(seed_value)
+    now = datetime.combine(today or date.today(), datetime.min.time())
+    prescriptors = [p for (p,) in session.query(Prescriptor.id).limit(3)] if Prescriptor is not None else []
+    prescriptors.append(None)
+    lead_states = [r.id for r in catalogue_service.rows("state_lead")] + [None]
+    ledger_states = [r.id for r in catalogue_service.rows("state_ledger")] + [None]
+
+    def created_at():
+        if rnd.random() < 0.02:
+            return None
+        return now - timedelta(minutes=rnd.randint(0, days * 24 * 60))
+
+    objects = []
+    for _ in range(rows):
+        objects.append(Lead(
+            id=_new_id(Lead),
+            prescriptor_id=rnd.choice(prescriptors),
+            state_id=rnd.choice(lead_states),
+            created_at=created_at(),
+        ))
+        objects.append(Ledger(
+            id=_new_id(Ledger),
+            prescriptor_id=rnd.choice(prescriptors),
+            amount=round(rnd.uniform(1, 900), 2),
+            sign=rnd.choice([1, -1, None]),
+            state_id=rnd.choice(ledger_states),
+            created_at=created_at(),
+        ))
+    session.add_all(objects)
+    session.flush()
@@ -0,0 +1,372 @@
+"""Agregados del reporte de prescriptores (``/dashboard/report``).
+
+Todo se calcula con ``GROUP BY`` año-mes/estado en la base de datos: el coste
+depende de meses × estados y no del número de leads o movimientos. Con las
+tablas ``leads_monthly`` / ``ledger_monthly`` (``common/rollup_utils.py``) los
+meses completos se leen de ellas y sólo los meses parciales de los extremos del
+rango van a ``leads`` / ``ledger``.
+
+Filtros (idénticos a la versión que agrupaba en Python):
+
+* series mensuales: ventana ``start_month``..``end_month`` (por defecto los
+  últimos 12 meses) más ``created_at >= start_month`` si hay ``date_from`` y
+  ``created_at <= date_to`` si hay ``date_to``;
+* KPIs: ``date_from`` / ``date_to`` tal cual;
+* importe de un movimiento: ``amount * COALESCE(sign, 1)``; estado 4 = pagado,
+  cualquier otro (o NULL) = pendiente.
+
+El reporte se sirve por secciones independientes (``SECTIONS``: KPIs, series
+mensuales y estados de leads / ledger). ``cached_section`` guarda cada una en el
+proceso (REPORT_CACHE_SIZE, REPORT_CACHE_TTL) con la generación de datos del
+prescriptor en la clave: cualquier escritura en leads/ledger la incrementa
+(``rollup_utils``), así que no hace falta vaciar nada a mano.
+"""
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+from flask import current_app
+
+from sigp.common import rollup_utils
+from sigp.common.cache_utils import VersionedCache
+from sigp.config import Config
+from sigp.models import Base
+from sigp.services import catalogue_service
+
+Lead = getattr(Base.classes, "leads", None)
+Ledger = getattr(Base.classes, "ledger", None)
+Commission = getattr(Base.classes, "commissions", None)
+
+REPORT_CACHE = "prescriptor_report"
+_reports = VersionedCache(REPORT_CACHE, maxsize=Config.REPORT_CACHE_SIZE)
+
+MATRICULADO_ID = 3
+PAGADO_ID = 4
+
+
+def month_window(date_from=None, date_to=None, today=None):
+    """(primer mes, último mes, etiquetas ``YYYY-MM``) del reporte."""
+    today = today or date.today()
+    if date_from and date_to:
+        start_month = date_from.replace(day=1)
+        end_month = date_to.replace(day=1)
+    else:
+        end_month = today.replace(day=1)
+        start_month = (end_month.replace(day=15) - timedelta(days=365)).replace(day=1)
+    labels = []
+    cur = start_month
+    while cur <= end_month:
+        labels.append(cur.strftime("%Y-%m"))
+        cur = _next_month(cur)
+    return start_month, end_month, labels
+
+
+def _next_month(d):
+    return d.replace(year=d.year + d.month // 12, month=d.month % 12 + 1)
+
+
+def _lead_prescriptor_filter(query, prescriptor_id):
+    if prescriptor_id and hasattr(Lead, "prescriptor_id"):
+        return query.filter(Lead.prescriptor_id == prescriptor_id)
+    if prescriptor_id and hasattr(Lead, "presc_id"):
+        return query.filter(Lead.presc_id == prescriptor_id)
+    return query
+
+
+def _ledger_prescriptor_filter(query, prescriptor_id):
+    if prescriptor_id and hasattr(Ledger, "prescriptor_id"):
+        return query.filter(Ledger.prescriptor_id.in_([prescriptor_id, str(prescriptor_id)]))
+    return query
+
+
+def _split_range(lo=None, end=None, hi=None):
+    """Divide el rango en meses completos (agregados) y fragmentos de mes (consulta directa).
+
+    ``lo``: ``created_at >= lo``; ``end`` (día 1): ``created_at < end``;
+    ``hi``: ``created_at <= hi`` (medianoche, así que el mes de ``hi`` nunca está completo).
+    Devuelve ``((primer_mes, fin_exclusivo) | None, [(lo, end, hi), ...])``.
+    """
+    if hi is not None and end is not None:
+        if hi >= end:
+            hi = None
+        else:
+            end = None
+    if lo is not None and end is not None and lo >= end:
+        return None, []
+    fragments = []
+    full_end = end
+    if hi is not None:
+        hi_month = hi.replace(day=1)
+        if lo is not None and lo >= hi_month:
+            return None, [(lo, None, hi)]
+        fragments.append((hi_month, None, hi))
+        full_end = hi_month
+    full_start = lo
+    if lo is not None and lo.day != 1:
+        full_start = _next_month(lo.replace(day=1))
+        fragments.append((lo, full_start, None))
+    if full_start is not None and full_end is not None and full_start >= full_end:
+        return None, fragments
+    return (full_start, full_end), fragments
+
+
+def _live_groups(session, model, measures, prescriptor_filter, prescriptor_id, lo, end, hi):
+    year = sa.extract("year", model.created_at)
+    month = sa.extract("month", model.created_at)
+    q = prescriptor_filter(session.query(year, month, model.state_id, *measures), prescriptor_id)
+    if lo is not None:
+        q = q.filter(model.created_at >= lo)
+    if end is not None:
+        q = q.filter(model.created_at < end)
+    if hi is not None:
+        q = q.filter(model.created_at <= hi)
+    for y, m, st, *values in q.group_by(year, month, model.state_id):
+        ym = rollup_utils.NO_MONTH if y is None else f"{int(y):04d}-{int(m):02d}"
+        yield ym, st, values
+
+
+def _rollup_groups(session, table, measures, prescriptor_id, months):
+    q = session.query(table.c.ym, table.c.state_id, *[sa.func.sum(table.c[m]) for m in measures])
+    if prescriptor_id:
+        q = q.filter(table.c.prescriptor_id == str(prescriptor_id))
+    first, end = months
+    if first is not None or end is not None:
+        q = q.filter(table.c.ym != rollup_utils.NO_MONTH)
+    if first is not None:
+        q = q.filter(table.c.ym >= rollup_utils.month_key(first))
+    if end is not None:
+        q = q.filter(table.c.ym < rollup_utils.month_key(end))
+    for ym, st, *values in q.group_by(table.c.ym, table.c.state_id):
+        yield ym, (None if st == rollup_utils.NO_STATE else st), values
+
+
+def _groups(session, source, prescriptor_id, lo=None, end=None, hi=None):
+    """{(ym, state_id): [nº, importe con signo]} de ``leads`` / ``ledger`` en el rango.
+
+    Con las tablas de agregados los meses completos salen de ``leads_monthly`` /
+    ``ledger_monthly`` y sólo los meses parciales de los extremos se consultan en
+    la tabla original.
+    """
+    if source == "leads":
+        model, table, prescriptor_filter = Lead, rollup_utils.LEADS_MONTHLY, _lead_prescriptor_filter
+        live_measures, rollup_measures = [sa.func.count()], ["count"]
+    else:
+        model, table, prescriptor_filter = Ledger, rollup_utils.LEDGER_MONTHLY, _ledger_prescriptor_filter
+        live_measures = [sa.func.count(), sa.func.sum(Ledger.amount * sa.func.coalesce(Ledger.sign, 1))]
+        rollup_measures = ["count", "amount_signed"]
+
+    if rollup_utils.rollups_enabled():
+        months, fragments = _split_range(lo, end, hi)
+    else:
+        months, fragments = None, [(lo, end, hi)]
+
+    rows = []
+    if months is not None:
+        rows.extend(_rollup_groups(session, table, rollup_measures, prescriptor_id, months))
+    for fragment in fragments:
+        rows.extend(_live_groups(session, model, live_measures, prescriptor_filter, prescriptor_id, *fragment))
+
+    out = {}
+    for ym, st, values in rows:
+        acc = out.setdefault((ym, st), [0, 0.0])
+        acc[0] += int(values[0] or 0)
+        if len(values) > 1:
+            acc[1] += float(values[1] or 0)
+    return out
+
+
+def _window_bounds(date_to, window):
+    start_month, end_month, _ = window
+    # filtros originales: created_at >= start_month (con date_from) y <= date_to, dentro de los meses del gráfico
+    return {"lo": start_month, "end": _next_month(end_month), "hi": date_to}
+
+
+def _state_counts(counter):
+    """[(estado, nº)] ordenado por id de estado (NULL al final)."""
+    keys = sorted(counter, key=lambda s: (s is None, s or 0))
+    return [(str(k), counter[k]) for k in keys]
+
+
+def lead_monthly(session, prescriptor_id, date_from, date_to, window):
+    """Leads y matrículas por mes y nº de leads por estado dentro de la ventana."""
+    labels = window[2]
+    leads = dict.fromkeys(labels, 0)
+    mats = dict.fromkeys(labels, 0)
+    states = {}
+    if Lead is None or not hasattr(Lead, "created_at"):
+        return list(leads.values()), list(mats.values()), []
+    groups = _groups(session, "leads", prescriptor_id, **_window_bounds(date_to, window))
+    for (label, st), (n, _) in groups.items():
+        if label not in leads:
+            continue
+        leads[label] += n
+        if st == MATRICULADO_ID:
+            mats[label] += n
+        states[st] = states.get(st, 0) + n
+    return list(leads.values()), list(mats.values()), _state_counts(states)
+
+
+def ledger_monthly(session, prescriptor_id, date_from, date_to, window):
+    """Importes pagados/pendientes por mes y nº de movimientos por estado dentro de la ventana."""
+    labels = window[2]
+    paid = dict.fromkeys(labels, 0.0)
+    pending = dict.fromkeys(labels, 0.0)
+    states = {}
+    if Ledger is None or not hasattr(Ledger, "created_at"):
+        return list(paid.values()), list(pending.values()), []
+    groups = _groups(session, "ledger", prescriptor_id, **_window_bounds(date_to, window))
+    for (label, st), (n, total) in groups.items():
+        if label not in paid:
+            continue
+        target = paid if st == PAGADO_ID else pending
+        target[label] += total
+        states[st] = states.get(st, 0) + n
+    return (
+        [round(v, 2) for v in paid.values()],
+        [round(v, 2) for v in pending.values()],
+        _state_counts(states),
+    )
+
+
+def lead_kpis(session, prescriptor_id, date_from, date_to):
+    """(nº de leads, nº de matriculados) en el rango."""
+    if Lead is None:
+        return 0, 0
+    total = mats = 0
+    for (_, st), (n, _) in _groups(session, "leads", prescriptor_id, lo=date_from, hi=date_to).items():
+        total += n
+        if st == MATRICULADO_ID:
+            mats += n
+    return total, mats
+
+
+def ledger_kpis(session, prescriptor_id, date_from, date_to):
+    """(total comisiones, pagado, pendiente) en el rango."""
+    if Ledger is None:
+        return 0.0, 0.0, 0.0
+    if not hasattr(Ledger, "created_at"):
+        date_from = date_to = None
+    paid = pending = 0.0
+    for (_, st), (_, value) in _groups(session, "ledger", prescriptor_id, lo=date_from, hi=date_to).items():
+        if st == PAGADO_ID:
+            paid += value
+        else:
+            pending += value
+    return paid + pending, paid, pending
+
+
+def _commission_kpis(session, prescriptor_id, date_from, date_to):
+    """Tabla ``commissions`` (legacy) cuando no existe ``ledger``."""
+    cq = session.query(Commission.amount)
+    if prescriptor_id:
+        cq = cq.filter(Commission.prescriptor_id == prescriptor_id)
+    if date_from:
+        cq = cq.filter(Commission.created_at >= date_from)
+    if date_to:
+        cq = cq.filter(Commission.created_at <= date_to)
+    commission_sum = cq.scalar() or 0.0
+    return commission_sum, commission_sum, 0.0  # desconocido reparto
+
+
+def state_names(session, *model_names) -> dict:
+    """{id (str): nombre} de la primera tabla de estados que exista."""
+    for model_name in model_names:
+        if model_name in catalogue_service.CATALOGUES:
+            names = {str(k): str(v) for k, v in catalogue_service.names(model_name).items()}
+            if names:
+                return names
+            continue
+        M = getattr(Base.classes, model_name, None)
+        if M is None:
+            continue
+        name_col = None
+        for c in ("name", "description", "nombre"):
+            if hasattr(M, c):
+                name_col = getattr(M, c)
+                break
+        if name_col is None:
+            continue
+        names = {str(r[0]): str(r[1]) for r in session.query(M.id, name_col).all()}
+        if names:
+            return names
+    return {}
+
+
+def _kpis_section(session, prescriptor_id, date_from, date_to, today):
+    lead_count, conversion_count = lead_kpis(session, prescriptor_id, date_from, date_to)
+    commission_sum = paid_sum = pending_sum = 0.0
+    if Ledger is not None:
+        commission_sum, paid_sum, pending_sum = ledger_kpis(session, prescriptor_id, date_from, date_to)
+    elif Commission is not None:
+        commission_sum, paid_sum, pending_sum = _commission_kpis(session, prescriptor_id, date_from, date_to)
+    return {
+        "lead_count": lead_count,
+        "conversion_count": conversion_count,
+        "commission_sum": round(float(commission_sum), 2),
+        "paid_sum": round(float(paid_sum), 2),
+        "pending_sum": round(float(pending_sum), 2),
+    }
+
+
+def _monthly_section(session, prescriptor_id, date_from, date_to, today):
+    window = month_window(date_from, date_to, today)
+    lead_series, mat_series, _ = lead_monthly(session, prescriptor_id, date_from, date_to, window)
+    paid_series, pending_series, _ = ledger_monthly(session, prescriptor_id, date_from, date_to, window)
+    return {
+        "month_labels": window[2],
+        "lead_series": lead_series,
+        "mat_series": mat_series,
+        "paid_series": paid_series,
+        "pending_series": pending_series,
+    }
+
+
+def _states_payload(states, names):
+    return {"labels": [names.get(s, s) for s, _ in states], "counts": [n for _, n in states]}
+
+
+def _lead_states_section(session, prescriptor_id, date_from, date_to, today):
+    window = month_window(date_from, date_to, today)
+    _, _, states = lead_monthly(session, prescriptor_id, date_from, date_to, window)
+    return _states_payload(states, state_names(session, "state_lead", "state_leads"))
+
+
+def _ledger_states_section(session, prescriptor_id, date_from, date_to, today):
+    window = month_window(date_from, date_to, today)
+    _, _, states = ledger_monthly(session, prescriptor_id, date_from, date_to, window)
+    return _states_payload(states, state_names(session, "state_ledger", "state_ledgers"))
+
+
+SECTIONS = {
+    "kpis": _kpis_section,
+    "monthly": _monthly_section,
+    "lead_states": _lead_states_section,
+    "ledger_states": _ledger_states_section,
+}
+
+
+def build_section(session, section, prescriptor_id, date_from, date_to, today=None) -> dict:
+    """Datos de una sección del reporte (``SECTIONS``); no modificar el resultado (puede estar cacheado)."""
+    return SECTIONS[section](session, prescriptor_id, date_from, date_to, today or date.today())
+
+
+def section_key(session, section, prescriptor_id, date_from, date_to, scope="all"):
+    """Clave de caché (y base del ETag): sección, alcance, filtros, ventana y generación de datos."""
+    generation = rollup_utils.read_generation(session, prescriptor_id or None)
+    return (
+        section,
+        scope,
+        str(prescriptor_id or ""),
+        date_from,
+        date_to,
+        month_window(date_from, date_to)[:2],  # la ventana por defecto avanza cada mes
+        generation,
+    )
+
+
+def cached_section(session, section, prescriptor_id, date_from, date_to, scope="all", key=None) -> dict:
+    """``build_section`` cacheado en el proceso por ``section_key``."""
+    ttl = current_app.config.get("REPORT_CACHE_TTL", 300)
+    if not ttl:
+        return build_section(session, section, prescriptor_id, date_from, date_to)
+    key = key or section_key(session, section, prescriptor_id, date_from, date_to, scope)
+    return _reports.get(key, lambda: build_section(session, section, prescriptor_id, date_from, date_to), ttl=ttl)
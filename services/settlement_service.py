@@ -5,12 +5,14 @@ from typing import List, Sequence, Optional, Any, Union
 from pathlib import Path
 
 from flask import current_app as app
-from sqlalchemy import update
 from sqlalchemy.exc import SQLAlchemyError
 
+import time
 import uuid
 from sigp import db
 from sigp.models import Base
+from sigp.common.metrics_utils import SMTP_FAILURES, SMTP_SECONDS
+from sigp.common.rollup_utils import bulk_update
 
 # Tablas reflejadas
 Invoice = getattr(Base.classes, "invoice", None)
@@ -77,6 +79,7 @@ def _send_mail(prescriptor_email: str, subject: str, body: str, attachment: Opti
         elif attachment.suffix.lower() == ".png":
             maintype, subtype = "image", "png"
         msg.add_attachment(attachment.read_bytes(), filename=attachment.name, maintype=maintype, subtype=subtype)
+    started = time.perf_counter()
     try:
         if use_ssl:
             with smtplib.SMTP_SSL(host, port) as smtp:
@@ -88,7 +91,10 @@ def _send_mail(prescriptor_email: str, subject: str, body: str, attachment: Opti
                 smtp.login(username, password)
                 smtp.send_message(msg)
     except Exception as e:
+        SMTP_FAILURES.labels(sender="settlement").inc()
         app.logger.warning("No se pudo enviar email a %s: %s", prescriptor_email, e)
+    finally:
+        SMTP_SECONDS.labels(sender="settlement").observe(time.perf_counter() - started)
 
 
 # ---------------------------------------------------------------------------
@@ -121,8 +127,8 @@ def settle_invoices(invoice_ids: Sequence[int], paid_amounts: Sequence[Union[str
             invoice.paid_amount = amt or invoice.total
 
             # actualizar ledger(s) relacionados
-            db.session.execute(
-                update(Ledger).where(Ledger.invoice_id == invoice.id).values(state_id=4)
+            bulk_update(
+                db.session.query(Ledger).filter(Ledger.invoice_id == invoice.id), {Ledger.state_id: 4}
             )
 
             # lead_history
@@ -0,0 +1,97 @@
+"""
+Calentamiento previo al fork de los workers de gunicorn.
+
+Con ``gunicorn --preload "sigp.warmup:create_warm_app()"`` el master crea la
+app, refleja el esquema, compila las plantillas, carga reportlab, las imágenes
+de los contratos y el certificado P12 antes de hacer fork; los workers heredan
+esas páginas copy-on-write en lugar de pagarlas en su primera petición.
+"""
+import gc
+import importlib
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+from sigp import create_app, db
+
+
+def _step(app, timings, name, fn):
+    started = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as exc:  # pylint: disable=broad-except
+        app.logger.warning("Warm-up '%s' falló: %s", name, exc)
+        result = None
+    timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _compile_templates(app):
+    env = app.jinja_env
+    names = [n for n in env.list_templates() if n.endswith((".html", ".txt", ".xml"))]
+    failed = 0
+    for name in names:
+        try:
+            env.get_template(name)
+        except Exception as exc:  # pylint: disable=broad-except
+            failed += 1
+            app.logger.warning("Plantilla %s no compila: %s", name, exc)
+    return len(names) - failed
+
+
+def _load_contract_stack():
+    from sigp.services import contract_service
+
+    importlib.import_module("reportlab.pdfgen.canvas")
+    importlib.import_module("pypdf")
+    for name in set(contract_service._BUILDERS.values()) | set(contract_service._DEFAULT_BUILDERS.values()):
+        importlib.import_module(f"sigp.services.builders.{name}")
+
+
+def _preload_images():
+    from sigp.services.builders.utils import header_image_path, preload_image
+    from sigp.services.contract_service import president_signature_path
+
+    return [p.name for p in (header_image_path(), president_signature_path()) if preload_image(p)]
+
+
+def _load_signer(app):
+    if not app.config.get("PRESIDENT_CERT_PATH"):
+        return None
+    from sigp.services.contract_service import load_president_signer
+
+    return load_president_signer()
+
+
+def warm_up(app):
+    """Precarga en el proceso actual todo lo que los workers necesitarán."""
+    timings = {}
+    with app.app_context():
+        from sigp.models import reflect_db
+
+        _step(app, timings, "schema", lambda: reflect_db(app))
+        _step(app, timings, "mappers", configure_mappers)
+        templates = _step(app, timings, "templates", lambda: _compile_templates(app))
+        _step(app, timings, "contract_stack", _load_contract_stack)
+        images = _step(app, timings, "images", _preload_images)
+        _step(app, timings, "signer", lambda: _load_signer(app))
+        # Las conexiones del pool no deben heredarse entre procesos
+        db.engine.dispose()
+
+    # Objetos ya creados a la generación permanente: el GC de los workers no
+    # los recorre (ni ensucia sus páginas)
+    gc.collect()
+    gc.freeze()
+
+    app.extensions["sigp_warmup"] = timings
+    app.logger.info(
+        "Warm-up completado: %s (plantillas: %s, imágenes: %s)", timings, templates, images
+    )
+    return timings
+
+
+def create_warm_app():
+    """Fábrica para gunicorn ``--preload``: crea la app y la calienta antes del fork."""
+    app = create_app()
+    warm_up(app)
+    return app